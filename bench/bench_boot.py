@@ -0,0 +1,165 @@
+"""
+Host benchmark: boot from the DBC JSON files against the binary config.
+
+Generates synthetic input and output DBCs in JSON, of 500 messages and of
+4000 messages (16000 signals per side, a string table well over 64 KiB, as
+large OEM DBCs have), compiles them with binconfig.pack_config, and for
+both formats times reading the files and building the translation plan, and
+traces the memory held at the peak of boot and after it with tracemalloc
+(the host stand-in for gc.mem_free()). Both plans must translate random
+frames of the synthetic and the shipped DBC to the same output bytes. Exits
+non-zero on failure.
+Run with: python bench/bench_boot.py [--messages 500 4000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+from binconfig import pack_config, load_binary_config, build_translation_plan_from_binary
+from translator import load_dbc_json, build_translation_plan
+
+SIGNALS_PER_MESSAGE = 4
+FACTORS = (1, 0.5, 0.25, 0.125, 0.0625, 2)
+
+
+def synthetic_signal(rng, start_bit, byte_order):
+    factor = rng.choice(FACTORS)
+    return {
+        "start_bit": start_bit,
+        "length": 16,
+        "is_signed": rng.random() < 0.5,
+        "byte_order": byte_order,
+        "factor": factor,
+        "offset": rng.randrange(-40, 40),
+        "min_value": 0,
+        "max_value": 65535 * factor,
+        "unit": rng.choice(("RPM", "kPa", "degC", "km/h", None)),
+    }
+
+
+def synthetic_dbc(message_count, rng):
+    input_db = {}
+    output_db = {}
+    for index in range(message_count):
+        byte_order = rng.choice(("Intel", "Motorola"))
+        # 16-bit signals in bytes 0-1, 2-3, ...; Motorola ones start at the second byte
+        first = 8 if byte_order == "Motorola" else 0
+        names = [f"Signal_{index}_{slot}" for slot in range(SIGNALS_PER_MESSAGE)]
+        input_db[f"Input_{index}"] = {
+            "id": 0x100 + index,
+            "signals": {name: synthetic_signal(rng, first + 16 * slot, byte_order) for slot, name in enumerate(names)},
+        }
+        output_db[f"Output_{index}"] = {
+            "id": 0x400 + index,
+            "length": 8,
+            "signals": {name: synthetic_signal(rng, first + 16 * (SIGNALS_PER_MESSAGE - 1 - slot), byte_order)
+                        for slot, name in enumerate(names)},
+        }
+    return input_db, output_db
+
+
+def boot_json(input_path, output_path):
+    input_db = load_dbc_json(input_path)
+    output_db = load_dbc_json(output_path)
+    plan = build_translation_plan(input_db, output_db)
+    del input_db, output_db
+    return plan
+
+
+def boot_binary(binary_path):
+    return build_translation_plan_from_binary(load_binary_config(binary_path))
+
+
+def measure(boot, *paths):
+    gc.collect()
+    start = perf_counter()
+    boot(*paths)
+    elapsed = perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    plan = boot(*paths)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return plan, elapsed, retained, peak
+
+
+def translate(plan, frame_id, data):
+    route = plan[0].get(frame_id)
+    values = route.decode(data, route.values)
+    return [bytes(destination.encode(values, destination.buffer)) for destination in route.destinations]
+
+
+def compare_plans(json_plan, binary_plan, rng, frames):
+    assert sorted(json_plan[0]) == sorted(binary_plan[0]), "plans route different IDs"
+    ids = sorted(json_plan[0])
+    differing = 0
+    for _ in range(frames):
+        frame_id = rng.choice(ids)
+        data = bytes(rng.getrandbits(8) for _ in range(8))
+        if translate(json_plan, frame_id, data) != translate(binary_plan, frame_id, data):
+            differing += 1
+    return differing
+
+
+def boot_synthetic(message_count, rng, frames):
+    input_db, output_db = synthetic_dbc(message_count, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input_dbc.json")
+        output_path = os.path.join(directory, "output_dbc.json")
+        binary_path = os.path.join(directory, "translation.bin")
+        with open(input_path, "w") as file:
+            json.dump(input_db, file, indent=4)
+        with open(output_path, "w") as file:
+            json.dump(output_db, file, indent=4)
+        with open(binary_path, "wb") as file:
+            file.write(pack_config(input_db, output_db))
+
+        print(f"{message_count} messages, {message_count * SIGNALS_PER_MESSAGE} signals per side")
+        print(f"  files: JSON {os.path.getsize(input_path) + os.path.getsize(output_path)} bytes, "
+              f"binary {os.path.getsize(binary_path)} bytes")
+        json_plan, json_time, json_retained, json_peak = measure(boot_json, input_path, output_path)
+        binary_plan, binary_time, binary_retained, binary_peak = measure(boot_binary, binary_path)
+
+    print(f"  JSON:   boot {json_time * 1000:7.1f} ms, peak {json_peak:>9} bytes, retained {json_retained:>9} bytes")
+    print(f"  binary: boot {binary_time * 1000:7.1f} ms, peak {binary_peak:>9} bytes, retained {binary_retained:>9} bytes")
+
+    differing = compare_plans(json_plan, binary_plan, rng, frames)
+    print(f"  {frames} random frames, {differing} translated differently")
+    assert differing == 0, "binary plan translates differently from the JSON plan"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[500, 4000])
+    parser.add_argument("--frames", type=int, default=20000, help="random frames compared between the plans")
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.ERROR)
+    rng = random.Random(1)
+    for message_count in args.messages:
+        boot_synthetic(message_count, rng, args.frames)
+
+    shipped_input = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    shipped_output = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    shipped_json = build_translation_plan(shipped_input, shipped_output)
+    shipped_binary = build_translation_plan_from_binary(pack_config(shipped_input, shipped_output))
+    differing = compare_plans(shipped_json, shipped_binary, rng, args.frames)
+    print(f"shipped DBC: {args.frames} random frames, {differing} translated differently")
+    assert differing == 0, "binary plan translates the shipped DBC differently from the JSON plan"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Host benchmark: the whole bridge on the virtual bus at full bus load.
+
+An ECU node on the CAN1 wire keeps the wire saturated with the routed input
+frames of the shipped DBC (plus a share of unrelated IDs), the bridge from
+bridge.py runs pass after pass, and a logger node on the CAN2 wire counts
+the translated frames. Reports throughput, drops and wire statistics.
+Run with: python bench/bench_bridge.py [--seconds 3] [--baudrate 500000]
+"""
+import argparse
+import os
+import random
+import sys
+from time import monotonic
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+import vbus
+from bridge import Bridge
+from filters import open_filtered_listener, CANIO_BANKS, MCP2515_BANKS
+from translator import load_dbc_json, build_translation_plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--baudrate", type=int, default=500_000)
+    parser.add_argument("--latency", type=float, default=0.0, help="wire delivery latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability a transmission is corrupted")
+    parser.add_argument("--noise", type=float, default=0.2, help="share of input frames with unrouted IDs")
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.COUNTERS)
+    canlog.counters_period = 0
+
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    plan = build_translation_plan(input_db, output_db)
+
+    wire1 = vbus.VirtualBus(args.baudrate, args.latency, args.error_rate, seed=1)
+    wire2 = vbus.VirtualBus(args.baudrate, args.latency, args.error_rate, seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=4)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+
+    can1_listener = open_filtered_listener(can1, "CAN1", plan, CANIO_BANKS, vbus.Match)
+    can2_listener = open_filtered_listener(can2, "CAN2", plan, MCP2515_BANKS, vbus.Match)
+    bridge = Bridge(can1, can2, can1_listener, can2_listener, plan, vbus.Message)
+
+    rng = random.Random(1)
+    routed_ids = sorted(plan[0])
+    frames = [vbus.Message(can_id, bytes(rng.getrandbits(8) for _ in range(8))) for can_id in routed_ids]
+    noise = [vbus.Message(0x100 + i, bytes(8)) for i in range(16)]
+
+    offered = 0
+    start = monotonic()
+    while monotonic() - start < args.seconds:
+        # Keep the CAN1 wire saturated
+        while wire1.backlog() < 0.001:
+            message = rng.choice(noise) if rng.random() < args.noise else frames[offered % len(frames)]
+            try:
+                ecu.send(message)
+            except RuntimeError:
+                # The ECU's transmit buffers are full
+                break
+            offered += 1
+        bridge.poll()
+        while logger.read_message() is not None:
+            pass
+    elapsed = monotonic() - start
+
+    counters = canlog.counters
+    print(f"simulated {elapsed:.1f} s at {args.baudrate} bit/s, latency {args.latency} s, error rate {args.error_rate}")
+    print(f"CAN1 wire: {wire1.frames / elapsed:,.0f} frames/s, {wire1.busy_time / elapsed:.0%} busy, {wire1.error_frames} error frames")
+    print(f"bridge:    {counters.get('can1_received', 0) / elapsed:,.0f} frames/s received, "
+          f"{counters.get('frames_sent', 0) / elapsed:,.0f} frames/s sent, "
+          f"{counters.get('frames_unrouted', 0)} unrouted, {can1.rx_overflows} CAN1 receive overflows")
+    print(f"CAN2 wire: {wire2.frames / elapsed:,.0f} frames/s, {wire2.busy_time / elapsed:.0%} busy, "
+          f"{logger.frames_received} frames at the logger, {can2.tx_full} sends refused")
+    print(f"worst pass: {canlog.peaks.get('pass_ms', 0)} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Host benchmark: the byte copy fast path of translator.plan_byte_copies.
+
+Counts the routed output signals that become byte copies, and the output
+messages sent as whole input frames under their own ID, for the shipped DBC
+JSON and for a synthetic gateway DBC: input messages of byte-aligned 8, 16
+and 32-bit fields, forwarded unchanged, repacked at other offsets, or mixed
+with a rescaled signal. Random frames, some of them short, are translated
+with and without the byte copies, which must give the same bytes, then the
+decode and encode time of both is compared, interpreted and generated,
+as the best of several passes.
+Exits non-zero if the plans disagree.
+Run with: python bench/bench_byte_copy.py
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import canlog
+from bench_generated import load_generated, time_translation, translate
+from translator import load_dbc_json, build_translation_plan
+
+FRAMES = 20000
+MESSAGES = 8
+REPEATS = 5
+
+# (name, start_bit, length, byte_order, is_signed, factor): a full 8-byte payload of aligned fields
+FIELDS = [("a", 0, 8, "Intel", False, 1), ("b", 8, 16, "Intel", False, 1), ("c", 32, 16, "Motorola", True, 1),
+          ("d", 40, 8, "Intel", False, 1), ("e", 48, 16, "Intel", False, 1)]
+WIDE_FIELDS = [("w", 0, 32, "Intel", False, 1), ("s", 32, 16, "Motorola", True, 1), ("t", 48, 16, "Intel", False, 0.1)]
+
+
+def signal(start_bit, length, byte_order, is_signed, factor):
+    return {"start_bit": start_bit, "length": length, "byte_order": byte_order, "is_signed": is_signed,
+            "factor": factor, "offset": 0}
+
+
+def synthetic_dbcs():
+    """Input and output DBC JSON of a gateway that mostly moves whole fields."""
+    input_db = {}
+    output_db = {}
+    for n in range(MESSAGES):
+        fields = WIDE_FIELDS if n % 4 == 3 else FIELDS
+        signals = {f"{name}{n}": signal(*layout) for name, *layout in fields}
+        input_db[f"IN_{n}"] = {"id": 0x100 + n, "length": 8, "signals": signals}
+        if n % 4 == 0:
+            # Forwarded unchanged
+            output_signals = dict(signals)
+        elif n % 4 == 3:
+            # The rescaled field is encoded, the others copied
+            output_signals = dict(signals, **{f"t{n}": signal(48, 16, "Intel", False, 0.5)})
+        else:
+            # Repacked: the same fields in reverse order
+            output_signals = {}
+            start_bit = 0
+            for name, _, length, byte_order, is_signed, factor in reversed(fields):
+                lsb = start_bit + length - 8 if byte_order == "Motorola" else start_bit
+                output_signals[f"{name}{n}"] = signal(lsb, length, byte_order, is_signed, factor)
+                start_bit += length
+        output_db[f"OUT_{n}"] = {"id": 0x500 + n, "length": 8, "signals": output_signals}
+    return input_db, output_db
+
+
+def destinations(plan):
+    return [destination for routes in plan for route in routes.values() for destination in route.destinations]
+
+
+def is_remapped(destination):
+    return (destination.policy is None and not destination.indexes and len(destination.copies) == 1
+            and destination.copies[0][1] == tuple((i, i) for i in range(destination.length)))
+
+
+def time_plans(label, input_db, output_db, frames):
+    plain = build_translation_plan(input_db, output_db, byte_copies=False)
+    copying = build_translation_plan(input_db, output_db)
+    for can_id, data in frames:
+        if translate(plain[0][can_id], data) != translate(copying[0][can_id], data):
+            print(f"{label}: ID {can_id:x} frame {data.hex()} translates differently with byte copies")
+            return False
+    generated_plain = load_generated(plain)
+    generated_copying = load_generated(copying)
+    for kind, before_plan, after_plan in (("interpreted", plain, copying),
+                                          ("generated", generated_plain, generated_copying)):
+        # Best of several passes, as the host is noisy
+        before = min(time_translation(before_plan, frames) for _ in range(REPEATS))
+        after = min(time_translation(after_plan, frames) for _ in range(REPEATS))
+        print(f"  {kind:11} decode and encode: {before:.2f} us/frame without byte copies, "
+              f"{after:.2f} us/frame with, {before / after:.2f}x")
+    return True
+
+
+def main():
+    canlog.set_level(canlog.ERROR)
+    shipped = (load_dbc_json(os.path.join(ROOT, "input_dbc.json")), load_dbc_json(os.path.join(ROOT, "output_dbc.json")))
+    ok = True
+    for label, (input_db, output_db) in (("shipped DBC JSON", shipped), ("synthetic gateway", synthetic_dbcs())):
+        plan = build_translation_plan(input_db, output_db)
+        signals = sum(len(destination.indexes)
+                      for destination in destinations(build_translation_plan(input_db, output_db, byte_copies=False)))
+        copied = signals - sum(len(destination.indexes) for destination in destinations(plan))
+        remapped = sum(1 for destination in destinations(plan) if is_remapped(destination))
+        messages = len(destinations(plan))
+        print(f"{label}: {copied} of {signals} routed output signals copied as bytes ({copied / signals:.0%}), "
+              f"{remapped} of {messages} output messages sent as whole input frames")
+        rng = random.Random(1)
+        ids = sorted(plan[0])
+        frames = [(rng.choice(ids), bytes(rng.getrandbits(8) for _ in range(rng.choice((8, 8, 8, 2)))))
+                  for _ in range(FRAMES)]
+        ok = time_plans(label, input_db, output_db, frames) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
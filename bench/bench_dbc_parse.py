@@ -0,0 +1,114 @@
+"""
+Host benchmark: parse a large OEM-style .dbc with tools/dbc.py.
+
+Generates a DBC with over 10000 signals in the shape of a vehicle-wide OEM
+file: standard and extended messages, Intel and Motorola signals, multiplexed
+messages with SG_MUL_VAL_ ranges, VAL_ tables, BA_DEF_DEF_/BA_ cycle times
+and multi-line CM_ comments. Times parsing and the conversion to DBC JSON,
+checks the parsed content against what was generated, and fails when the
+parse takes a second or more. The shipped .dbc files are parsed as well.
+Run with: python bench/bench_dbc_parse.py [--messages 1200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from dbc import read_dbc, dbc_to_config, EXTENDED_ID_FLAG
+
+SIGNALS_PER_MESSAGE = 9
+PARSE_BUDGET = 1.0
+
+HEADER = 'VERSION ""\n\nNS_ :\n\tCM_\n\tBA_DEF_\n\tBA_\n\tVAL_\n\tSG_MUL_VAL_\n\nBS_:\n\nBU_: ECU GATEWAY DASH\n\n'
+
+
+def write_dbc(file, message_count, rng):
+    """Write the synthetic DBC, returns (messages, signals, value tables, cycle times)."""
+    file.write(HEADER)
+    trailer = ['BA_DEF_ BO_ "GenMsgCycleTime" INT 0 10000;\n', 'BA_DEF_DEF_ "GenMsgCycleTime" 100;\n',
+               'BA_ "BusType" "CAN";\n']
+    signal_count = 0
+    value_tables = 0
+    cycle_times = 0
+    for index in range(message_count):
+        extended = index % 5 == 0
+        raw_id = (0x18F00000 + index) | EXTENDED_ID_FLAG if extended else 0x100 + index
+        multiplexed = index % 10 == 3
+        file.write(f"BO_ {raw_id} MSG_{index}: 8 ECU\n")
+        if multiplexed:
+            file.write(' SG_ Page M : 0|8@1+ (1,0) [0|255] "" GATEWAY\n')
+            signal_count += 1
+        for slot in range(SIGNALS_PER_MESSAGE - multiplexed):
+            mux = f" m{slot % 4}" if multiplexed else ""
+            if rng.random() < 0.5:
+                start, order = 8 + 6 * slot if multiplexed else 7 * slot, "1"
+                length = 6 if multiplexed else 7
+            else:
+                start, order = 7 + 8 * (slot % 7), "0"
+                length = 8
+            sign = "-" if rng.random() < 0.3 else "+"
+            file.write(f' SG_ SIG_{index}_{slot}{mux} : {start}|{length}@{order}{sign} '
+                       f'({rng.choice(("1", "0.1", "0.01", "0.5", "2"))},{rng.randrange(-40, 40)}) '
+                       f'[-1000|1000] "{rng.choice(("", "rpm", "kph", "degC"))}" GATEWAY,DASH\n')
+            signal_count += 1
+            if slot % 4 == 0:
+                trailer.append(f'VAL_ {raw_id} SIG_{index}_{slot} 0 "Off" 1 "On" 2 "Error" 3 "Not available" ;\n')
+                value_tables += 1
+            if multiplexed:
+                trailer.append(f"SG_MUL_VAL_ {raw_id} SIG_{index}_{slot} Page {slot % 4}-{slot % 4}, 8-9;\n")
+        file.write("\n")
+        if index % 3 == 0:
+            trailer.append(f'BA_ "GenMsgCycleTime" BO_ {raw_id} {rng.choice((10, 20, 50, 1000))};\n')
+            cycle_times += 1
+        if index % 7 == 0:
+            trailer.append(f'CM_ BO_ {raw_id} "Message {index}, sent by the ECU.\nBO_ 1 NOT_A_MESSAGE: 8 ECU\nstill a comment";\n')
+    file.writelines(trailer)
+    return message_count, signal_count, value_tables, cycle_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=1200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "oem.dbc")
+        with open(path, "w") as file:
+            messages, signals, value_tables, cycle_times = write_dbc(file, args.messages, rng)
+        size = os.path.getsize(path)
+
+        start = perf_counter()
+        database = read_dbc(path)
+        parsed = perf_counter() - start
+        config = dbc_to_config(database)
+        converted = perf_counter() - start - parsed
+
+    print(f"synthetic DBC: {messages} messages, {signals} signals, {size} bytes")
+    print(f"  parse {parsed * 1000:.1f} ms, conversion to JSON config {converted * 1000:.1f} ms")
+
+    parsed_signals = [signal for message in database["messages"].values() for signal in message["signals"].values()]
+    assert len(database["messages"]) == messages, "message count"
+    assert len(parsed_signals) == signals, "signal count"
+    assert sum(1 for signal in parsed_signals if signal["values"]) == value_tables, "value tables"
+    assert sum(1 for message in database["messages"].values() if "GenMsgCycleTime" in message["attributes"]) == cycle_times
+    assert all(message.get("cycle_time") for message in config.values()), "cycle time defaults"
+    assert sum(1 for message in config.values() if message.get("extended")) == (messages + 4) // 5, "extended messages"
+    assert "NOT_A_MESSAGE" not in database["messages"], "comment text parsed as a message"
+    assert all(signal["multiplex_ranges"] for signal in parsed_signals if signal["multiplex_value"] is not None)
+    assert parsed < PARSE_BUDGET, f"parsing took {parsed:.2f} s"
+    print(f"  content checks OK, parse within {PARSE_BUDGET} s")
+
+    for name in ("input_dbc.dbc", "output_dbc.dbc"):
+        config = dbc_to_config(read_dbc(os.path.join(ROOT, name)))
+        print(f"{name}: {len(config)} messages, {sum(len(message['signals']) for message in config.values())} signals")
+
+
+if __name__ == "__main__":
+    main()
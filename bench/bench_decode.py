@@ -0,0 +1,48 @@
+"""
+Host benchmark: per-frame decode cost of the shipped input DBC.
+
+Compares the original extract_signal loop (one payload conversion and
+config lookup per signal) with the decoders compiled by
+translator.compile_message_decoder, and checks both give the same values.
+Both timings include the call through a lambda.
+Run with: python bench/bench_decode.py
+"""
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import reference
+from translator import load_dbc_json, compile_message_decoder
+
+FRAMES = 20000
+
+
+def time_per_frame(decode, payloads):
+    start = perf_counter()
+    for data in payloads:
+        decode(data)
+    return (perf_counter() - start) / len(payloads) * 1e6
+
+
+def main():
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    rng = random.Random(1)
+    payloads = [bytes(rng.getrandbits(8) for _ in range(8)) for _ in range(FRAMES)]
+
+    print(f"{'message':<20} {'signals':>7} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, cfg in input_db.items():
+        decoder = compile_message_decoder(cfg)
+        values = dict.fromkeys(cfg["signals"], 0)
+        for data in payloads[:1000]:
+            assert decoder(data, values) == reference.decode_message(cfg, data), name
+        before = time_per_frame(lambda data: reference.decode_message(cfg, data), payloads)
+        after = time_per_frame(lambda data: decoder(data, values), payloads)
+        print(f"{name:<20} {len(cfg['signals']):>7} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Host benchmark: per-frame encode cost of the shipped output DBC.
+
+Reports encode time per frame of the original per-bit format_output_message
+(bench/reference.py) and of the encoders compiled by
+translator.compile_encoder. The original routine packed every signal
+LSB-first, so the compiled Intel signals are checked bit-for-bit against
+it; Motorola signals are checked by bench/check_layouts.py.
+Run with: python bench/bench_encode.py
+"""
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import reference
+from translator import load_dbc_json, output_message_length, output_signal_layout, compile_encoder
+
+FRAMES = 20000
+
+
+def random_values(rng, message_config):
+    values = {}
+    for signal_name, signal in message_config["signals"].items():
+        raw = rng.getrandbits(signal["length"])
+        values[signal_name] = raw * signal.get("factor", 1) + signal.get("offset", 0)
+    return values
+
+
+def time_per_frame(encode, frames):
+    start = perf_counter()
+    for values in frames:
+        encode(values)
+    return (perf_counter() - start) / len(frames) * 1e6
+
+
+def check_intel_signals(rng, output_db, name, cfg, length):
+    intel = {signal_name: signal for signal_name, signal in cfg["signals"].items()
+             if signal.get("byte_order") != "Motorola"}
+    if not intel:
+        return
+    encode = compile_encoder(name, length, [(signal_name, output_signal_layout(signal))
+                                            for signal_name, signal in intel.items()])
+    buffer = bytearray(length)
+    for _ in range(1000):
+        values = random_values(rng, {"signals": intel})
+        assert encode(values, buffer) == reference.format_output_message(output_db, name, values)[1], (name, values)
+
+
+def main():
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    rng = random.Random(1)
+
+    print(f"{'message':<20} {'signals':>7} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, cfg in output_db.items():
+        length = output_message_length(name, cfg)
+        check_intel_signals(rng, output_db, name, cfg, length)
+        layouts = [(signal_name, output_signal_layout(signal)) for signal_name, signal in cfg["signals"].items()]
+        encode = compile_encoder(name, length, layouts)
+        buffer = bytearray(length)
+        frames = [random_values(rng, cfg) for _ in range(FRAMES)]
+        before = time_per_frame(lambda values: reference.format_output_message(output_db, name, values), frames)
+        after = time_per_frame(lambda values: encode(values, buffer), frames)
+        print(f"{name:<20} {len(cfg['signals']):>7} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Host benchmark: the generated straight-line plan against the interpreted one.
+
+Generates the frozen plan module from the shipped DBC JSON with
+tools/generate_translator.py, checks that both plans translate random frames
+to the same bytes, then times them: first decode and encode alone, then the
+whole bridge on the virtual bus at full bus load, as the time of the passes
+that handled frames divided by the frames. That time includes the virtual
+bus itself, so it shows how much of a whole pass the translation is. Exits non-zero if the plans disagree.
+Run with: python bench/bench_generated.py [--seconds 2]
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+from time import monotonic, perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import canlog
+import vbus
+from bridge import Bridge
+from filters import open_filtered_listener, CANIO_BANKS, MCP2515_BANKS
+from generate_translator import generate_module
+from translator import load_dbc_json, build_translation_plan
+
+FRAMES = 50000
+
+
+def load_generated(plan):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frozen_plan.py")
+        with open(path, "w") as file:
+            file.write(generate_module(plan, ["input_dbc.json", "output_dbc.json"]))
+        spec = importlib.util.spec_from_file_location("frozen_plan", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.build_translation_plan()
+
+
+def translate(route, data):
+    values = route.decode(data, route.values)
+    return [bytes(destination.encode(values, destination.buffer)) for destination in route.destinations]
+
+
+def time_translation(plan, frames):
+    standard = plan[0]
+    start = perf_counter()
+    for can_id, data in frames:
+        route = standard[can_id]
+        values = route.decode(data, route.values)
+        for destination in route.destinations:
+            destination.encode(values, destination.buffer)
+    return (perf_counter() - start) / len(frames) * 1e6
+
+
+def time_bridge(plan, seconds):
+    canlog.counters.clear()
+    wire1 = vbus.VirtualBus(500_000, seed=1)
+    wire2 = vbus.VirtualBus(500_000, seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=4)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, open_filtered_listener(can1, "CAN1", plan, CANIO_BANKS, vbus.Match),
+                    open_filtered_listener(can2, "CAN2", plan, MCP2515_BANKS, vbus.Match), plan, vbus.Message)
+
+    rng = random.Random(1)
+    frames = [vbus.Message(can_id, bytes(rng.getrandbits(8) for _ in range(8))) for can_id in sorted(plan[0])]
+    offered = 0
+    busy = 0.0
+    start = monotonic()
+    while monotonic() - start < seconds:
+        while wire1.backlog() < 0.001:
+            try:
+                ecu.send(frames[offered % len(frames)])
+            except RuntimeError:
+                # The ECU's transmit buffers are full
+                break
+            offered += 1
+        pass_start = perf_counter()
+        if bridge.poll():
+            busy += perf_counter() - pass_start
+        while logger.read_message() is not None:
+            pass
+    received = canlog.counters.get("can1_received", 0)
+    return received, canlog.counters.get("frames_sent", 0), busy / max(received, 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.COUNTERS)
+    canlog.counters_period = 0
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    interpreted = build_translation_plan(input_db, output_db)
+    generated = load_generated(build_translation_plan(input_db, output_db))
+
+    rng = random.Random(1)
+    ids = sorted(interpreted[0])
+    frames = [(rng.choice(ids), bytes(rng.getrandbits(8) for _ in range(rng.choice((8, 8, 8, 2))))) for _ in range(FRAMES)]
+    for can_id, data in frames:
+        assert translate(interpreted[0][can_id], data) == translate(generated[0][can_id], data), (hex(can_id), data.hex())
+    print(f"{FRAMES} random frames translate to the same bytes with both plans")
+
+    before = time_translation(interpreted, frames)
+    after = time_translation(generated, frames)
+    print(f"decode and encode: interpreted {before:.2f} us/frame, generated {after:.2f} us/frame, {before / after:.1f}x")
+
+    for label, plan in (("interpreted", interpreted), ("generated", generated)):
+        received, sent, per_frame = time_bridge(plan, args.seconds)
+        print(f"bridge on the virtual bus, {label}: {received / args.seconds:,.0f} frames/s received, "
+              f"{sent / args.seconds:,.0f} sent, {per_frame:.1f} us of bridge time per frame")
+
+
+if __name__ == "__main__":
+    main()
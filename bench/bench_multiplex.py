@@ -0,0 +1,174 @@
+"""
+Host benchmark: a 16-page multiplexed input message.
+
+OEM_STATUS carries a multiplexor, a rolling counter on every page and three
+signals per page, all pages sharing the same bits. Four output messages
+take the first signal of four pages each, and a fifth the counter and the
+third signal of some pages. Random frames of random pages are translated by
+the plan, as interpreted, from the binary config and generated, and by a
+plan of the same message with the multiplexing stripped, as when the
+multiplexor was ignored:
+
+    state       every page signal must hold the value of the last frame of
+                its own page, which the stripped plan overwrites with the
+                bits of whatever page came last
+    outputs     the output frames sent, as only the pages feeding an output
+                send it
+    time        decoding alone and the whole frame path per frame, from
+                decoding one page against decoding every page's signals
+    freshness   frames since the last frame of each page, from Route.page_age
+
+Exits non-zero if the multiplexed plans disagree with each other or with
+the reference, or a page age is wrong.
+Run with: python bench/bench_multiplex.py
+"""
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import canlog
+import vbus
+from bench_generated import load_generated
+from binconfig import pack_config, build_translation_plan_from_binary, config_string
+from bridge import Bridge
+from translator import build_translation_plan, compile_decoder, input_signal_layout
+
+PAGES = 16
+FRAMES = 20000
+REPEATS = 5
+
+
+def signal(start_bit, length, is_signed=False, factor=1, **multiplexing):
+    return dict({"start_bit": start_bit, "length": length, "byte_order": "Intel", "is_signed": is_signed,
+                 "factor": factor, "offset": 0}, **multiplexing)
+
+
+def multiplexed_dbcs():
+    """Input and output DBC JSON with the 16-page OEM_STATUS message."""
+    signals = {"Page": signal(0, 8, multiplexer=True), "Rolling_Counter": signal(8, 8)}
+    for page in range(PAGES):
+        signals[f"Level_{page}"] = signal(16, 16, multiplex_value=page)
+        signals[f"Temperature_{page}"] = signal(32, 12, True, 0.1, multiplex_value=page)
+        signals[f"Flags_{page}"] = signal(48, 8, multiplex_value=page)
+    input_db = {"OEM_STATUS": {"id": 0x400, "length": 8, "signals": signals}}
+    output_db = {}
+    for group in range(PAGES // 4):
+        output_db[f"LEVELS_{group}"] = {"id": 0x500 + group, "length": 8, "signals": {
+            f"Level_{group * 4 + i}": signal(16 * i, 16) for i in range(4)}}
+    output_db["STATUS"] = {"id": 0x510, "length": 8, "signals": dict(
+        {"Rolling_Counter": signal(0, 8)}, **{f"Flags_{page}": signal(8 * (page + 1), 8) for page in range(7)})}
+    return input_db, output_db
+
+
+# The same message as if it had no multiplexing
+def stripped(input_db):
+    return {name: dict(cfg, signals={signal_name: {key: value for key, value in signal.items()
+                                                   if not key.startswith("multiplex")}
+                                     for signal_name, signal in cfg["signals"].items()})
+            for name, cfg in input_db.items()}
+
+
+class Recorder:
+    """Output bus that keeps the frames sent on it."""
+
+    def __init__(self):
+        self.frames = []
+
+    def send(self, message):
+        self.frames.append((message.id, bytes(message.data)))
+        return True
+
+
+def run(plan, frames):
+    """Translate frames through a Bridge, returns it and the output frames."""
+    wire = vbus.VirtualBus()
+    can1 = wire.attach("CAN1")
+    can2 = wire.attach("CAN2")
+    bridge = Bridge(can1, can2, can1.listen(timeout=0), can2.listen(timeout=0), plan, vbus.Message)
+    recorder = Recorder()
+    for data in frames:
+        bridge.translate_and_send(vbus.Message(0x400, data), can1, recorder)
+    return bridge, recorder.frames
+
+
+# Best time per frame of decoding alone and of the bridge's whole frame path, in microseconds
+def time_frames(bridge, frames):
+    route = bridge.plan[0][0x400]
+    messages = [vbus.Message(0x400, data) for data in frames]
+    recorder = Recorder()
+    decode = bridge_time = None
+    for _ in range(REPEATS):
+        start = perf_counter()
+        for data in frames:
+            route.decode(data, route.values)
+        elapsed = (perf_counter() - start) / len(frames) * 1e6
+        decode = elapsed if decode is None else min(decode, elapsed)
+        recorder.frames.clear()
+        start = perf_counter()
+        for message in messages:
+            bridge.translate_and_send(message, bridge.can1, recorder)
+        elapsed = (perf_counter() - start) / len(frames) * 1e6
+        bridge_time = elapsed if bridge_time is None else min(bridge_time, elapsed)
+    return decode, bridge_time
+
+
+def main():
+    canlog.set_level(canlog.ERROR)
+    canlog.counters_period = 0
+    input_db, output_db = multiplexed_dbcs()
+    buffer = pack_config(input_db, output_db)
+    rng = random.Random(1)
+    frames = [bytes([rng.randrange(PAGES)]) + bytes(rng.getrandbits(8) for _ in range(7)) for _ in range(FRAMES)]
+
+    # Reference: the last value of each routed page signal, decoded from its own page
+    routed = {name for cfg in output_db.values() for name in cfg["signals"]}
+    page_decoders = {page: compile_decoder([(name, input_signal_layout(signal))
+                                            for name, signal in input_db["OEM_STATUS"]["signals"].items()
+                                            if signal.get("multiplex_value") == page and name in routed])
+                     for page in range(PAGES)}
+    expected = {}
+    last_frame = {}
+    for number, data in enumerate(frames):
+        page_decoders[data[0]](data, expected)
+        last_frame[data[0]] = number
+
+    ok = True
+    bridges = {}
+    reference_sent = None
+    for label, plan in (("interpreted", build_translation_plan(input_db, output_db)),
+                        ("binary", build_translation_plan_from_binary(buffer)),
+                        ("generated", load_generated(build_translation_plan(input_db, output_db))),
+                        ("stripped", build_translation_plan(stripped(input_db), output_db))):
+        bridge, sent = run(plan, frames)
+        bridges[label] = bridge
+        values = plan[0][0x400].values
+        # The binary plan keys signals by the string table offset of their name
+        if label == "binary":
+            values = {config_string(buffer, key): value for key, value in values.items() if isinstance(key, int)}
+        wrong = sum(1 for name, value in expected.items() if values.get(name) != value)
+        print(f"{label:11} state: {wrong:2} of {len(expected)} page signals not from the last frame of their page; "
+              f"{len(sent)} output frames for {FRAMES} input frames")
+        if label != "stripped":
+            reference_sent = reference_sent or sent
+            ok = ok and not wrong and sent == reference_sent
+
+    route = bridges["interpreted"].plan[0][0x400]
+    ages = [route.page_age(page) for page in range(PAGES)]
+    ok = ok and ages == [FRAMES - 1 - last_frame[page] for page in range(PAGES)]
+    print(f"freshness: frames since the last frame of each page {ages}")
+
+    print("time per frame:")
+    for label in ("interpreted", "generated", "stripped"):
+        decode, bridge_time = time_frames(bridges[label], frames)
+        print(f"  {label:11} decode {decode:5.2f} us, whole frame path {bridge_time:5.2f} us")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Host benchmark: pass-through forwarding of a fully loaded bus.
+
+The shipped DBC JSON gets pass-through outputs for eight extra input
+messages, half of them forwarded under another ID. An ECU node keeps the
+CAN1 wire saturated with those frames, each carrying a sequence number, and
+a logger on the CAN2 wire checks that every frame arrives unchanged, in
+order, under its output ID. Reports the throughput, the forwarding counters
+and the bridge time per frame, as in bench_generated.py, from which the
+frame rate the bridge itself could forward follows. Exits non-zero if a
+frame is lost, reordered or altered.
+Run with: python bench/bench_passthrough.py [--seconds 3] [--baudrate 500000]
+"""
+import argparse
+import os
+import random
+import sys
+from time import monotonic, perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+import vbus
+from bridge import Bridge
+from filters import open_filtered_listener, CANIO_BANKS, MCP2515_BANKS
+from translator import load_dbc_json, build_translation_plan
+
+PASS_THROUGH = 8
+
+
+def pass_through_dbcs(input_db, output_db):
+    """The shipped DBC JSON plus pass-through outputs, and {input ID: output ID}."""
+    input_db = dict(input_db)
+    output_db = dict(output_db)
+    remap = {}
+    for n in range(PASS_THROUGH):
+        input_id = 0x300 + n
+        output_id = 0x700 + n if n % 2 else input_id
+        input_db[f"GATEWAY_IN_{n}"] = {"id": input_id, "length": 8, "signals": {}}
+        output_db[f"GATEWAY_OUT_{n}"] = {"id": output_id, "forward": f"GATEWAY_IN_{n}"}
+        remap[input_id] = output_id
+    return input_db, output_db, remap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--baudrate", type=int, default=500_000)
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.COUNTERS)
+    canlog.counters_period = 0
+    input_db, output_db, remap = pass_through_dbcs(load_dbc_json(os.path.join(ROOT, "input_dbc.json")),
+                                                   load_dbc_json(os.path.join(ROOT, "output_dbc.json")))
+    plan = build_translation_plan(input_db, output_db)
+
+    wire1 = vbus.VirtualBus(args.baudrate, seed=1)
+    wire2 = vbus.VirtualBus(args.baudrate, seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=4)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, open_filtered_listener(can1, "CAN1", plan, CANIO_BANKS, vbus.Match),
+                    open_filtered_listener(can2, "CAN2", plan, MCP2515_BANKS, vbus.Match), plan, vbus.Message)
+
+    rng = random.Random(1)
+    ids = sorted(remap)
+    sent = []
+    received = []
+    busy = 0.0
+    start = monotonic()
+    while True:
+        now = monotonic()
+        if now - start < args.seconds:
+            # Keep the CAN1 wire saturated
+            while wire1.backlog() < 0.001:
+                can_id = ids[len(sent) % len(ids)]
+                data = len(sent).to_bytes(4, "big") + bytes(rng.getrandbits(8) for _ in range(4))
+                try:
+                    ecu.send(vbus.Message(can_id, data))
+                except RuntimeError:
+                    # The ECU's transmit buffers are full
+                    break
+                sent.append((remap[can_id], data))
+        pass_start = perf_counter()
+        if bridge.poll():
+            busy += perf_counter() - pass_start
+        while True:
+            frame = logger.read_message()
+            if frame is None:
+                break
+            received.append((frame.id, frame.data))
+        # Drained once the load stopped and this pass found nothing left anywhere
+        if (now - start >= args.seconds and not wire1.backlog() and not wire2.backlog()
+                and not can1.unread_message_count and not logger.unread_message_count):
+            break
+    elapsed = monotonic() - start
+
+    counters = canlog.counters
+    forwarded = counters.get("frames_forwarded", 0)
+    print(f"{args.seconds:.1f} s at {args.baudrate} bit/s: CAN1 wire {wire1.frames / elapsed:,.0f} frames/s, "
+          f"{wire1.busy_time / elapsed:.0%} busy; CAN2 wire {wire2.busy_time / elapsed:.0%} busy")
+    print(f"bridge: {counters.get('can1_received', 0):,} received, {forwarded:,} forwarded, "
+          f"{counters.get('forwards_refused', 0)} refused, {counters.get('forward_errors', 0)} errors, "
+          f"{counters.get('frames_sent', 0):,} translated, {can1.rx_overflows} CAN1 receive overflows")
+    per_frame = busy / max(counters.get("can1_received", 0), 1) * 1e6
+    print(f"bridge time {per_frame:.1f} us per frame, enough for {1e6 / per_frame:,.0f} frames/s")
+    lost = len(sent) - len(received)
+    altered = sum(1 for expected, got in zip(sent, received) if expected != got)
+    print(f"logger: {len(received):,} of {len(sent):,} frames forwarded unchanged under their output IDs, "
+          f"{lost} lost, {altered} out of order or altered")
+    if lost or altered:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Host benchmark: frames/sec of the input message lookup against DBC size.
+
+Compares the old linear scan over input_db.values() with the routing index
+built by translator.build_routing_index. Run with: python bench/bench_routing.py
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from translator import build_routing_index, lookup_by_id
+
+MESSAGE_COUNTS = (5, 50, 200, 500, 2000)
+FRAMES = 20000
+
+
+class Frame:
+    def __init__(self, id, extended=False):
+        self.id = id
+        self.extended = extended
+
+
+def synthetic_db(message_count):
+    return {
+        f"MSG_{i:04d}": {"id": 0x100 + i, "signals": {}}
+        for i in range(message_count)
+    }
+
+
+def linear_lookup(input_db, message):
+    for cfg in input_db.values():
+        if cfg["id"] == message.id:
+            return cfg
+    return None
+
+
+def frames_per_second(lookup, db, frames):
+    start = perf_counter()
+    for frame in frames:
+        lookup(db, frame)
+    return len(frames) / (perf_counter() - start)
+
+
+def main():
+    print(f"{'messages':>8} {'linear fps':>14} {'indexed fps':>14} {'speedup':>8}")
+    for count in MESSAGE_COUNTS:
+        db = synthetic_db(count)
+        index = build_routing_index(db)
+        # Spread the received IDs evenly over the table, plus some unknown IDs
+        frames = [Frame(0x100 + (i * 7919) % (count + count // 10 + 1)) for i in range(FRAMES)]
+        linear = frames_per_second(linear_lookup, db, frames)
+        indexed = frames_per_second(lookup_by_id, index, frames)
+        print(f"{count:>8} {linear:>14,.0f} {indexed:>14,.0f} {indexed / linear:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Host benchmark: periodic transmission from the signal state against sending
+on trigger frames.
+
+An ECU on the virtual CAN1 wire sends the input messages every 10 ms with
+random timing jitter, occasional dropouts and bursts of unrouted traffic.
+The bridge runs twice on the same traffic: first with the shipped output
+messages, sent when their trigger frames arrive, then with cycle times of
+10 ms for POWERTRAIN_17C and 20 ms for WHEEL_SPEEDS_24A, sent by the transmit
+scheduler. A logger on CAN2 stamps every output frame it receives, and the
+intervals between frames of each output give the jitter (the deviation
+from the cycle time) and the deadline misses (intervals over 1.5 cycles).
+The scheduler's own tx_jitter_ms peak and tx_deadline_misses counter are
+shown too.
+
+Exits non-zero when the scheduled outputs miss over 1% of their deadlines,
+which allows for the occasional stall of the host.
+Run with: python bench/bench_scheduler.py [--seconds 3]
+"""
+import argparse
+import os
+import random
+import sys
+from time import monotonic, sleep
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+import vbus
+from bridge import Bridge, IDLE_SLEEP
+from filters import open_filtered_listener, CANIO_BANKS, MCP2515_BANKS
+from translator import load_dbc_json, build_translation_plan
+
+INPUT_PERIOD = 0.010
+INPUT_JITTER = 0.004
+INPUT_DROPOUT = 0.05
+CYCLE_TIMES = {"POWERTRAIN_17C": 10, "WHEEL_SPEEDS_24A": 20}
+
+
+def run(input_db, output_db, seconds):
+    canlog.counters.clear()
+    canlog.peaks.clear()
+    plan = build_translation_plan(input_db, output_db)
+    wire1 = vbus.VirtualBus(500_000, seed=1)
+    wire2 = vbus.VirtualBus(500_000, seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=1000)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, open_filtered_listener(can1, "CAN1", plan, CANIO_BANKS, vbus.Match),
+                    open_filtered_listener(can2, "CAN2", plan, MCP2515_BANKS, vbus.Match), plan, vbus.Message)
+
+    rng = random.Random(1)
+    inputs = [(cfg["id"], start) for start, cfg in enumerate(input_db.values())]
+    next_input = {can_id: monotonic() + start * 0.001 for can_id, start in inputs}
+    stamps = {}
+    start = monotonic()
+    now = start
+    while now - start < seconds:
+        for can_id, due in next_input.items():
+            if now >= due:
+                if rng.random() >= INPUT_DROPOUT:
+                    ecu.send(vbus.Message(can_id, bytes(rng.getrandbits(8) for _ in range(8))))
+                next_input[can_id] = due + INPUT_PERIOD + rng.uniform(-INPUT_JITTER, INPUT_JITTER)
+        # Bursts of traffic the filters drop, delaying the routed frames on the wire
+        if rng.random() < 0.01:
+            for _ in range(20):
+                ecu.send(vbus.Message(0x7FF, bytes(8)))
+
+        if not bridge.poll():
+            sleep(IDLE_SLEEP)
+        now = monotonic()
+        while True:
+            frame = logger.read_message()
+            if frame is None:
+                break
+            stamps.setdefault(frame.id, []).append(now)
+    return stamps, dict(canlog.counters), dict(canlog.peaks)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+# Interval jitter of one output against its nominal period, and the deadline misses
+def interval_stats(stamps, period_ms):
+    intervals = [(later - earlier) * 1000 for earlier, later in zip(stamps, stamps[1:])]
+    jitter = [abs(interval - period_ms) for interval in intervals]
+    misses = sum(1 for interval in intervals if interval > 1.5 * period_ms)
+    return len(stamps), sum(jitter) / max(1, len(jitter)), percentile(jitter, 0.99), max(jitter, default=0), misses
+
+
+def report(title, output_db, stamps, periods):
+    print(title)
+    total_misses = 0
+    total_frames = 0
+    for name, cfg in output_db.items():
+        frames, mean, p99, worst, misses = interval_stats(stamps.get(cfg["id"], []), periods[name])
+        total_misses += misses
+        total_frames += frames
+        print(f"  {name:18} {frames:5} frames, interval jitter mean {mean:5.2f} ms, p99 {p99:5.2f} ms, "
+              f"max {worst:5.2f} ms, {misses} deadline misses")
+    return total_misses / max(1, total_frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+    canlog.set_level(canlog.ERROR)
+    canlog.counters_period = 0
+
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    input_period_ms = INPUT_PERIOD * 1000
+
+    stamps, _, _ = run(input_db, output_db, args.seconds)
+    report(f"Sent on trigger frames (inputs every {input_period_ms:.0f} ms +-{INPUT_JITTER * 1000:.0f} ms, "
+           f"{INPUT_DROPOUT:.0%} dropped):", output_db, stamps, {name: input_period_ms for name in output_db})
+
+    scheduled_db = {name: dict(cfg, cycle_time=CYCLE_TIMES[name]) for name, cfg in output_db.items()}
+    stamps, counters, peaks = run(input_db, scheduled_db, args.seconds)
+    miss_rate = report("Sent by the transmit scheduler:", scheduled_db, stamps, CYCLE_TIMES)
+    print(f"  scheduler: max tx_jitter_ms={peaks.get('tx_jitter_ms', 0)}, "
+          f"tx_deadline_misses={counters.get('tx_deadline_misses', 0)}, frames_sent={counters.get('frames_sent', 0)}")
+    if miss_rate > 0.01:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Host benchmark: per-frame latency added by CAN2 diagnostics on the send path.
+
+Translates the shipped input frames from CAN1 to CAN2 on the virtual bus,
+once with the old behaviour of reading and printing the CAN2 diagnostics
+after every send, and once with the bridge as it is, where diagnostics only
+come from the low-rate telemetry task. The MCP2515's SPI register reads are
+modelled by the virtual node's register_read_time. Console output goes to
+a StringIO here, so its cost on the board's USB console is understated.
+Run with: python bench/bench_telemetry.py [--register-read-us 50]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+import vbus
+from bridge import Bridge
+from translator import load_dbc_json, build_translation_plan
+
+FRAMES = 2000
+
+
+def frame_latency_us(bridge, can1, can2, frames, logger):
+    start = perf_counter()
+    for message in frames:
+        bridge.translate_and_send(message, can1, can2)
+        while logger.read_message() is not None:
+            pass
+    return (perf_counter() - start) / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--register-read-us", type=float, default=50.0,
+                        help="time of one MCP2515 register read over SPI")
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.INFO)
+    canlog.counters_period = 0
+
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    plan = build_translation_plan(input_db, output_db)
+
+    # A fast wire so that bus time does not hide the send path cost
+    wire1 = vbus.VirtualBus(baudrate=1_000_000_000)
+    wire2 = vbus.VirtualBus(baudrate=1_000_000_000)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2", register_read_time=args.register_read_us / 1e6)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, can1.listen(timeout=0), can2.listen(timeout=0), plan, vbus.Message)
+
+    rng = random.Random(1)
+    routed_ids = sorted(plan[0])
+    frames = [vbus.Message(routed_ids[i % len(routed_ids)], bytes(rng.getrandbits(8) for _ in range(8)))
+              for i in range(FRAMES)]
+
+    console = io.StringIO()
+    with redirect_stdout(console):
+        after = frame_latency_us(bridge, can1, can2, frames, logger)
+
+        # The old send path: read the CAN2 registers and print them after every send
+        send = can2.send
+
+        def send_with_diagnostics(message):
+            result = send(message)
+            bridge.take_can2_snapshot(0)
+            bridge.print_can2_diagnostics()
+            return result
+
+        can2.send = send_with_diagnostics
+        before = frame_latency_us(bridge, can1, can2, frames, logger)
+        can2.send = send
+
+    print(f"SPI register read: {args.register_read_us:.0f} us")
+    print(f"diagnostics after every send: {before:8.1f} us per frame")
+    print(f"telemetry task only:          {after:8.1f} us per frame")
+    print(f"latency removed from the send path: {before - after:.1f} us per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Host benchmark: outbound bus load of the transmit policies on a replayed log.
+
+Replays a candump log (lines like "(1697040000.123456) can0 640#0102030405060708")
+through the bridge's frame path, with the log timestamps as its clock, and
+counts the output frames and wire bits each policy lets through:
+
+    every frame     the shipped output messages
+    on change       "on_change": only payloads that differ from the last sent
+    + deadband      also a "deadband" on the engine and wheel speeds
+    + interval      also a 20 ms "min_interval" and a 100 ms "heartbeat"
+
+Without --log, a synthetic drive is replayed: the shipped input messages at
+10 and 20 ms with sensor noise, alternating between standing still at idle
+and driving. Bus load is the share of a 500 kbit/s wire the output frames
+take, with worst-case bit stuffing.
+Run with: python bench/bench_transmit_policy.py [--log candump.log] [--seconds 60]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import bridge as bridge_module
+import canlog
+import vbus
+from bridge import Bridge
+from ticks import TICKS_MAX
+from translator import load_dbc_json, build_translation_plan, compile_encoder, input_signal_layout
+
+BAUDRATE = 500_000
+
+# Physical deadbands of the "+ deadband" policies, in signal units
+DEADBANDS = {"Engine_Speed": 10, "Wheel_Speed_FL": 0.5, "Wheel_Speed_FR": 0.5, "Wheel_Speed_RL": 0.5, "Wheel_Speed_RR": 0.5}
+
+
+def parse_candump(lines):
+    """Yield (timestamp, id, extended, data) for the frames of a candump log."""
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3 or "#" not in parts[2]:
+            continue
+        can_id, data = parts[2].split("#", 1)
+        # Remote frames carry no payload to translate
+        if data.startswith("R"):
+            continue
+        yield float(parts[0].strip("()")), int(can_id, 16), len(can_id) > 3, bytes.fromhex(data)
+
+
+# Encoder for an input message, to build frames from physical values
+def input_encoder(name, cfg):
+    layouts = [(signal_name, (start_bit, length, factor, offset, byte_order, 0))
+               for signal_name, (start_bit, length, _, factor, offset, byte_order)
+               in ((signal_name, input_signal_layout(signal)) for signal_name, signal in cfg["signals"].items())]
+    return compile_encoder(name, 8, layouts)
+
+
+def synthetic_log(input_db, seconds, seed=1):
+    """candump lines of a drive: 20 s phases standing still and driving."""
+    rng = random.Random(seed)
+    engine = input_encoder("M1_General_0x640", input_db["M1_General_0x640"])
+    brake = input_encoder("M1_General_0x64E", input_db["M1_General_0x64E"])
+    wheels = input_encoder("WHEEL_SPEEDS_1D0", input_db["WHEEL_SPEEDS_1D0"])
+    start = 1697040000.0
+    lines = []
+    for tick in range(int(seconds * 100)):
+        t = tick / 100
+        driving = int(t // 20) % 2 == 1
+        speed = 60 + 40 * math.sin(t / 3) if driving else 0
+        values = {
+            "Engine_Speed": int(1500 + speed * 40 + rng.gauss(0, 4)) if driving else int(800 + rng.gauss(0, 3)),
+            "Throttle_Position": max(0.0, 20 + 15 * math.sin(t / 2) + rng.gauss(0, 0.3)) if driving else 0,
+            "Brake_Switch": 1 if not driving or math.sin(t / 2) < -0.9 else 0,
+        }
+        for name in ("Wheel_Speed_FL", "Wheel_Speed_FR", "Wheel_Speed_RL", "Wheel_Speed_RR"):
+            values[name] = max(0.0, speed + rng.gauss(0, 0.15)) if driving else 0
+        stamp = f"({start + t:.6f}) can0"
+        lines.append(f"{stamp} {input_db['M1_General_0x640']['id']:03X}#{engine(values, bytearray(8)).hex().upper()}")
+        lines.append(f"{stamp} {input_db['M1_General_0x64E']['id']:03X}#{brake(values, bytearray(8)).hex().upper()}")
+        if tick % 2 == 0:
+            lines.append(f"{stamp} {input_db['WHEEL_SPEEDS_1D0']['id']:03X}#{wheels(values, bytearray(8)).hex().upper()}")
+    return lines
+
+
+class Recorder:
+    """Output bus that counts the frames and wire bits sent on it."""
+
+    def __init__(self):
+        self.frames = {}
+        self.bits = 0
+
+    def send(self, message):
+        self.frames[message.id] = self.frames.get(message.id, 0) + 1
+        self.bits += vbus.frame_bits(len(message.data), message.extended)
+        return True
+
+
+def replay(frames, input_db, output_db):
+    canlog.counters.clear()
+    plan = build_translation_plan(input_db, output_db)
+    wire = vbus.VirtualBus(BAUDRATE)
+    can1 = wire.attach("CAN1")
+    can2 = wire.attach("CAN2")
+    bridge = Bridge(can1, can2, can1.listen(timeout=0), can2.listen(timeout=0), plan, vbus.Message)
+    recorder = Recorder()
+    # The policies read the time through bridge.ticks_ms, so replay on log time
+    clock = [0]
+    ticks_ms = bridge_module.ticks_ms
+    bridge_module.ticks_ms = lambda: clock[0]
+    try:
+        for timestamp, can_id, extended, data in frames:
+            clock[0] = int(timestamp * 1000) & TICKS_MAX
+            bridge.translate_and_send(vbus.Message(can_id, data, extended=extended), can1, recorder)
+    finally:
+        bridge_module.ticks_ms = ticks_ms
+    return recorder
+
+
+def with_policy(output_db, on_change=False, deadbands=False, min_interval=0, heartbeat=0):
+    policy_db = {}
+    for name, cfg in output_db.items():
+        cfg = dict(cfg, on_change=on_change, min_interval=min_interval, heartbeat=heartbeat)
+        if deadbands:
+            cfg["signals"] = {signal_name: dict(signal, deadband=DEADBANDS.get(signal_name, 0))
+                              for signal_name, signal in cfg["signals"].items()}
+        policy_db[name] = cfg
+    return policy_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--log", help="candump log to replay, a synthetic drive by default")
+    parser.add_argument("--seconds", type=float, default=60, help="length of the synthetic drive")
+    args = parser.parse_args()
+    canlog.set_level(canlog.ERROR)
+    canlog.counters_period = 0
+
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    if args.log:
+        with open(args.log) as file:
+            frames = list(parse_candump(file))
+        source = args.log
+    else:
+        frames = list(parse_candump(synthetic_log(input_db, args.seconds)))
+        source = f"synthetic {args.seconds:.0f} s drive"
+    duration = max(frames[-1][0] - frames[0][0], 1e-3)
+    print(f"{source}: {len(frames)} input frames over {duration:.1f} s")
+
+    policies = [
+        ("every frame", output_db),
+        ("on change", with_policy(output_db, on_change=True)),
+        ("+ deadband", with_policy(output_db, on_change=True, deadbands=True)),
+        ("+ interval", with_policy(output_db, on_change=True, deadbands=True, min_interval=20, heartbeat=100)),
+    ]
+    names = list(output_db)
+    print(f"{'policy':12} " + " ".join(f"{name:>17}" for name in names) + f" {'bus load':>9} {'saved':>6}")
+    baseline = None
+    for title, policy_db in policies:
+        recorder = replay(frames, input_db, policy_db)
+        load = recorder.bits / BAUDRATE / duration
+        baseline = baseline or recorder.bits
+        counts = " ".join(f"{recorder.frames.get(output_db[name]['id'], 0):17}" for name in names)
+        print(f"{title:12} {counts} {load:9.2%} {1 - recorder.bits / baseline:6.0%}")
+
+
+if __name__ == "__main__":
+    main()
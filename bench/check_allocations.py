@@ -0,0 +1,110 @@
+"""
+Host check: the frame path stays in small-int range and does not allocate.
+
+1. For the shipped plan and for synthetic signals of every length up to 30
+   bits at every start bit, in both byte orders, every intermediate value
+   of the byte-piece decoder and encoder fits in 30 bits, which is
+   CircuitPython's small-int range. Synthetic signals are also round-tripped.
+2. Decoding and encoding frames with the preallocated values dicts and
+   buffers retains no memory per frame, and the transient peak traced by
+   tracemalloc does not grow with the number of frames. On CPython every int above 256
+   is a heap object, so the transient peak is not zero here; on the board,
+   where small ints are immediate, gc.mem_free() stays constant.
+
+Exits non-zero on failure. Run with: python bench/check_allocations.py
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from translator import (load_dbc_json, build_translation_plan, signal_pieces,
+                        compile_decoder, compile_encoder)
+
+SMALL_INT_LIMIT = 1 << 30
+
+
+def check_small_int_range(start_bit, bit_length, byte_order):
+    for byte_index, bit, width_mask, signal_bit in signal_pieces(start_bit, bit_length, byte_order):
+        # Decoder: the assembled value, encoder: the shifted piece of a byte
+        assert (width_mask << signal_bit) < SMALL_INT_LIMIT, (start_bit, bit_length, byte_order)
+        assert (width_mask << bit) <= 0xFF, (start_bit, bit_length, byte_order)
+
+
+def synthetic_signals():
+    for byte_order in ("Intel", "Motorola"):
+        for bit_length in range(1, 31):
+            for start_bit in range(64):
+                pieces = signal_pieces(start_bit, bit_length, byte_order)
+                if all(0 <= piece[0] < 8 for piece in pieces):
+                    yield start_bit, bit_length, byte_order
+
+
+def check_round_trip(rng):
+    checked = 0
+    for start_bit, bit_length, byte_order in synthetic_signals():
+        check_small_int_range(start_bit, bit_length, byte_order)
+        decode = compile_decoder([("S", (start_bit, bit_length, True, 1, 0, byte_order))])
+        encode = compile_encoder("SYNTHETIC", 8, [("S", (start_bit, bit_length, 1, 0, byte_order, 0))])
+        buffer = bytearray(8)
+        values = {"S": 0}
+        for _ in range(4):
+            value = rng.randrange(-(1 << (bit_length - 1)), 1 << (bit_length - 1))
+            decode(encode({"S": value}, buffer), values)
+            assert values["S"] == value, (start_bit, bit_length, byte_order, value, buffer.hex())
+        checked += 1
+    return checked
+
+
+def run_frames(routes, payloads, count):
+    for i in range(count):
+        route = routes[i % len(routes)]
+        values = route.decode(payloads[i % len(payloads)], route.values)
+        for destination in route.destinations:
+            destination.encode(values, destination.buffer)
+
+
+def traced_frames(routes, payloads, count):
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    run_frames(routes, payloads, count)
+    after, peak = tracemalloc.get_traced_memory()
+    return after - before, peak - before
+
+
+def main():
+    rng = random.Random(1)
+    print(f"small-int range and round trip: {check_round_trip(rng)} synthetic signal layouts OK")
+
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    standard, extended = build_translation_plan(input_db, output_db)
+    routes = list(standard.values()) + list(extended.values())
+    for route in routes:
+        for signal_name, (start_bit, bit_length, _, _, _, byte_order) in route.signals:
+            check_small_int_range(start_bit, bit_length, byte_order)
+        for destination in route.destinations:
+            for signal_name, (start_bit, bit_length, _, _, byte_order, _) in destination.signals:
+                check_small_int_range(start_bit, bit_length, byte_order)
+    print("small-int range: shipped DBC signals OK")
+
+    payloads = [bytes(rng.getrandbits(8) for _ in range(8)) for _ in range(64)]
+    tracemalloc.start()
+    run_frames(routes, payloads, 1000)
+    results = [(count,) + traced_frames(routes, payloads, count) for count in (100, 10000, 100000)]
+    tracemalloc.stop()
+
+    for count, retained, peak in results:
+        print(f"{count:>7} frames: retained {retained} bytes, transient peak {peak} bytes")
+    # The last decoded values stay referenced from the values dicts, so a
+    # constant few bytes are retained whatever the frame count
+    assert len({retained for _, retained, _ in results}) == 1, "retained memory grows with frame count"
+    assert results[-1][2] <= results[0][2] + 256, "transient allocations grow with frame count"
+    print("allocations: frame path OK")
+
+
+if __name__ == "__main__":
+    main()
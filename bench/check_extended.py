@@ -0,0 +1,201 @@
+"""
+Host check: standard and extended frames mixed at full bus load.
+
+A gateway DBC JSON with a standard and an extended input message of the
+same ID 0x100, two J1939 messages (EEC1 engine speed and ET1 coolant
+temperature) and a J1939 DM1 forwarded both as an extended and as a
+standard frame. The outputs again include a standard and an extended
+message of the same ID. An ECU node keeps the CAN1 wire saturated with the
+inputs, with unrouted frames of the same IDs in the other kind and with
+remote transmission requests for routed IDs, which the bridge counts and
+skips. A logger on the CAN2 wire checks every output frame, its ID, its extended
+flag and its data, against the translation computed here from the input
+values. The plan is run as interpreted, from the binary config and
+generated, with the filtered listeners of code.py.
+
+Exits non-zero if an output frame is missing, of the wrong kind, altered,
+an unrouted frame or a remote request is translated, or if a controller rejected the
+acceptance filters and its listener fell back to accepting all frames.
+Run with: python bench/check_extended.py [--seconds 1] [--baudrate 500000]
+"""
+import argparse
+import os
+import random
+import sys
+from time import monotonic
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import canlog
+import vbus
+from bench_generated import load_generated
+from binconfig import pack_config, build_translation_plan_from_binary
+from bridge import Bridge
+from filters import open_filtered_listener, CANIO_BANKS, MCP2515_BANKS
+from translator import build_translation_plan
+
+EEC1 = 0x0CF00400
+ET1 = 0x18FEEE00
+DM1 = 0x18FECA00
+DM1_FORWARD = 0x18FECAFE
+ENGINE = 0x18FF0017
+
+
+def signal(start_bit, length, factor=1, offset=0):
+    return {"start_bit": start_bit, "length": length, "byte_order": "Intel", "is_signed": False,
+            "factor": factor, "offset": offset}
+
+
+def extended_dbcs():
+    """Input and output DBC JSON mixing standard and extended IDs."""
+    input_db = {
+        "STD_100": {"id": 0x100, "length": 8, "signals": {"Std_Sequence": signal(0, 32)}},
+        "EXT_100": {"id": 0x100, "extended": True, "length": 8, "signals": {"Ext_Sequence": signal(0, 32)}},
+        "EEC1": {"id": EEC1, "length": 8, "signals": {"Engine_Speed": signal(24, 16, 0.125)}},
+        "ET1": {"id": ET1, "length": 8, "signals": {"Coolant_Temp": signal(0, 8, 1, -40)}},
+        "DM1": {"id": DM1, "length": 8, "signals": {}},
+    }
+    output_db = {
+        "OUT_STD": {"id": 0x300, "length": 4, "signals": {"Std_Sequence": signal(0, 32)}},
+        "OUT_EXT": {"id": 0x300, "extended": True, "length": 4, "signals": {"Ext_Sequence": signal(0, 32)}},
+        # Sent on EEC1 frames, which feed it the most bits
+        "ENGINE": {"id": ENGINE, "length": 3,
+                   "signals": {"Engine_Speed": signal(0, 16, 0.25), "Coolant_Temp": signal(16, 8, 1, -40)}},
+        "DASH": {"id": 0x3A0, "length": 1, "signals": {"Coolant_Temp": signal(0, 8, 1, -40)}},
+        "DM1_EXT": {"id": DM1_FORWARD, "forward": "DM1"},
+        "DM1_STD": {"id": 0x7A0, "forward": "DM1"},
+    }
+    return input_db, output_db
+
+
+# The input frames in turn, as (id, extended), then an unrouted frame and a
+# remote transmission request for a routed ID
+INPUTS = [(0x100, False), (0x100, True), (EEC1, True), (ET1, True), (DM1, True)]
+UNROUTED = [(0x101, True), (EEC1, False), (0x3A0, True), (DM1 + 1, True)]
+REMOTE = [(0x100, False), (EEC1, True), (DM1, True)]
+ROUND = len(INPUTS) + 2
+
+
+class Translation:
+    """The expected output frames of each input frame, from the input values."""
+
+    def __init__(self):
+        self.coolant = None
+
+    def outputs(self, can_id, extended, data):
+        if (can_id, extended) == (0x100, False):
+            return [(0x300, False, data[:4])]
+        if (can_id, extended) == (0x100, True):
+            return [(0x300, True, data[:4])]
+        if (can_id, extended) == (EEC1, True):
+            # 0.125 rpm raw steps to 0.25 rpm steps; the coolant temperature
+            # of the last ET1 frame, or 0 before one arrived
+            speed = int.from_bytes(data[3:5], "little") // 2
+            return [(ENGINE, True, speed.to_bytes(2, "little") + bytes([self.coolant or 0]))]
+        if (can_id, extended) == (ET1, True):
+            self.coolant = data[0]
+            return [(0x3A0, False, data[:1])]
+        if (can_id, extended) == (DM1, True):
+            return [(DM1_FORWARD, True, data), (0x7A0, False, data)]
+        return []
+
+
+def run(label, plan, seconds, baudrate):
+    canlog.counters.clear()
+    wire1 = vbus.VirtualBus(baudrate, seed=1)
+    wire2 = vbus.VirtualBus(baudrate, seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=4)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, open_filtered_listener(can1, "CAN1", plan, CANIO_BANKS, vbus.Match),
+                    open_filtered_listener(can2, "CAN2", plan, MCP2515_BANKS, vbus.Match), plan, vbus.Message,
+                    (vbus.RemoteTransmissionRequest,))
+
+    rng = random.Random(1)
+    translation = Translation()
+    expected = []
+    sent = unrouted = remote = 0
+    received = []
+    start = monotonic()
+    while True:
+        now = monotonic()
+        if now - start < seconds:
+            # Keep the CAN1 wire saturated, an unrouted frame and a remote
+            # request after every round of inputs
+            while wire1.backlog() < 0.001:
+                turn = sent % ROUND
+                if turn == len(INPUTS) + 1:
+                    can_id, extended = REMOTE[(sent // ROUND) % len(REMOTE)]
+                    message = vbus.RemoteTransmissionRequest(can_id, 8, extended=extended)
+                else:
+                    if turn < len(INPUTS):
+                        can_id, extended = INPUTS[turn]
+                    else:
+                        can_id, extended = UNROUTED[(sent // ROUND) % len(UNROUTED)]
+                    # A sequence number in every frame, so a lost or reordered frame shows
+                    data = sent.to_bytes(4, "little") + bytes(rng.getrandbits(8) for _ in range(4))
+                    message = vbus.Message(can_id, data, extended=extended)
+                try:
+                    ecu.send(message)
+                except RuntimeError:
+                    # The ECU's transmit buffers are full
+                    break
+                sent += 1
+                unrouted += turn == len(INPUTS)
+                remote += turn == len(INPUTS) + 1
+                if turn < len(INPUTS):
+                    expected += translation.outputs(can_id, extended, data)
+        bridge.poll()
+        while True:
+            frame = logger.read_message()
+            if frame is None:
+                break
+            received.append((frame.id, frame.extended, frame.data))
+        # Drained once the load stopped and this pass found nothing left anywhere
+        if (now - start >= seconds and not wire1.backlog() and not wire2.backlog() and not can1.unread_message_count
+                and not can2.unread_message_count and not logger.unread_message_count):
+            break
+    elapsed = monotonic() - start
+
+    counters = canlog.counters
+    routed = counters.get("can1_received", 0) - counters.get("frames_unrouted", 0) - counters.get("frames_remote", 0)
+    rejected = sent - counters.get("can1_received", 0)
+    wrong = sum(1 for want, got in zip(expected, received) if want != got)
+    extended_out = sum(1 for _, extended, _ in received if extended)
+    print(f"{label:11} {sent / elapsed:,.0f} frames/s on CAN1, {routed:,} routed, {unrouted:,} unrouted, "
+          f"{counters.get('frames_remote', 0):,} of {remote:,} remote requests skipped "
+          f"({rejected:,} rejected by the filters, {counters.get('frames_unrouted', 0):,} by the routing index); "
+          f"{len(received):,} of {len(expected):,} output frames ({extended_out:,} extended), {wrong} wrong, "
+          f"{counters.get('sends_refused', 0) + counters.get('forwards_refused', 0)} refused")
+    # The virtual nodes place the filters like the MCP2515 driver, so either
+    # listener falling back to accept-all means the banks were misfitted
+    filtered = can1.matches is not None and can2.matches is not None
+    if not filtered:
+        print(f"{label:11} a listener accepts all frames, its acceptance filters were rejected")
+    return (received == expected and routed == sent - unrouted - remote
+            and counters.get("frames_remote", 0) == remote and filtered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--baudrate", type=int, default=500_000)
+    args = parser.parse_args()
+    canlog.set_level(canlog.COUNTERS)
+    canlog.counters_period = 0
+
+    input_db, output_db = extended_dbcs()
+    ok = True
+    for label, plan in (("interpreted", build_translation_plan(input_db, output_db)),
+                        ("binary", build_translation_plan_from_binary(pack_config(input_db, output_db))),
+                        ("generated", load_generated(build_translation_plan(input_db, output_db)))):
+        ok = run(label, plan, args.seconds, args.baudrate) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
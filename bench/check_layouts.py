@@ -0,0 +1,113 @@
+"""
+Host check: compiled signal layouts match a reference DBC decoder.
+
+Every signal of the shipped .dbc files, and every valid Intel and Motorola
+layout in an 8-byte message, is decoded and encoded through the compiled
+byte pieces and compared with the bit-by-bit reference in
+bench/reference.py, which works from the DBC start bits directly. The JSON
+configs are then compared with the .dbc files and any layout drift between
+them is listed.
+
+Exits non-zero if a compiled layout disagrees with the reference.
+Run with: python bench/check_layouts.py
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import reference
+from translator import load_dbc_json, motorola_lsb_start_bit, compile_decoder, compile_encoder
+
+PAYLOADS = 20
+
+
+def lsb_start_bit(signal):
+    if signal["byte_order"] == "Motorola":
+        return motorola_lsb_start_bit(signal["start_bit"], signal["length"])
+    return signal["start_bit"]
+
+
+def fits(signal, message_length):
+    positions = reference.dbc_bit_positions(signal["start_bit"], signal["length"], signal["byte_order"])
+    return all(0 <= position < 8 * message_length for position in positions)
+
+
+def check_signal(rng, name, signal, message_length):
+    start_bit = lsb_start_bit(signal)
+    length = signal["length"]
+    byte_order = signal["byte_order"]
+    decode = compile_decoder([(name, (start_bit, length, signal["is_signed"], 1, 0, byte_order))])
+    encode = compile_encoder(name, message_length, [(name, (start_bit, length, 1, 0, byte_order, 0))])
+    values = {name: 0}
+    buffer = bytearray(message_length)
+    for _ in range(PAYLOADS):
+        data = bytes(rng.getrandbits(8) for _ in range(message_length))
+        expected = reference.dbc_decode_raw(data, signal["start_bit"], length, byte_order, signal["is_signed"])
+        assert decode(data, values)[name] == expected, (name, signal, data.hex())
+
+        raw_value = rng.getrandbits(length)
+        expected_data = bytearray(message_length)
+        reference.dbc_encode_raw(expected_data, raw_value, signal["start_bit"], length, byte_order)
+        assert encode({name: raw_value}, buffer) == expected_data, (name, signal, raw_value)
+
+
+def all_layouts():
+    for byte_order in ("Intel", "Motorola"):
+        for length in range(1, 65):
+            for start_bit in range(64):
+                signal = {"start_bit": start_bit, "length": length, "byte_order": byte_order, "is_signed": length > 1}
+                if fits(signal, 8):
+                    yield signal
+
+
+def report_drift(json_path, dbc_path):
+    json_db = load_dbc_json(json_path)
+    drift = []
+    for message_name, (message_id, _, signals) in reference.read_dbc_signals(dbc_path).items():
+        json_message = json_db.get(message_name)
+        if json_message is None:
+            drift.append(f"{message_name}: missing from JSON")
+            continue
+        if json_message["id"] != message_id:
+            drift.append(f"{message_name}: JSON id {json_message['id']} != DBC id {message_id}")
+        for signal_name, signal in signals.items():
+            json_signal = json_message["signals"].get(signal_name)
+            if json_signal is None:
+                drift.append(f"{message_name}.{signal_name}: missing from JSON")
+                continue
+            expected = {"start_bit": lsb_start_bit(signal), "length": signal["length"],
+                        "byte_order": signal["byte_order"], "is_signed": signal["is_signed"],
+                        "factor": signal["factor"], "offset": signal["offset"]}
+            for key, value in expected.items():
+                if json_signal.get(key) != value:
+                    drift.append(f"{message_name}.{signal_name}: JSON {key} {json_signal.get(key)} != DBC {value}")
+    print(f"{os.path.basename(json_path)} vs {os.path.basename(dbc_path)}: {len(drift)} differences")
+    for line in drift:
+        print(f"  {line}")
+
+
+def main():
+    rng = random.Random(1)
+    checked = 0
+    for dbc_name in ("input_dbc.dbc", "output_dbc.dbc"):
+        for message_name, (_, message_length, signals) in reference.read_dbc_signals(os.path.join(ROOT, dbc_name)).items():
+            for signal_name, signal in signals.items():
+                check_signal(rng, signal_name, signal, message_length)
+                checked += 1
+    print(f"shipped DBC signals: {checked} match the reference decoder and encoder")
+
+    checked = 0
+    for signal in all_layouts():
+        check_signal(rng, "S", signal, 8)
+        checked += 1
+    print(f"synthetic layouts: {checked} match the reference decoder and encoder")
+
+    report_drift(os.path.join(ROOT, "input_dbc.json"), os.path.join(ROOT, "input_dbc.dbc"))
+    report_drift(os.path.join(ROOT, "output_dbc.json"), os.path.join(ROOT, "output_dbc.dbc"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Host check: output messages combine the latest signals of several inputs.
+
+POWERTRAIN_17C carries Engine_Speed and Throttle_Position from
+M1_General_0x640 and Brake_Switch from M1_General_0x64E. An ECU on the
+virtual CAN1 wire interleaves frames of both with changing values while the
+bridge runs, and every POWERTRAIN_17C frame the logger on CAN2 receives must
+hold the values most recently sent for all three signals. It must also be
+sent once per frame of its trigger message only, where the old per-frame
+translation sent it, half zeroed, for frames of both inputs.
+
+Exits non-zero on a stale or missing field. Run with: python bench/check_signal_state.py
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+import vbus
+from bridge import Bridge
+from translator import load_dbc_json, build_translation_plan, compile_encoder, compile_message_decoder, input_signal_layout
+
+FRAMES = 400
+
+
+# Encoder for an input message, to build the ECU's frames from physical values
+def input_encoder(name, cfg):
+    layouts = [(signal_name, (start_bit, length, factor, offset, byte_order, 0))
+               for signal_name, (start_bit, length, _, factor, offset, byte_order)
+               in ((signal_name, input_signal_layout(signal)) for signal_name, signal in cfg["signals"].items())]
+    return compile_encoder(name, 8, layouts)
+
+
+def main():
+    canlog.set_level(canlog.ERROR)
+    canlog.counters_period = 0
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+    plan = build_translation_plan(input_db, output_db)
+
+    wire1 = vbus.VirtualBus(seed=1)
+    wire2 = vbus.VirtualBus(seed=2)
+    can1 = wire1.attach("CAN1")
+    can2 = wire2.attach("CAN2")
+    ecu = wire1.attach("ECU", tx_capacity=1_000_000)
+    logger = wire2.attach("LOGGER", rx_capacity=1_000_000)
+    bridge = Bridge(can1, can2, can1.listen(timeout=0), can2.listen(timeout=0), plan, vbus.Message)
+
+    engine = input_db["M1_General_0x640"]
+    brake = input_db["M1_General_0x64E"]
+    output = output_db["POWERTRAIN_17C"]
+    encode_engine = input_encoder("M1_General_0x640", engine)
+    encode_brake = input_encoder("M1_General_0x64E", brake)
+    decode_output = compile_message_decoder(output)
+
+    rng = random.Random(1)
+    latest = {"Engine_Speed": 0, "Throttle_Position": 0, "Brake_Switch": 0}
+    expected = []
+    engine_frames = 0
+    for _ in range(FRAMES):
+        if rng.random() < 0.5:
+            latest["Engine_Speed"] = rng.randrange(16000)
+            latest["Throttle_Position"] = rng.randrange(1000) * 0.1
+            data = encode_engine(latest, bytearray(8))
+            engine_frames += 1
+            expected.append((latest["Engine_Speed"], int(round(latest["Throttle_Position"], 1)) & 0xFF, latest["Brake_Switch"]))
+            message = vbus.Message(engine["id"], data)
+        else:
+            latest["Brake_Switch"] ^= 1
+            message = vbus.Message(brake["id"], encode_brake(latest, bytearray(8)))
+        ecu.send(message)
+        # Let the frame reach the bridge before the next one, so the order is known
+        while wire1.backlog() or can1.unread_message_count:
+            bridge.poll()
+
+    while wire2.backlog():
+        pass
+    received = []
+    values = {name: 0 for name in output["signals"]}
+    while True:
+        frame = logger.read_message()
+        if frame is None:
+            break
+        assert frame.id == output["id"], hex(frame.id)
+        decoded = decode_output(frame.data, values)
+        received.append((decoded["Engine_Speed"], decoded["Throttle_Position"], decoded["Brake_Switch"]))
+
+    print(f"{FRAMES} input frames, {engine_frames} of M1_General_0x640: "
+          f"{len(received)} POWERTRAIN_17C frames sent, {FRAMES} before the signal state store")
+    assert len(received) == engine_frames, "POWERTRAIN_17C not sent once per trigger frame"
+    for index, (got, want) in enumerate(zip(received, expected)):
+        assert got[0] == want[0] and got[2] == want[2], (index, got, want)
+        # Throttle_Position is truncated to the 8-bit unscaled output field
+        assert abs(got[1] - want[1]) <= 1, (index, got, want)
+    print("every POWERTRAIN_17C frame carries the latest Engine_Speed, Throttle_Position and Brake_Switch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Host check: the transmit policies hold back and release the right frames.
+
+POWERTRAIN_17C, sent on frames of M1_General_0x640, is given each policy in
+turn and fed a frame every 10 ms on a patched ticks_ms clock, which starts
+just before the tick wraparound:
+
+    on change     an identical payload never reaches send(), every change does
+    heartbeat     an unchanged payload is still sent every 100 ms
+    min interval  a change within 50 ms of the last send is held, and goes
+                  out with the first frame 50 ms after that send
+
+Exits non-zero on a frame sent or held wrongly.
+Run with: python bench/check_transmit_policy.py
+"""
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import bridge as bridge_module
+import canlog
+import vbus
+from bridge import Bridge
+from check_signal_state import input_encoder
+from ticks import ticks_add, TICKS_MAX
+from translator import load_dbc_json, build_translation_plan
+
+TRIGGER = "M1_General_0x640"
+OUTPUT = "POWERTRAIN_17C"
+FRAME_MS = 10
+# The clock wraps round 250 ms into every run
+START_TICKS = TICKS_MAX - 250
+
+
+class Recorder:
+    """Stands in for the output bus, keeping the time and data of every send() of OUTPUT."""
+
+    def __init__(self, output_id, now):
+        self.output_id = output_id
+        self.now = now
+        self.sent = []
+
+    def send(self, message):
+        if message.id == self.output_id:
+            self.sent.append((self.now[0], bytes(message.data)))
+
+
+# Feed the engine speeds, one frame every FRAME_MS, through a bridge with
+# policy on OUTPUT. Returns the (ms, data) of every send of OUTPUT.
+def run(input_db, output_db, speeds, **policy):
+    output_db = dict(output_db, **{OUTPUT: dict(output_db[OUTPUT], **policy)})
+    plan = build_translation_plan(input_db, output_db)
+    wire = vbus.VirtualBus()
+    can1 = wire.attach("CAN1")
+    can2 = wire.attach("CAN2")
+    bridge = Bridge(can1, can2, can1.listen(timeout=0), can2.listen(timeout=0), plan, vbus.Message)
+    now = [0]
+    recorder = Recorder(output_db[OUTPUT]["id"], now)
+    encode = input_encoder(TRIGGER, input_db[TRIGGER])
+    ticks_ms = bridge_module.ticks_ms
+    bridge_module.ticks_ms = lambda: ticks_add(START_TICKS, now[0])
+    try:
+        for frame, speed in enumerate(speeds):
+            now[0] = frame * FRAME_MS
+            data = encode({"Engine_Speed": speed, "Throttle_Position": 0}, bytearray(8))
+            bridge.translate_and_send(vbus.Message(input_db[TRIGGER]["id"], data), can1, recorder)
+    finally:
+        bridge_module.ticks_ms = ticks_ms
+    return recorder.sent
+
+
+def main():
+    canlog.set_level(canlog.ERROR)
+    canlog.counters_period = 0
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+
+    # A new engine speed every 5 frames, for 1 s
+    speeds = [1000 + 100 * (frame // 5) for frame in range(100)]
+    every_frame = dict(run(input_db, output_db, speeds))
+    sent = run(input_db, output_db, speeds, on_change=True)
+    print(f"on change: {len(sent)} of {len(speeds)} frames sent for {len(set(speeds))} engine speeds")
+    assert sent == [(ms, every_frame[ms]) for ms in range(0, 1000, 5 * FRAME_MS)], sent
+    assert all(a[1] != b[1] for a, b in zip(sent, sent[1:])), "an identical payload reached send()"
+
+    # The same engine speed for 1 s
+    sent = run(input_db, output_db, [1000] * 100, on_change=True, heartbeat=100)
+    print(f"heartbeat: {len(sent)} unchanged frames sent at {[ms for ms, _ in sent]} ms")
+    assert [ms for ms, _ in sent] == list(range(0, 1000, 100)), sent
+    assert len({data for _, data in sent}) == 1
+
+    # A change 10 ms after the first send, then the same engine speed
+    speeds = [1000, 1100] + [1100] * 18
+    every_frame = dict(run(input_db, output_db, speeds))
+    sent = run(input_db, output_db, speeds, on_change=True, min_interval=50)
+    print(f"min interval: frames sent at {[ms for ms, _ in sent]} ms, the change at 10 ms held until 50 ms")
+    assert every_frame[0] != every_frame[FRAME_MS]
+    assert sent == [(0, every_frame[0]), (50, every_frame[FRAME_MS])], sent
+    print("no identical payload sent, heartbeats resent, held changes released")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Reference routines kept on the host for benchmarks and checks.
+
+The first part is the original per-signal translation code from code.py,
+the "before" side of benchmarks, with the debug prints left out so that
+timings compare the algorithms, not console output. Note that it reads every
+signal big-endian and writes every signal little-endian.
+
+The second part is a plain bit-by-bit decoder and encoder that follows the
+DBC definition of start bits directly, used to check the compiled layouts.
+"""
+import re
+
+
+def bytes_to_int(bytes_value):
+    result = 0
+    for b in bytes_value:
+        result = (result << 8) | b
+    # Pad to 64 bits
+    result = result << (8 * (8 - len(bytes_value)))
+    return result
+
+
+def extract_signal(message_data, start_bit, bit_length, is_signed, factor=1, offset=0):
+    message_int = bytes_to_int(message_data)
+    start_byte = start_bit // 8
+    bit_within_byte = start_bit % 8
+    shift = 64 - (start_byte + 1) * 8 + bit_within_byte
+    mask = (1 << bit_length) - 1
+    value = (message_int >> shift) & mask
+    if is_signed and (value & (1 << (bit_length - 1))):
+        value -= (1 << bit_length)
+    return value * factor + offset
+
+
+def decode_message(message_config, message_data):
+    values = {}
+    for signal_name, signal in message_config["signals"].items():
+        values[signal_name] = extract_signal(message_data, signal["start_bit"], signal["length"],
+                                             signal.get("is_signed", False), signal.get("factor", 1),
+                                             signal.get("offset", 0))
+    return values
+
+
+def format_output_message(output_db, message_name, signals):
+    message_config = output_db[message_name]
+    message_id = message_config["id"]
+    if "length" not in message_config:
+        message_length = max((signal["start_bit"] + signal["length"] + 7) // 8 for signal in message_config["signals"].values())
+    else:
+        message_length = message_config["length"]
+    output_data = [0] * message_length
+    for signal_name, value in signals.items():
+        if signal_name not in message_config["signals"]:
+            continue
+        signal_config = message_config["signals"][signal_name]
+        start_bit = signal_config["start_bit"]
+        bit_length = signal_config["length"]
+        factor = signal_config.get("factor", 1)
+        offset = signal_config.get("offset", 0)
+        raw_value = int((value - offset) / factor)
+        for i in range(bit_length):
+            byte_index = (start_bit + i) // 8
+            bit_index = (start_bit + i) % 8
+            if raw_value & (1 << i):
+                output_data[byte_index] |= (1 << bit_index)
+    return message_id, bytes(output_data)
+
+
+# DBC signal line: SG_ name [mux] : start|length@order sign (factor,offset) [min|max] "unit" receivers
+SG_PATTERN = re.compile(r'^\s*SG_\s+(\w+)\s*(\w*)\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*\(([^,]+),([^)]+)\)')
+BO_PATTERN = re.compile(r'^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)')
+
+
+def read_dbc_signals(path):
+    """
+    Minimal .dbc reader: {message name: (id, length, {signal name: signal})}
+    where a signal is a dict with the raw DBC start_bit, length, byte_order,
+    is_signed, factor and offset.
+    """
+    messages = {}
+    current = None
+    with open(path) as file:
+        for line in file:
+            match = BO_PATTERN.match(line)
+            if match:
+                current = {}
+                messages[match.group(2)] = (int(match.group(1)), int(match.group(3)), current)
+                continue
+            match = SG_PATTERN.match(line)
+            if match and current is not None:
+                current[match.group(1)] = {
+                    "start_bit": int(match.group(3)),
+                    "length": int(match.group(4)),
+                    "byte_order": "Intel" if match.group(5) == "1" else "Motorola",
+                    "is_signed": match.group(6) == "-",
+                    "factor": float(match.group(7)),
+                    "offset": float(match.group(8)),
+                }
+    return messages
+
+
+def dbc_bit_positions(start_bit, length, byte_order):
+    """
+    Payload bit positions (byte * 8 + bit) of a signal, least significant
+    first, straight from the DBC definition: Intel start bits are the LSB and
+    count up, Motorola start bits are the MSB and follow the sawtooth down.
+    """
+    if byte_order == "Intel":
+        return [start_bit + i for i in range(length)]
+    positions = []
+    position = start_bit
+    for _ in range(length):
+        positions.append(position)
+        position = position + 15 if position % 8 == 0 else position - 1
+    return positions[::-1]
+
+
+def dbc_decode_raw(data, start_bit, length, byte_order, is_signed):
+    value = 0
+    for i, position in enumerate(dbc_bit_positions(start_bit, length, byte_order)):
+        if data[position // 8] & (1 << (position % 8)):
+            value |= 1 << i
+    if is_signed and value & (1 << (length - 1)):
+        value -= 1 << length
+    return value
+
+
+def dbc_encode_raw(data, raw_value, start_bit, length, byte_order):
+    for i, position in enumerate(dbc_bit_positions(start_bit, length, byte_order)):
+        if raw_value & (1 << i):
+            data[position // 8] |= 1 << (position % 8)
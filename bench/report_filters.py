@@ -0,0 +1,79 @@
+"""
+Host report: how the input DBC IDs fit the acceptance filter banks.
+
+For the shipped input DBC and for synthetic DBCs of growing size, prints
+whether the IDs fit exact filters on canio (ESP32) and the MCP2515, and
+otherwise how many IDs the masked fallback filters let through and how long
+the fit takes. The last cases mix standard IDs with J1939 extended IDs,
+which get banks of their own. Every set of filters is also installed on a
+virtual bus node, which places them the way the adafruit_mcp2515 driver
+does; exits non-zero if one is rejected.
+Run with: python bench/report_filters.py
+"""
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import vbus
+from filters import fit_listener_filters, describe_filters, CANIO_BANKS, MCP2515_BANKS, STANDARD_ID_BITS, EXTENDED_ID_BITS
+from translator import load_dbc_json
+
+BANKS = (("canio", CANIO_BANKS), ("MCP2515", MCP2515_BANKS))
+
+
+def report(label, ids, extended_ids=()):
+    print(f"{label}: {len(ids)} IDs" + (f", {len(extended_ids)} extended IDs" if extended_ids else ""))
+    ok = True
+    for bus_name, banks in BANKS:
+        start = perf_counter()
+        filters, accepted = fit_listener_filters(ids, extended_ids, banks)
+        elapsed = (perf_counter() - start) * 1000
+        for kind, kind_ids, kind_accepted, id_bits, is_extended in (
+                ("standard", ids, accepted[0], STANDARD_ID_BITS, False),
+                ("extended", extended_ids, accepted[1], EXTENDED_ID_BITS, True)):
+            if not kind_ids:
+                continue
+            kind_filters = [(can_id, mask) for can_id, mask, filter_extended in filters if filter_extended == is_extended]
+            name = f"{bus_name} {kind}" if extended_ids else bus_name
+            print(f"  {describe_filters(name, kind_ids, kind_filters, kind_accepted, id_bits)} ({elapsed:.1f} ms on host)")
+            width = 8 if is_extended else 3
+            for can_id, mask in kind_filters:
+                print(f"    id=0x{can_id:0{width}x} mask=0x{mask:0{width}x}")
+        try:
+            vbus.VirtualBus().attach().listen(matches=[vbus.Match(can_id, mask=mask, extended=is_extended)
+                                                       for can_id, mask, is_extended in filters])
+        except RuntimeError as e:
+            print(f"  {bus_name}: the filters are rejected ({e})")
+            ok = False
+    return ok
+
+
+# J1939 IDs: priority, PGN and source address
+def j1939_id(priority, pgn, source):
+    return (priority << 26) | (pgn << 8) | source
+
+
+def main():
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    ok = report("input_dbc.json", sorted(cfg["id"] for cfg in input_db.values()))
+
+    rng = random.Random(1)
+    # A block of contiguous IDs, as OEM DBCs often group a subsystem
+    ok = report("contiguous block", list(range(0x300, 0x310))) and ok
+    for count in (6, 20, 100, 500):
+        ok = report(f"random {count}", sorted(rng.sample(range(0x800), count))) and ok
+    # Engine and transmission PGNs of one ECU next to standard OEM IDs
+    j1939 = [j1939_id(3, pgn, 0x00) for pgn in (0xF004, 0xF003, 0xFEEE, 0xFEF1)]
+    ok = report("standard and J1939", sorted(rng.sample(range(0x800), 4)), sorted(j1939)) and ok
+    ok = report("standard and J1939 from 4 ECUs",
+                sorted(rng.sample(range(0x800), 6)),
+                sorted(j1939_id(6, 0xFEF1, source) for source in (0x00, 0x03, 0x0B, 0x21))) and ok
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Host report: accuracy of the folded integer scaling against float scaling.
+
+For every routed signal of the shipped DBC JSON, and for a set of common
+scalings and unit conversions, every raw input value (up to 2^20 of them,
+evenly spread beyond that) is translated three ways and compared with the
+exact result, computed with fractions from the decimal scale constants:
+
+    folded      the integer transform of translator.folded_scaling
+    float64     value = raw * factor + offset, converted to the output unit,
+                then int((value - offset) / factor)
+    board float the same in CircuitPython's 30-bit floats: float32 with the
+                two low mantissa bits dropped after every operation
+
+The folded transform must be exact; the float pipelines show how often
+truncating an inexact quotient lands one raw step low. The shipped plan is
+also run end to end on random frames, and the folded constants of its
+plans built from the JSON, the binary config and generated, plus a torque
+conversion with a multiplier over 2^28, must all be stored as ints, which
+board floats would round above 2^22. Exits non-zero if a folded result, a
+shipped output or a stored constant is not exact.
+Run with: python bench/report_fixed_point.py
+"""
+import os
+import random
+import struct
+import sys
+from fractions import Fraction
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import canlog
+from bench_generated import load_generated
+from binconfig import pack_config, build_translation_plan_from_binary
+from translator import (load_dbc_json, build_translation_plan, match_signals, folded_scaling, input_signal_layout,
+                        compile_message_decoder, unit_conversion)
+
+MAX_VALUES = 1 << 20
+
+# (name, input length, signed, input factor, input offset, output factor, output offset, input unit, output unit)
+COMMON_SCALINGS = [
+    ("speed 0.01 -> 0.1", 16, False, 0.01, 0, 0.1, 0, None, None),
+    ("speed 0.1 -> 0.05", 16, False, 0.1, 0, 0.05, 0, None, None),
+    ("temperature 1-40 -> 0.5-40", 8, False, 1, -40, 0.5, -40, None, None),
+    ("pressure 0.001 -> 0.01", 20, False, 0.001, 0, 0.01, 0, None, None),
+    ("angle 0.0625 -> 0.1", 16, True, 0.0625, 0, 0.1, 0, None, None),
+    ("voltage 0.01 -> 0.02+5", 12, False, 0.01, 0, 0.02, 5, None, None),
+    ("torque 0.5-500 -> 1-1000", 12, True, 0.5, -500, 1, -1000, None, None),
+    ("speed 0.01 kph -> 0.01 m/s", 16, False, 0.01, 0, 0.01, 0, "kph", "m/s"),
+    ("speed 0.1 mph -> 0.1 km/h", 12, False, 0.1, 0, 0.1, 0, "mph", "km/h"),
+    ("temperature 1-40 degC -> 1-40 degF", 8, False, 1, -40, 1, -40, "degC", "degF"),
+    ("pressure 0.1 psi -> 0.1 kPa", 12, False, 0.1, 0, 0.1, 0, "psi", "kPa"),
+]
+
+
+def exact_fraction(value):
+    return Fraction(repr(value))
+
+
+# Truncate toward zero, as int() does
+def truncate(value):
+    return int(value)
+
+
+def board_float(value):
+    bits = struct.unpack("<I", struct.pack("<f", value))[0] & ~3
+    return struct.unpack("<f", struct.pack("<I", bits))[0]
+
+
+def raw_values(length, is_signed):
+    low, high = (-(1 << (length - 1)), (1 << (length - 1)) - 1) if is_signed else (0, (1 << length) - 1)
+    step = max(1, (high - low + 1) // MAX_VALUES)
+    return range(low, high + 1, step)
+
+
+# Exact output raw value of an input raw value
+def exact_translation(raw, factor, offset, output_factor, output_offset, conversion):
+    scale, shift = conversion or ((1, 1), (0, 1))
+    value = (raw * exact_fraction(factor) + exact_fraction(offset)) * Fraction(*scale) + Fraction(*shift)
+    return truncate((value - exact_fraction(output_offset)) / exact_fraction(output_factor))
+
+
+def compare(length, is_signed, factor, offset, output_factor, output_offset, input_unit, output_unit):
+    """Returns (values, folded mismatches, float64 mismatches, board mismatches, max float error, scale) or None."""
+    conversion = unit_conversion(input_unit, output_unit)
+    scale = folded_scaling((0, length, is_signed, factor, offset, "Intel"), output_factor, output_offset, conversion)
+    if scale is None:
+        return None
+    multiplier, addend, divisor = scale
+    # The float pipeline scales the input unit value by the output factor and
+    # offset expressed in the input unit, as the unfolded plan does
+    (scale_numerator, scale_denominator), (shift_numerator, shift_denominator) = conversion or ((1, 1), (0, 1))
+    unit_scale = scale_numerator / scale_denominator
+    float_factor = output_factor / unit_scale
+    float_offset = (output_offset - shift_numerator / shift_denominator) / unit_scale
+    b_factor, b_offset, b_output_factor, b_output_offset = (board_float(value) for value in
+                                                           (factor, offset, float_factor, float_offset))
+    count = folded_bad = float_bad = board_bad = worst = 0
+    for raw in raw_values(length, is_signed):
+        count += 1
+        exact = exact_translation(raw, factor, offset, output_factor, output_offset, conversion)
+        numerator = raw * multiplier + addend
+        folded = numerator // divisor if numerator >= 0 else -(-numerator // divisor)
+        folded_bad += folded != exact
+        value = raw * factor + offset
+        float64 = int((value - float_offset) / float_factor)
+        float_bad += float64 != exact
+        value = board_float(board_float(raw * b_factor) + b_offset)
+        board = int(board_float(board_float(value - b_output_offset) / b_output_factor))
+        board_bad += board != exact
+        worst = max(worst, abs(float64 - exact), abs(board - exact))
+    return count, folded_bad, float_bad, board_bad, worst, scale
+
+
+def routed_pairs(input_db, output_db):
+    outputs, used = match_signals(input_db, output_db)
+    for output_name, _, signal_names in outputs:
+        for signal_name in signal_names:
+            output_signal = output_db[output_name]["signals"][signal_name]
+            for input_name, input_signals in used.items():
+                if signal_name in input_signals:
+                    input_signal = input_db[input_name]["signals"][signal_name]
+                    _, length, is_signed, factor, offset, _ = input_signal_layout(input_signal)
+                    yield (f"{signal_name} {input_name} -> {output_name}", length, is_signed, factor, offset,
+                           output_signal.get("factor", 1), output_signal.get("offset", 0),
+                           input_signal.get("unit"), output_signal.get("unit"))
+
+
+# Translate random frames with the shipped plan and decode the output frames
+# back to raw values, which must be the exact translations of the input raw values
+def check_shipped_plan(input_db, output_db, frames=2000):
+    plan = build_translation_plan(input_db, output_db)
+    output_by_id = {cfg["id"]: cfg for cfg in output_db.values()}
+    rng = random.Random(1)
+    bad = 0
+    for can_id, route in plan[0].items():
+        input_cfg = next(cfg for cfg in input_db.values() if cfg["id"] == can_id)
+        raw_input = compile_message_decoder({"signals": {name: dict(signal, factor=1, offset=0)
+                                                         for name, signal in input_cfg["signals"].items()}})
+        for _ in range(frames):
+            data = bytes(rng.getrandbits(8) for _ in range(8))
+            raws = raw_input(data, {})
+            values = route.decode(data, route.values)
+            for destination in route.destinations:
+                output_cfg = output_by_id[destination.id]
+                raw_output = compile_message_decoder({"signals": {name: dict(signal, factor=1, offset=0)
+                                                                  for name, signal in output_cfg["signals"].items()}})
+                got = raw_output(destination.encode(values, destination.buffer), {})
+                for name, signal in output_cfg["signals"].items():
+                    if name not in raws:
+                        continue
+                    input_signal = input_cfg["signals"][name]
+                    exact = exact_translation(raws[name], input_signal.get("factor", 1), input_signal.get("offset", 0),
+                                              signal.get("factor", 1), signal.get("offset", 0),
+                                              unit_conversion(input_signal.get("unit"), signal.get("unit")))
+                    mask = (1 << signal["length"]) - 1
+                    bad += (got[name] & mask) != (exact & mask)
+    return bad
+
+
+# The folded (multiplier, addend, divisor) of every output signal of a plan, in plan order
+def folded_constants(plan):
+    constants = []
+    for routes in plan:
+        for route in routes.values():
+            for destination in route.destinations:
+                for index in destination.indexes:
+                    _, _, factor, offset, _, divisor = destination.table.output_layout(index)
+                    if divisor:
+                        constants.append((destination.name, factor, offset, divisor))
+    return constants
+
+
+# The folded constants must reach every plan as exact ints
+def check_stored_constants(input_db, output_db):
+    input_db = dict(input_db, TORQUE_IN={"id": 0x120, "length": 1, "signals": {
+        "Torque": {"start_bit": 0, "length": 2, "factor": 0.1, "offset": 0, "unit": "lb-ft"}}})
+    output_db = dict(output_db, TORQUE_OUT={"id": 0x220, "length": 1, "signals": {
+        "Torque": {"start_bit": 0, "length": 32, "factor": 0.1, "offset": 0, "unit": "Nm"}}})
+    reference = folded_constants(build_translation_plan(input_db, output_db))
+    bad = 0
+    for plan in (build_translation_plan_from_binary(pack_config(input_db, output_db)),
+                 load_generated(build_translation_plan(input_db, output_db))):
+        constants = folded_constants(plan)
+        bad += constants != reference
+        bad += sum(1 for _, multiplier, addend, _ in constants
+                   if not isinstance(multiplier, int) or not isinstance(addend, int))
+    rounded = sum(1 for _, multiplier, addend, _ in reference
+                  if board_float(multiplier) != multiplier or board_float(addend) != addend)
+    print(f"folded constants: {len(reference)} stored as ints by the JSON, binary and generated plans, "
+          f"{rounded} of them would round as board floats; {bad} mismatches")
+    return bad
+
+
+def main():
+    canlog.set_level(canlog.ERROR)
+    input_db = load_dbc_json(os.path.join(ROOT, "input_dbc.json"))
+    output_db = load_dbc_json(os.path.join(ROOT, "output_dbc.json"))
+
+    print(f"{'signal':58} {'transform':>20} {'values':>8} {'folded':>7} {'float64':>8} {'board':>8} {'max err':>8}")
+    failures = 0
+    for name, *scaling in list(routed_pairs(input_db, output_db)) + COMMON_SCALINGS:
+        result = compare(*scaling)
+        if result is None:
+            print(f"{name:58} {'float (not folded)':>20}")
+            continue
+        count, folded_bad, float_bad, board_bad, worst, (multiplier, addend, divisor) = result
+        transform = f"(x*{multiplier}{addend:+})/{divisor}" if addend else f"x*{multiplier}/{divisor}"
+        print(f"{name:58} {transform:>20} {count:8} {folded_bad:7} {float_bad:8} {board_bad:8} {worst:8}")
+        failures += folded_bad
+
+    shipped_bad = check_shipped_plan(input_db, output_db)
+    print(f"shipped plan end to end: {shipped_bad} output signals differ from the exact translation")
+    stored_bad = check_stored_constants(input_db, output_db)
+    if failures or shipped_bad or stored_bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
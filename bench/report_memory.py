@@ -0,0 +1,98 @@
+"""
+Host report: memory held per signal by each representation of a large DBC.
+
+For a synthetic DBC of 1000 messages with 10 signals each, traces with
+tracemalloc the memory taken by the signals as JSON dicts, as the layout
+tuples the plan used to keep, and in the array columns of a SignalTable,
+then the whole translation plan per signal. CPython objects are larger than
+CircuitPython's, so the absolute numbers are for comparison only. Exits
+non-zero if the SignalTable is not at least ten times smaller than the JSON.
+Run with: python bench/report_memory.py [--messages 1000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+from translator import SignalTable, build_translation_plan, input_signal_layout
+
+SIGNALS_PER_MESSAGE = 10
+
+
+def synthetic_dbc(message_count, id_base, rng):
+    db = {}
+    for index in range(message_count):
+        db[f"Message_{index}"] = {
+            "id": id_base + index,
+            "length": 8,
+            "signals": {f"Signal_{index}_{slot}": {
+                "start_bit": 6 * slot,
+                "length": 6,
+                "is_signed": rng.random() < 0.3,
+                "byte_order": "Intel",
+                "factor": rng.choice((1, 0.1, 0.01, 0.5)),
+                "offset": rng.randrange(-40, 40),
+                "min_value": -40,
+                "max_value": 100,
+                "unit": rng.choice(("rpm", "kph", "degC", None)),
+            } for slot in range(SIGNALS_PER_MESSAGE)},
+        }
+    return json.dumps(db)
+
+
+# Memory still held after build(), and what it returned
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    args = parser.parse_args()
+
+    canlog.set_level(canlog.ERROR)
+    rng = random.Random(1)
+    input_text = synthetic_dbc(args.messages, 0x100, rng)
+    output_text = synthetic_dbc(args.messages, 0x100, rng)
+    signal_count = args.messages * SIGNALS_PER_MESSAGE
+
+    json_size, input_db = traced(lambda: json.loads(input_text))
+    signals = [(name, signal) for message in input_db.values() for name, signal in message["signals"].items()]
+    # Names are shared with the JSON in both, so only the descriptors are measured
+    tuple_size, layouts = traced(lambda: [(name, input_signal_layout(signal)) for name, signal in signals])
+
+    def build_table():
+        table = SignalTable()
+        for name, signal in signals:
+            table.add_config(name, signal)
+        return table
+    table_size, table = traced(build_table)
+
+    output_db = json.loads(output_text)
+    plan_size, plan = traced(lambda: build_translation_plan(input_db, output_db))
+
+    print(f"{args.messages} messages, {signal_count} input signals, bytes per signal:")
+    print(f"  JSON dicts:                 {json_size / signal_count:8.1f}")
+    print(f"  layout tuples:              {tuple_size / signal_count:8.1f}")
+    print(f"  SignalTable columns:        {table_size / signal_count:8.1f}")
+    print(f"  whole plan (input + output, compiled code, buffers): {plan_size / signal_count:.1f}")
+    assert len(table) == signal_count and sum(len(routes) for routes in plan) == args.messages
+    assert json_size >= 10 * table_size, "SignalTable is not an order of magnitude smaller than the JSON"
+    print(f"SignalTable is {json_size / table_size:.0f}x smaller than the JSON dicts")
+
+
+if __name__ == "__main__":
+    main()
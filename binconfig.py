@@ -0,0 +1,243 @@
+"""
+Binary translation config: the input and output DBC JSON compiled on a host
+into fixed-size, struct-packed records that the board reads in one go.
+
+Layout, all little-endian:
+
+    header   4s B x I I I I I I   magic, version, messages, signals, routes, outputs, refs, strings size
+    message  I B B I H I          id, length, flags, first signal, signal count, name offset
+    signal   B B B x d d i i f I I
+                                  start bit, length, flags, factor, offset, multiplier, addend,
+                                  deadband, divisor, name offset
+    route    I I H                input message, first ref, ref count
+    output   I I I H H H H B x    output message, trigger route, first ref, ref count, cycle time,
+                                  min interval, heartbeat, flags
+    ref      I h                  signal, page (multiplexor value, -1 on every page, -2 the multiplexor)
+    strings  NUL-terminated UTF-8 names
+
+Counts, indexes and string offsets are 32-bit, as the records and names of
+a DBC with thousands of messages pass 64 KiB.
+
+A route lists the input signals its frames decode into the signal state, an
+output the signals it encodes from that state and the route whose frames
+send it, or start its cycle when it has a cycle time (milliseconds, 0 for
+none), with its transmit policy. A pass-through output has the forward flag
+and no signals: the frames of its trigger route, which may have no signals
+either, are sent unchanged under its ID. The refs of a multiplexed route
+carry the page of each signal, the multiplexor first. Only what the frame
+path needs is stored: the routed messages and their matched signals,
+without units, ranges and other descriptive fields, and the signal matching
+is done by the compiler, as are unit conversions and the folding of the
+scaling into integer transforms (see translator.fold_signals): folded input
+signals are stored unscaled, and output signals with their folded or
+converted scaling. Float factors and offsets are kept as doubles, and the
+multipliers and addends of folded signals as ints, which CircuitPython's
+30-bit floats would round, so a plan built from the binary config
+translates exactly like one built from the JSON. Names are only decoded for
+messages: signals are keyed in the state by the string table offset of
+their name, which is the same for every signal of that name. The byte
+copies of translator.plan_byte_copies are found again when the plan is
+built, as they need no stored data.
+"""
+import struct
+from array import array
+from translator import (build_routing_index, match_signals, match_forwards, output_message_length, signal_byte_order,
+                        is_extended_config, fold_signals, transmit_policy, plan_byte_copies, SignalTable, Route,
+                        Destination, Forward, input_signal_pages, EVERY_PAGE,
+                        SIGNAL_SIGNED, SIGNAL_MOTOROLA)
+
+MAGIC = b"CANT"
+VERSION = 9
+
+HEADER = "<4sBxIIIIII"
+MESSAGE = "<IBBIHI"
+SIGNAL = "<BBBxddiifII"
+ROUTE = "<IIH"
+OUTPUT = "<IIIHHHHBx"
+REF = "<Ih"
+
+HEADER_SIZE = struct.calcsize(HEADER)
+MESSAGE_SIZE = struct.calcsize(MESSAGE)
+SIGNAL_SIZE = struct.calcsize(SIGNAL)
+ROUTE_SIZE = struct.calcsize(ROUTE)
+OUTPUT_SIZE = struct.calcsize(OUTPUT)
+REF_SIZE = struct.calcsize(REF)
+
+# Signal flags are translator.SIGNAL_SIGNED and SIGNAL_MOTOROLA
+MESSAGE_EXTENDED = 0x01
+OUTPUT_ON_CHANGE = 0x01
+OUTPUT_FORWARD = 0x02
+
+def pack_config(input_db, output_db):
+    """
+    Compile input and output DBC JSON into the binary config.
+
+    Runs on the host. Signals are matched with translator.match_signals,
+    which reports what cannot be translated, and only the matched routes
+    and outputs are stored, with the messages they name and only their
+    matched signals.
+    """
+    messages = []
+    signals = []
+    strings = bytearray()
+    string_offsets = {}
+    message_index = {}
+    signal_index = {}
+
+    def add_string(name):
+        if name not in string_offsets:
+            string_offsets[name] = len(strings)
+            strings.extend(name.encode("utf-8") + b"\0")
+        return string_offsets[name]
+
+    # Store a message with the signals named, once, returns its index.
+    # scale(signal_name, signal) gives (factor, offset, deadband, divisor) of a signal
+    def add_message(key, name, cfg, length, signal_names, scale):
+        if key in message_index:
+            return message_index[key]
+        message_index[key] = len(messages)
+        flags = MESSAGE_EXTENDED if is_extended_config(cfg) else 0
+        messages.append(struct.pack(MESSAGE, cfg["id"], length, flags, len(signals), len(signal_names), add_string(name)))
+        for signal_name in signal_names:
+            signal = cfg["signals"][signal_name]
+            signal_index[(key, signal_name)] = len(signals)
+            flags = (SIGNAL_SIGNED if signal.get("is_signed", False) else 0) | \
+                    (SIGNAL_MOTOROLA if signal_byte_order(signal) == "Motorola" else 0)
+            factor, offset, deadband, divisor = scale(signal_name, signal)
+            # Folded signals keep their multiplier and addend as ints
+            scaling = (0, 0, factor, offset) if divisor else (factor, offset, 0, 0)
+            signals.append(struct.pack(SIGNAL, signal["start_bit"], signal["length"], flags, *scaling, deadband, divisor,
+                                       add_string(signal_name)))
+        return message_index[key]
+
+    outputs, used = match_signals(input_db, output_db)
+    scales, input_factors, deadband_factors = fold_signals(input_db, output_db, outputs, used)
+
+    def input_scale(signal_name, signal):
+        if signal_name in input_factors:
+            return 1, 0, 0, 0
+        return signal.get("factor", 1), signal.get("offset", 0), 0, 0
+
+    def output_scale(output_name):
+        def scale(signal_name, signal):
+            deadband = signal.get("deadband", 0) * deadband_factors.get((output_name, signal_name), 1)
+            factor, offset, divisor = scales.get((output_name, signal_name)) or \
+                (signal.get("factor", 1), signal.get("offset", 0), 0)
+            return factor, offset, deadband, divisor
+        return scale
+
+    routes = []
+    route_index = {}
+    output_records = []
+    refs = []
+    for input_name, signal_names in used.items():
+        cfg = input_db[input_name]
+        pages = input_signal_pages(input_name, cfg, signal_names)
+        # A multiplexed signal has a ref per page but is stored once
+        stored = list(dict.fromkeys(signal_name for signal_name, _ in pages))
+        route_index[input_name] = len(routes)
+        routes.append(struct.pack(ROUTE, add_message(("input", input_name), input_name, cfg, cfg.get("length", 8),
+                                                     stored, input_scale), len(refs), len(pages)))
+        refs.extend(struct.pack(REF, signal_index[(("input", input_name), signal_name)], page) for signal_name, page in pages)
+    for output_name, trigger, signal_names in outputs:
+        cfg = output_db[output_name]
+        message = add_message(("output", output_name), output_name, cfg, output_message_length(output_name, cfg),
+                              signal_names, output_scale(output_name))
+        output_records.append(struct.pack(OUTPUT, message, route_index[trigger],
+                                          len(refs), len(signal_names), cfg.get("cycle_time", 0),
+                                          cfg.get("min_interval", 0), cfg.get("heartbeat", 0),
+                                          OUTPUT_ON_CHANGE if cfg.get("on_change") else 0))
+        refs.extend(struct.pack(REF, signal_index[(("output", output_name), signal_name)], EVERY_PAGE)
+                    for signal_name in signal_names)
+    for output_name, input_name in match_forwards(input_db, output_db):
+        if input_name not in route_index:
+            cfg = input_db[input_name]
+            route_index[input_name] = len(routes)
+            routes.append(struct.pack(ROUTE, add_message(("input", input_name), input_name, cfg, cfg.get("length", 8),
+                                                         [], input_scale), len(refs), 0))
+        # Forwarded frames keep their own length
+        message = add_message(("output", output_name), output_name, output_db[output_name], 0, [], input_scale)
+        output_records.append(struct.pack(OUTPUT, message, route_index[input_name], len(refs), 0, 0, 0, 0,
+                                          OUTPUT_FORWARD))
+
+    header = struct.pack(HEADER, MAGIC, VERSION, len(messages), len(signals), len(routes), len(output_records),
+                         len(refs), len(strings))
+    return (header + b"".join(messages) + b"".join(signals) + b"".join(routes) + b"".join(output_records) +
+            b"".join(refs) + bytes(strings))
+
+# Read the whole binary config with a single read
+def load_binary_config(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+def _sections(buffer):
+    magic, version, message_count, signal_count, route_count, output_count, ref_count, strings_size = struct.unpack_from(HEADER, buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} binary translation config, recompile it")
+    messages = HEADER_SIZE
+    signals = messages + message_count * MESSAGE_SIZE
+    routes = signals + signal_count * SIGNAL_SIZE
+    outputs = routes + route_count * ROUTE_SIZE
+    refs = outputs + output_count * OUTPUT_SIZE
+    strings = refs + ref_count * REF_SIZE
+    return messages, signals, routes, route_count, outputs, output_count, refs, strings
+
+def _string(buffer, strings, offset):
+    end = buffer.index(b"\0", strings + offset)
+    return str(buffer[strings + offset:end], "utf-8")
+
+# Decode a name from the string table, only done when a name is needed
+def config_string(buffer, offset):
+    return _string(buffer, _sections(buffer)[7], offset)
+
+# Copy the signal records of refs[first:first + count] into a SignalTable,
+# keyed by their name offsets. Returns their indexes in the table; their
+# (key, deadband) pairs are appended to deadbands when it is given.
+def _add_signals(table, buffer, signals, refs, first, count, deadbands=None):
+    indexes = array("H")
+    for ref in range(first, first + count):
+        index, page = struct.unpack_from(REF, buffer, refs + ref * REF_SIZE)
+        (start_bit, length, flags, factor, offset, multiplier, addend, deadband, divisor,
+         name) = struct.unpack_from(SIGNAL, buffer, signals + index * SIGNAL_SIZE)
+        byte_order = "Motorola" if flags & SIGNAL_MOTOROLA else "Intel"
+        if divisor:
+            factor, offset = multiplier, addend
+        indexes.append(table.add(name, start_bit, length, bool(flags & SIGNAL_SIGNED), factor, offset, byte_order, divisor,
+                                 page))
+        if deadbands is not None:
+            deadbands.append((name, deadband))
+    return indexes
+
+def build_translation_plan_from_binary(buffer):
+    """
+    Build the same routing index of routes as translator.build_translation_plan,
+    straight from the records of a binary config.
+    """
+    messages, signals, routes_start, route_count, outputs_start, output_count, refs, strings = _sections(buffer)
+    input_table = SignalTable()
+    output_table = SignalTable()
+    state = {}
+    routes = []
+    for route_index in range(route_count):
+        input_index, first_ref, ref_count = struct.unpack_from(ROUTE, buffer, routes_start + route_index * ROUTE_SIZE)
+        input_id, _, input_flags, _, _, input_name = struct.unpack_from(MESSAGE, buffer, messages + input_index * MESSAGE_SIZE)
+        indexes = _add_signals(input_table, buffer, signals, refs, first_ref, ref_count)
+        routes.append(Route(_string(buffer, strings, input_name), input_id, bool(input_flags & MESSAGE_EXTENDED),
+                            input_table, indexes, [], values=state))
+
+    for output_index in range(output_count):
+        (message_index, trigger, first_ref, ref_count, cycle_time, min_interval, heartbeat,
+         output_flags) = struct.unpack_from(OUTPUT, buffer, outputs_start + output_index * OUTPUT_SIZE)
+        output_id, output_length, message_flags, _, _, output_name = struct.unpack_from(MESSAGE, buffer, messages + message_index * MESSAGE_SIZE)
+        if output_flags & OUTPUT_FORWARD:
+            routes[trigger].forwards.append(Forward(_string(buffer, strings, output_name), output_id,
+                                                    bool(message_flags & MESSAGE_EXTENDED)))
+            continue
+        deadbands = []
+        indexes = _add_signals(output_table, buffer, signals, refs, first_ref, ref_count, deadbands)
+        policy = transmit_policy(output_length, bool(output_flags & OUTPUT_ON_CHANGE), min_interval, heartbeat, deadbands)
+        routes[trigger].destinations.append(Destination(_string(buffer, strings, output_name), output_id,
+                                                        bool(message_flags & MESSAGE_EXTENDED), output_length,
+                                                        output_table, indexes, cycle_time=cycle_time, policy=policy))
+    plan_byte_copies(routes)
+    return build_routing_index({route.name: route for route in routes})
@@ -0,0 +1,281 @@
+from os import getenv
+from time import sleep, monotonic
+import canlog
+from scheduler import TransmitScheduler
+from ticks import ticks_ms, ticks_diff
+from translator import lookup_by_id
+
+# Frames handled from one bus before the other one is polled again, so a
+# busy bus cannot starve the other
+DRAIN_BATCH = int(getenv("CAN_DRAIN_BATCH") or 32)
+
+# Seconds to idle when neither bus has a pending frame
+IDLE_SLEEP = float(getenv("CAN_IDLE_SLEEP") or 0.0005)
+
+# A fully loaded 500 kbit/s bus carries about 4000 frames/s, which the
+# can1_received/can2_received rates in the counter report should keep up with.
+# Every pass of the main loop should also finish within the latency target, so
+# no pending frame waits longer than that before it is handled.
+TARGET_PASS_LATENCY_MS = 5
+
+# Seconds between CAN2 telemetry snapshots, 0 disables them
+TELEMETRY_PERIOD = getenv("CAN_TELEMETRY_PERIOD")
+TELEMETRY_PERIOD = 20 if TELEMETRY_PERIOD is None else float(TELEMETRY_PERIOD)
+
+# Cycle time in milliseconds for output messages without one of their own,
+# 0 sends those when their trigger frame arrives instead
+TX_CYCLE_TIME = int(getenv("CAN_TX_CYCLE_TIME") or 0)
+
+class Bridge:
+    """
+    Translates frames between two CAN buses following a translation plan.
+
+    can1 and can2 only need the canio/MCP2515 surface used here (send,
+    restart and the diagnostics properties), and the listeners only
+    in_waiting() and receive(), so the same bridge runs on the board and on
+    the virtual bus in vbus.py.
+    message_class builds the outgoing messages, e.g. canio.Message.
+    Received frames of remote_classes, the RemoteTransmissionRequest classes
+    of the drivers, carry no data and are only counted in frames_remote.
+
+    Output messages with a cycle time are not sent by their trigger frames:
+    the first trigger frame hands them to the transmit scheduler, which then
+    sends them every cycle from the latest signal values. Pass-through
+    frames are forwarded before, and without, any decoding. A frame of a
+    multiplexed message only sends the destinations its page feeds.
+    """
+
+    def __init__(self, can1, can2, can1_listener, can2_listener, plan, message_class, remote_classes=()):
+        self.can1 = can1
+        self.can2 = can2
+        self.can1_listener = can1_listener
+        self.can2_listener = can2_listener
+        self.plan = plan
+        self.remote_classes = tuple(remote_classes)
+        self.last_counter_report = monotonic()
+        self.next_telemetry = monotonic() + TELEMETRY_PERIOD
+
+        # Last CAN2 register snapshot. The settings never change, so they are
+        # read once here and only the status registers are refreshed.
+        self.can2_snapshot = {
+            "baudrate": can2.baudrate,
+            "loopback": can2.loopback,
+            "silent": can2.silent,
+            "state": None,
+            "unread_message_count": None,
+            "transmit_error_count": None,
+            "receive_error_count": None,
+            "time": None,
+        }
+
+        # One outgoing Message per destination, refilled for every frame so
+        # that translating a frame does not allocate, with the destination's
+        # standard or extended ID. Destinations with a cycle time move to
+        # route.scheduled until their first trigger frame.
+        self.scheduler = TransmitScheduler()
+        for routes in plan:
+            for route in routes.values():
+                destinations = []
+                for destination in route.destinations:
+                    destination.message = message_class(id=destination.id, data=bytes(destination.length),
+                                                        extended=destination.extended)
+                    if not destination.cycle_time:
+                        destination.cycle_time = TX_CYCLE_TIME
+                    if destination.cycle_time:
+                        route.scheduled.append(destination)
+                    else:
+                        destinations.append(destination)
+                route.destinations = destinations
+                # A frame of a multiplexed message only sends the destinations of its page
+                if route.multiplexed:
+                    route.page_destinations = route.destinations_by_page(destinations)
+                for forward in route.forwards:
+                    forward.message = message_class(id=forward.id, data=bytes(0), extended=forward.extended)
+
+    def bus_name(self, bus):
+        return "CAN1" if bus == self.can1 else "CAN2"
+
+    # Refresh the cached CAN2 status registers. Each read is an SPI transaction
+    # on the MCP2515, so this only runs from the low-rate telemetry task.
+    def take_can2_snapshot(self, now):
+        can2 = self.can2
+        snapshot = self.can2_snapshot
+        snapshot["state"] = can2.state
+        snapshot["unread_message_count"] = can2.unread_message_count
+        snapshot["transmit_error_count"] = getattr(can2, "transmit_error_count", None)
+        snapshot["receive_error_count"] = getattr(can2, "receive_error_count", None)
+        snapshot["time"] = now
+
+    # Print the cached CAN2 snapshot, without touching the controller
+    def print_can2_diagnostics(self):
+        snapshot = self.can2_snapshot
+        canlog.info("CAN2 Diagnostics:")
+        canlog.info(f"Baudrate: {snapshot['baudrate']}")
+        canlog.info(f"Loopback: {snapshot['loopback']}")
+        canlog.info(f"Silent: {snapshot['silent']}")
+        canlog.info(f"State: {snapshot['state']}")
+        canlog.info(f"Unread Message Count: {snapshot['unread_message_count']}")
+        canlog.info(f"Error counts: TX {snapshot['transmit_error_count']}, RX {snapshot['receive_error_count']}")
+
+    def translate_and_send(self, message, can_in, can_out):
+        # Debug messages are only formatted when debug logging is enabled
+        if canlog.debug_enabled:
+            canlog.debug(f"Translating message from {self.bus_name(can_in)}: ID={message.id:x} Data={message.data.hex()}")
+
+        # Find the planned route for this input message. IDs without a route were
+        # already reported when the plan was built.
+        route = lookup_by_id(self.plan, message)
+        if not route:
+            canlog.count("frames_unrouted")
+            return
+
+        if route.forwards:
+            self.forward(route.forwards, message.data, can_out)
+            # Pass-through only: nothing to decode
+            if not route.translates:
+                return
+
+        extracted_signals = route.decode(message.data, route.values)
+        if canlog.debug_enabled:
+            canlog.debug(f"Extracted {extracted_signals}")
+
+        destinations = route.destinations
+        if route.page_destinations is not None:
+            page_destinations = route.page_destinations
+            destinations = page_destinations.get(extracted_signals[route.page_key], page_destinations[None])
+        for destination in destinations:
+            self.send_destination(destination, can_out, extracted_signals)
+
+        # Periodic destinations start their schedule with the first trigger frame
+        if route.scheduled:
+            now = ticks_ms()
+            for destination in route.scheduled:
+                self.scheduler.add(destination, can_out, route.values, destination.cycle_time, now)
+            route.scheduled = []
+
+    # Encode destination from values into its preallocated Message and send
+    # it, unless its transmit policy holds the payload back
+    def send_destination(self, destination, can_out, values):
+        policy = destination.policy
+        try:
+            if policy is None:
+                output_data = destination.encode(values, destination.buffer)
+            else:
+                output_data = destination.encode(policy.hold(values), destination.buffer)
+                now = ticks_ms()
+                if not policy.due(output_data, now):
+                    canlog.count("frames_held")
+                    return
+            output_message = destination.message
+            output_message.data = output_data
+
+            # Send the message on the opposing bus
+            if canlog.debug_enabled:
+                canlog.debug(f"Attempting to send on {self.bus_name(can_out)}: ID={destination.id:x} Data={output_data.hex()}")
+
+            try:
+                can_out.send(output_message)
+            except RuntimeError:
+                # canio and the MCP2515 driver raise when the controller has
+                # no free transmit buffer, which is counted but not printed
+                canlog.count("sends_refused")
+                return
+            canlog.count("frames_sent")
+            if policy is not None:
+                policy.sent(destination, now)
+
+        except Exception as e:
+            canlog.count("send_errors")
+            canlog.error(f"sending output message: {type(e).__name__}: {str(e)}")
+
+    # Send a frame's data unchanged under the ID of each pass-through
+    def forward(self, forwards, data, can_out):
+        for forward in forwards:
+            try:
+                output_message = forward.message
+                output_message.data = data
+                if canlog.debug_enabled:
+                    canlog.debug(f"Forwarding on {self.bus_name(can_out)}: ID={forward.id:x} Data={data.hex()}")
+                try:
+                    can_out.send(output_message)
+                except RuntimeError:
+                    # No free transmit buffer, as in send_destination
+                    canlog.count("forwards_refused")
+                    continue
+                canlog.count("frames_forwarded")
+            except Exception as e:
+                canlog.count("forward_errors")
+                canlog.error(f"forwarding message: {type(e).__name__}: {str(e)}")
+
+    # Handle up to DRAIN_BATCH pending frames from one bus, in arrival order.
+    # This is the only place frames are read, so every received frame reaches
+    # the translator. Returns how many were handled.
+    def poll_bus(self, listener, can_in, can_out, counter_name):
+        # On the MCP2515 every in_waiting() is an SPI transaction, so ask once
+        # and take that many frames; later arrivals are picked up next pass
+        pending = min(listener.in_waiting(), DRAIN_BATCH)
+        handled = 0
+        while handled < pending:
+            message = listener.receive()
+            if message is None:
+                break
+            handled += 1
+            canlog.count(counter_name)
+            if isinstance(message, self.remote_classes):
+                canlog.count("frames_remote")
+                continue
+            if canlog.debug_enabled:
+                canlog.debug(f"{self.bus_name(can_in)} received: ID={message.id:x} Data={message.data.hex()}")
+            self.translate_and_send(message, can_in, can_out)
+        return handled
+
+    # One pass of the main loop, returns how many frames were handled
+    def poll(self):
+        pass_start = ticks_ms()
+        handled = self.poll_bus(self.can1_listener, self.can1, self.can2, "can1_received")
+        handled += self.poll_bus(self.can2_listener, self.can2, self.can1, "can2_received")
+
+        # Periodic output messages due by now
+        if self.scheduler.count:
+            self.scheduler.run(ticks_ms(), self.send_destination)
+
+        if handled:
+            pass_ms = ticks_diff(ticks_ms(), pass_start)
+            canlog.peak("pass_ms", pass_ms)
+            if pass_ms > TARGET_PASS_LATENCY_MS:
+                canlog.count("passes_over_latency_target")
+
+        now = monotonic()
+
+        # Low-rate telemetry task: snapshot the CAN2 status registers
+        if TELEMETRY_PERIOD and now >= self.next_telemetry:
+            self.take_can2_snapshot(now)
+            if canlog.info_enabled:
+                self.print_can2_diagnostics()
+            self.next_telemetry = now + TELEMETRY_PERIOD
+
+        # Periodically report the counters
+        if canlog.counters_period and now - self.last_counter_report >= canlog.counters_period:
+            canlog.report_counters(now - self.last_counter_report)
+            self.last_counter_report = now
+
+        return handled
+
+    # Main loop
+    def run(self):
+        while True:
+            try:
+                # Only idle when both buses are empty
+                if not self.poll():
+                    sleep(IDLE_SLEEP)
+
+            except Exception as e:
+                canlog.count("loop_errors")
+                canlog.error(f"during CAN operation: {type(e).__name__}: {str(e)}")
+                # If there's an error, try to restart CAN2
+                try:
+                    self.can2.restart()
+                    canlog.info("CAN2 restarted after error")
+                except Exception as restart_error:
+                    canlog.error(f"restarting CAN2: {type(restart_error).__name__}: {str(restart_error)}")
+                sleep(IDLE_SLEEP)
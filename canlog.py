@@ -0,0 +1,78 @@
+import os
+
+# Log levels. COUNTERS turns every message off and only reports counters.
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+COUNTERS = 50
+
+LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "COUNTERS": COUNTERS}
+
+# Event counters, kept at every level
+counters = {}
+_reported_counters = {}
+
+# Highest values seen since the last report, such as worst-case latencies
+peaks = {}
+
+def set_level(level):
+    """
+    Set the log level and the *_enabled flags derived from it.
+
+    Call sites test the flag before building a message, e.g.
+    `if canlog.debug_enabled: canlog.debug(f"...")`, so a disabled message
+    costs one attribute lookup and is never formatted.
+    """
+    global level_value, debug_enabled, info_enabled, warning_enabled, error_enabled
+    level_value = level
+    debug_enabled = level <= DEBUG
+    info_enabled = level <= INFO
+    warning_enabled = level <= WARNING
+    error_enabled = level <= ERROR
+
+# The level is fixed at load time from CAN_LOG_LEVEL in settings.toml
+set_level(LEVEL_NAMES.get(os.getenv("CAN_LOG_LEVEL") or "INFO", INFO))
+
+# Seconds between counter reports, 0 disables them
+counters_period = os.getenv("CAN_LOG_COUNTERS_PERIOD")
+counters_period = 10 if counters_period is None else float(counters_period)
+
+def debug(message):
+    if debug_enabled:
+        print(message)
+
+def info(message):
+    if info_enabled:
+        print(message)
+
+def warning(message):
+    if warning_enabled:
+        print(f"Warning: {message}")
+
+def error(message):
+    if error_enabled:
+        print(f"Error: {message}")
+
+def count(name, amount=1):
+    counters[name] = counters.get(name, 0) + amount
+
+def peak(name, value):
+    if value > peaks.get(name, 0):
+        peaks[name] = value
+
+# Print the counters with their rate over the last `elapsed` seconds, then the
+# peaks since the previous report
+def report_counters(elapsed=0):
+    parts = []
+    for name, value in sorted(counters.items()):
+        if elapsed:
+            rate = (value - _reported_counters.get(name, 0)) / elapsed
+            parts.append(f"{name}={value} ({rate:.0f}/s)")
+        else:
+            parts.append(f"{name}={value}")
+        _reported_counters[name] = value
+    for name, value in sorted(peaks.items()):
+        parts.append(f"max {name}={value}")
+    peaks.clear()
+    print("Counters: " + ", ".join(parts))
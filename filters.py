@@ -0,0 +1,204 @@
+import canlog
+
+STANDARD_ID_BITS = 11
+EXTENDED_ID_BITS = 29
+
+# Filter banks of each controller, as the number of filters sharing one mask.
+# canio on the ESP32 (TWAI dual filter mode) has two filters with their own
+# mask. The MCP2515 has mask 0 with filters 0-1 and mask 1 with filters 2-5.
+# The adafruit_mcp2515 driver tells the banks apart by mask value: each
+# distinct mask among the matches takes the next mask register, starting with
+# mask 0, so banks sharing a mask must be listed in bank order and have masks
+# of their own (see _shares_masks).
+CANIO_BANKS = (1, 1)
+MCP2515_BANKS = (2, 4)
+
+# Split points tried when dividing IDs between banks. Kept small so the
+# search stays quick at boot even for large DBCs.
+MAX_SPLIT_CANDIDATES = 8
+
+# Narrow a full mask until the IDs collapse onto at most filter_count values.
+# Each step clears the bit that merges the most IDs, among the bits the IDs
+# differ in, as clearing a bit they all share accepts more for nothing.
+# Returns (mask, values).
+def _fit_bank(ids, filter_count, id_bits):
+    mask = (1 << id_bits) - 1
+    values = set(ids)
+    while len(values) > filter_count:
+        any_bits = 0
+        all_bits = mask
+        for value in values:
+            any_bits |= value
+            all_bits &= value
+        differing = any_bits & ~all_bits
+        best_values = None
+        best_bit = 0
+        bit = 1
+        while bit <= mask:
+            if differing & bit:
+                candidate = {value & ~bit for value in values}
+                if best_values is None or len(candidate) < len(best_values):
+                    best_values = candidate
+                    best_bit = bit
+            bit <<= 1
+        mask &= ~best_bit
+        values = best_values
+    return mask, sorted(values)
+
+# Number of IDs a bank accepts: each filter value passes every ID whose masked bits match
+def _accepted_count(mask, values, id_bits):
+    free_bits = id_bits - bin(mask).count("1")
+    return len(values) << free_bits
+
+# Clear the one mask bit that leaves the fewest values, for a bank whose mask
+# has to differ from another one. Returns (mask, values).
+def _narrow_once(mask, values):
+    best = None
+    bit = 1
+    while bit <= mask:
+        if mask & bit:
+            candidate = sorted({value & ~bit for value in values})
+            if best is None or len(candidate) < len(best[1]):
+                best = (mask & ~bit, candidate)
+        bit <<= 1
+    return best
+
+# Whether the driver places the filters of these banks by their mask, which
+# is the case when filters share a mask: the MCP2515 but not canio
+def _shares_masks(banks):
+    return len(banks) > 1 and max(banks) > 1
+
+def fit_acceptance_filters(ids, banks, id_bits=STANDARD_ID_BITS):
+    """
+    Fit a set of IDs into controller filter banks.
+
+    Returns (filters, accepted) where filters is a list of (id, mask) pairs
+    in bank order and accepted is how many distinct IDs they let through.
+    When the IDs fit one filter each, every filter is exact and accepted
+    equals len(ids). Otherwise the sorted IDs are split between the banks
+    and each bank's mask is narrowed until its IDs fit, accepting a superset
+    of them that the routing index still rejects in software. Where the
+    banks share masks, the second bank always gets a mask of its own, so
+    only IDs that fit the first bank get exact filters.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return [], 0
+    full_mask = (1 << id_bits) - 1
+    shares_masks = _shares_masks(banks)
+    if len(ids) <= (banks[0] if shares_masks else sum(banks)):
+        return [(can_id, full_mask) for can_id in ids], len(ids)
+
+    # Try dividing the sorted IDs into one contiguous run per bank, either
+    # run in either bank, and keep the division that accepts the fewest IDs
+    best = None
+    step = max(1, len(ids) // MAX_SPLIT_CANDIDATES)
+    splits = range(step, len(ids), step) if len(banks) == 2 else (len(ids),)
+    for low_first in ((True, False) if len(banks) == 2 else (True,)):
+        for split in splits:
+            runs = (ids[:split], ids[split:]) if len(banks) == 2 else (ids,)
+            if not low_first:
+                runs = runs[::-1]
+            fitted = [_fit_bank(run, filter_count, id_bits) for run, filter_count in zip(runs, banks) if run]
+            if shares_masks and len(fitted) == 2 and fitted[0][0] == fitted[1][0] and fitted[0][0]:
+                # One mask would take both banks' filters, so narrow
+                # whichever bank that costs the fewest accepted IDs. Masks
+                # of 0 accept every ID, which is not filtered at all.
+                first, second = fitted
+                fitted = min(([_narrow_once(*first), second], [first, _narrow_once(*second)]),
+                             key=lambda banks_fitted: sum(_accepted_count(mask, values, id_bits)
+                                                          for mask, values in banks_fitted))
+            filters = [(value, mask) for mask, values in fitted for value in values]
+            # Banks may overlap, so the sum is an upper bound
+            accepted = min(sum(_accepted_count(mask, values, id_bits) for mask, values in fitted), full_mask + 1)
+            if best is None or accepted < best[1]:
+                best = (filters, accepted)
+    return best
+
+def fit_listener_filters(standard_ids, extended_ids, banks):
+    """
+    Fit the standard and extended IDs of a routing index into filter banks.
+
+    Returns (filters, accepted) where filters is a list of (id, mask,
+    extended) triples in bank order and accepted is the (standard, extended)
+    pair of how many IDs of each kind they let through. The filters of a
+    bank are all of one kind, as an MCP2515 mask with extended bits set also
+    compares the first data bytes of standard frames. With both kinds, the
+    banks are divided between them every way in bank order and the division
+    accepting the smallest share of both ID spaces is kept; with a single
+    bank, every frame is accepted.
+    """
+    if not extended_ids:
+        filters, accepted = fit_acceptance_filters(standard_ids, banks)
+        return [(can_id, mask, False) for can_id, mask in filters], (accepted, 0)
+    if not standard_ids:
+        filters, accepted = fit_acceptance_filters(extended_ids, banks, EXTENDED_ID_BITS)
+        return [(can_id, mask, True) for can_id, mask in filters], (0, accepted)
+
+    best = None
+    for split in range(1, len(banks)):
+        for standard_first in (True, False):
+            first, second = banks[:split], banks[split:]
+            standard_banks, extended_banks = (first, second) if standard_first else (second, first)
+            standard_filters, standard_accepted = fit_acceptance_filters(standard_ids, standard_banks)
+            extended_filters, extended_accepted = fit_acceptance_filters(extended_ids, extended_banks, EXTENDED_ID_BITS)
+            # The driver would merge the banks of equal masks, and it turns
+            # mask 0 into an exact mask instead of accepting every ID
+            if _shares_masks(banks) and (standard_filters[0][1] == extended_filters[0][1]
+                                         or not standard_filters[0][1] or not extended_filters[0][1]):
+                continue
+            share = (standard_accepted / (1 << STANDARD_ID_BITS)) + (extended_accepted / (1 << EXTENDED_ID_BITS))
+            if best is None or share < best[0]:
+                standard_filters = [(can_id, mask, False) for can_id, mask in standard_filters]
+                extended_filters = [(can_id, mask, True) for can_id, mask in extended_filters]
+                filters = standard_filters + extended_filters if standard_first else extended_filters + standard_filters
+                best = (share, filters, (standard_accepted, extended_accepted))
+    if best is None:
+        return [], (1 << STANDARD_ID_BITS, 1 << EXTENDED_ID_BITS)
+    return best[1], best[2]
+
+def describe_filters(bus_name, ids, filters, accepted, id_bits=STANDARD_ID_BITS):
+    if accepted >= 1 << id_bits:
+        return f"{bus_name} filters: {len(ids)} IDs cannot be narrowed by the filter banks, accepting all frames"
+    if not filters:
+        return f"{bus_name} filters: no IDs to accept"
+    if accepted == len(ids):
+        return f"{bus_name} filters: {len(ids)} IDs fit {len(filters)} exact filters"
+    return f"{bus_name} filters: {len(ids)} IDs do not fit the filter banks, {len(filters)} masked filters accept up to {accepted} IDs"
+
+def open_filtered_listener(bus, bus_name, routing_index, banks, match_class, timeout=0):
+    """
+    Open a listener that only accepts the IDs of a routing index in hardware.
+
+    Standard and extended IDs get filters of their own kind (see
+    fit_listener_filters). Falls back to masked filters when the IDs do not
+    fit the banks, and to an unfiltered listener when the controller
+    rejects the filters or no kind can be narrowed. Unwanted frames are then
+    dropped by the routing index in software.
+    """
+    standard, extended = routing_index
+    if not standard and not extended:
+        canlog.info(f"{bus_name} filters: accepting all frames")
+        return bus.listen(timeout=timeout)
+
+    standard_ids = sorted(standard)
+    extended_ids = sorted(extended)
+    filters, accepted = fit_listener_filters(standard_ids, extended_ids, banks)
+    narrowed = False
+    kinds = (("standard", standard_ids, STANDARD_ID_BITS, False), ("extended", extended_ids, EXTENDED_ID_BITS, True))
+    for (kind, ids, id_bits, is_extended), kind_accepted in zip(kinds, accepted):
+        if not ids:
+            continue
+        # Only name the kind when the index has extended IDs
+        label = f"{bus_name} {kind}" if extended_ids else bus_name
+        kind_filters = [(can_id, mask) for can_id, mask, filter_extended in filters if filter_extended == is_extended]
+        canlog.info(describe_filters(label, ids, kind_filters, kind_accepted, id_bits))
+        narrowed = narrowed or kind_accepted < 1 << id_bits
+    if not narrowed:
+        return bus.listen(timeout=timeout)
+    try:
+        return bus.listen(matches=[match_class(can_id, mask=mask, extended=is_extended)
+                                   for can_id, mask, is_extended in filters], timeout=timeout)
+    except Exception as e:
+        canlog.warning(f"{bus_name} rejected the acceptance filters ({type(e).__name__}: {str(e)}). Accepting all frames.")
+        return bus.listen(timeout=timeout)
@@ -0,0 +1,78 @@
+import canlog
+from ticks import ticks_add, ticks_diff
+
+# Slots of the timer wheel, one per millisecond tick. Deadlines further away
+# than one turn stay in their slot and are skipped until their tick comes
+# round. A power of two, so a slot keeps its ticks across the wraparound.
+WHEEL_SLOTS = 256
+
+class TransmitScheduler:
+    """
+    Hashed timer wheel of periodic output messages.
+
+    Each entry is a list [deadline tick, period in ms, destination, bus,
+    values] kept in the slot of its deadline, in the millisecond ticks of
+    ticks.ticks_ms(). A deadline is due once its tick has started, so frames
+    leave up to one tick plus one loop pass late. run() visits the slots of
+    the ticks elapsed since the previous run, calls send for every due entry
+    and puts it back one period later, so the schedule keeps its phase
+    instead of drifting by the lateness of each send. When a whole period was
+    missed, the missed frames are counted in tx_deadline_misses and not
+    caught up. How late each frame was sent is tracked in the tx_jitter_ms
+    peak.
+    """
+
+    def __init__(self, slot_count=WHEEL_SLOTS):
+        self.slots = [[] for _ in range(slot_count)]
+        self.tick = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _insert(self, entry):
+        self.slots[entry[0] % len(self.slots)].append(entry)
+
+    # Send destination on bus every period_ms from the tick now on, encoded
+    # from values
+    def add(self, destination, bus, values, period_ms, now):
+        # Slots up to self.tick were already visited, so the first send is due
+        # on the next tick if now's tick was
+        deadline = now
+        if self.tick is not None and ticks_diff(deadline, self.tick) <= 0:
+            deadline = ticks_add(self.tick, 1)
+        self._insert([deadline, max(1, period_ms), destination, bus, values])
+        self.count += 1
+
+    def run(self, now, send):
+        """Call send(destination, bus, values) for every entry due at the tick now."""
+        slots = self.slots
+        slot_count = len(slots)
+        # After a long pass only one turn of the wheel needs visiting
+        visits = slot_count if self.tick is None else min(ticks_diff(now, self.tick), slot_count)
+        tick = ticks_add(now, 1 - visits)
+        self.tick = now
+        while visits > 0:
+            slot = slots[tick % slot_count]
+            tick = ticks_add(tick, 1)
+            visits -= 1
+            i = 0
+            while i < len(slot):
+                entry = slot[i]
+                deadline = entry[0]
+                late = ticks_diff(now, deadline)
+                if late < 0:
+                    i += 1
+                    continue
+                # Remove by moving the last entry here, which is examined next
+                slot[i] = slot[-1]
+                slot.pop()
+
+                send(entry[2], entry[3], entry[4])
+                canlog.peak("tx_jitter_ms", late)
+                period = entry[1]
+                missed = late // period
+                if missed:
+                    canlog.count("tx_deadline_misses", missed)
+                entry[0] = ticks_add(deadline, (missed + 1) * period)
+                self._insert(entry)
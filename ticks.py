@@ -0,0 +1,25 @@
+# Millisecond ticks that stay small ints. time.monotonic_ns() passes the
+# small int range within a second of boot on CircuitPython, so every call
+# allocates; supervisor.ticks_ms() wraps round at TICKS_PERIOD instead, and
+# ticks are only ever compared through ticks_diff().
+TICKS_PERIOD = 1 << 29
+TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+try:
+    from supervisor import ticks_ms
+except ImportError:
+    from time import monotonic_ns
+
+    # On the host, the same wrapping counter from the monotonic clock
+    def ticks_ms():
+        return (monotonic_ns() // 1_000_000) & TICKS_MAX
+
+# The tick delta milliseconds after ticks
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+# Signed milliseconds from start to end, correct while they are less than
+# TICKS_PERIOD / 2 (about three days) apart
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALF) & TICKS_MAX) - _TICKS_HALF
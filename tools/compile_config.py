@@ -0,0 +1,160 @@
+"""
+Compile the input and output DBCs into the binary translation config read by
+the board at boot (see binconfig.py). Each DBC is given either as a .dbc
+file, parsed with tools/dbc.py, or as DBC JSON.
+
+--json-dir also writes the DBC JSON generated from .dbc files, for boards
+booting from JSON. --check compares the result with existing DBC JSON files:
+signal by signal, and by translating the same frames with both and
+comparing the output bytes. It exits non-zero when they differ.
+Run with: python tools/compile_config.py input_dbc.dbc output_dbc.dbc translation.bin [--check input_dbc.json output_dbc.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import canlog
+from binconfig import pack_config
+from dbc import read_dbc, dbc_to_config
+from translator import load_dbc_json, build_translation_plan, output_message_length, is_extended_config
+
+# Signal fields compared by --check, the layout ones first
+SIGNAL_FIELDS = ("start_bit", "length", "is_signed", "byte_order", "factor", "offset", "min_value", "max_value", "unit")
+
+# Random payloads translated per routed ID by --check, besides all zeros and all ones
+CHECK_PAYLOADS = 64
+
+
+def load_config(path):
+    if path.lower().endswith(".dbc"):
+        start = perf_counter()
+        database = read_dbc(path)
+        config = dbc_to_config(database)
+        signal_count = sum(len(message["signals"]) for message in config.values())
+        print(f"Parsed {path}: {len(config)} messages, {signal_count} signals in {(perf_counter() - start) * 1000:.1f} ms")
+        return config
+    return load_dbc_json(path)
+
+
+# Differences between two DBC JSON configs, as readable lines. Output
+# messages are compared at the length they are sent with, input messages at
+# their stored length, 8 if none is given, as frames of any length decode.
+def config_differences(config, reference, outputs=False):
+    differences = []
+    for message_name, message in config.items():
+        reference_message = reference.get(message_name)
+        if reference_message is None:
+            differences.append(f"{message_name}: missing from JSON")
+            continue
+        if message["id"] != reference_message["id"]:
+            differences.append(f"{message_name}: JSON id {reference_message['id']:x} != DBC {message['id']:x}")
+        if is_extended_config(message) != is_extended_config(reference_message):
+            differences.append(f"{message_name}: JSON extended {is_extended_config(reference_message)} != DBC {is_extended_config(message)}")
+        if outputs:
+            length = output_message_length(message_name, message)
+            reference_length = output_message_length(message_name, reference_message)
+        else:
+            length = message.get("length", 8)
+            reference_length = reference_message.get("length", 8)
+        if length != reference_length:
+            calculated = "" if "length" in reference_message or not outputs else " (calculated from its signals)"
+            differences.append(f"{message_name}: JSON length {reference_length}{calculated} != DBC {length}")
+        for signal_name, signal in message["signals"].items():
+            reference_signal = reference_message["signals"].get(signal_name)
+            if reference_signal is None:
+                differences.append(f"{message_name}.{signal_name}: missing from JSON")
+                continue
+            for field in SIGNAL_FIELDS:
+                if reference_signal.get(field) != signal.get(field):
+                    differences.append(f"{message_name}.{signal_name}: JSON {field} {reference_signal.get(field)} != DBC {signal.get(field)}")
+        for signal_name in reference_message["signals"]:
+            if signal_name not in message["signals"]:
+                differences.append(f"{message_name}.{signal_name}: missing from DBC")
+    for message_name in reference:
+        if message_name not in config:
+            differences.append(f"{message_name}: missing from DBC")
+    return differences
+
+
+# Translate the same frames with both plans, returns the routed IDs whose output bytes differ
+def translation_differences(plan, reference_plan):
+    rng = random.Random(1)
+    differing = []
+    for table, reference_table in zip(plan, reference_plan):
+        for can_id in sorted(set(table) | set(reference_table)):
+            route = table.get(can_id)
+            reference_route = reference_table.get(can_id)
+            if route is None or reference_route is None:
+                differing.append(can_id)
+                continue
+            payloads = [bytes(8), b"\xff" * 8] + [bytes(rng.getrandbits(8) for _ in range(8)) for _ in range(CHECK_PAYLOADS)]
+            for data in payloads:
+                if translate(route, data) != translate(reference_route, data):
+                    differing.append(can_id)
+                    break
+    return differing
+
+
+def translate(route, data):
+    values = route.decode(data, route.values)
+    return [(destination.id, destination.extended, bytes(destination.encode(values, destination.buffer)))
+            for destination in route.destinations] + [(forward.id, forward.extended, data) for forward in route.forwards]
+
+
+def check(input_db, output_db, input_json, output_json):
+    json_input_db = load_dbc_json(input_json)
+    json_output_db = load_dbc_json(output_json)
+    differences = config_differences(input_db, json_input_db) + config_differences(output_db, json_output_db, outputs=True)
+    for line in differences:
+        print(f"  {line}")
+
+    plan = build_translation_plan(input_db, output_db)
+    json_plan = build_translation_plan(json_input_db, json_output_db)
+    differing = translation_differences(plan, json_plan)
+    if differing:
+        print(f"  frames of IDs {', '.join(f'{can_id:x}' for can_id in differing)} translate to different bytes")
+    print(f"Check against {input_json} and {output_json}: {len(differences)} differences, "
+          f"{len(differing)} IDs translated differently")
+    return not differences and not differing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="input DBC, .dbc or DBC JSON")
+    parser.add_argument("output", help="output DBC, .dbc or DBC JSON")
+    parser.add_argument("binary", help="where to write the binary config, copied to /sd/translation.bin")
+    parser.add_argument("--json-dir", help="also write input_dbc.json and output_dbc.json here")
+    parser.add_argument("--check", nargs=2, metavar=("INPUT_JSON", "OUTPUT_JSON"),
+                        help="compare with existing DBC JSON files")
+    args = parser.parse_args()
+
+    input_db = load_config(args.input)
+    output_db = load_config(args.output)
+
+    config = pack_config(input_db, output_db)
+    with open(args.binary, "wb") as file:
+        file.write(config)
+    print(f"Wrote {len(config)} bytes to {args.binary}")
+
+    if args.json_dir:
+        for name, db in (("input_dbc.json", input_db), ("output_dbc.json", output_db)):
+            path = os.path.join(args.json_dir, name)
+            with open(path, "w") as file:
+                json.dump(db, file, indent=4)
+            print(f"Wrote {path}")
+
+    if args.check:
+        # pack_config already reported missing lengths and unmatched messages
+        canlog.set_level(canlog.ERROR)
+        if not check(input_db, output_db, *args.check):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Streaming .dbc parser for the host tools.
+
+The file is read line by line and only the statements the bridge can use are
+kept: BO_ messages, SG_ signals (including multiplexer indicators), VAL_
+value descriptions, BA_ and BA_DEF_DEF_ attributes, and SG_MUL_VAL_
+extended multiplexing ranges. Everything else, such as CM_ comments, is
+skipped; statements whose quoted strings span several lines are joined first.
+
+    database = read_dbc("input_dbc.dbc")
+    config = dbc_to_config(database)
+
+read_dbc returns plain dicts:
+
+    {"messages": {name: message}, "attributes": {name: value}, "attribute_defaults": {name: value}}
+
+where a message is {"id", "extended", "length", "sender", "signals", "attributes"}
+and a signal is {"start_bit", "length", "byte_order", "is_signed", "factor",
+"offset", "min_value", "max_value", "unit", "receivers", "multiplexer",
+"multiplex_value", "multiplex_ranges", "values", "attributes"} with the start
+bit as written in the DBC, i.e. the MSB for Motorola signals.
+dbc_to_config converts this to the DBC JSON format read by translator.py.
+"""
+import re
+
+from translator import motorola_lsb_start_bit
+
+# Bit 31 of a BO_ ID marks an extended (29-bit) frame
+EXTENDED_ID_FLAG = 0x80000000
+EXTENDED_ID_MASK = 0x1FFFFFFF
+
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+
+BO_PATTERN = re.compile(r"BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s*(\w*)")
+SG_PATTERN = re.compile(
+    r"SG_\s+(\w+)\s*(M|m\d+M?)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*"
+    r"\(\s*(" + NUMBER + r")\s*,\s*(" + NUMBER + r")\s*\)\s*"
+    r"\[\s*(" + NUMBER + r")\s*\|\s*(" + NUMBER + r")\s*\]\s*"
+    r"\"([^\"]*)\"\s*(.*)")
+VAL_PATTERN = re.compile(r"VAL_\s+(\d+)\s+(\w+)\s+(.*);")
+VALUE_PAIR_PATTERN = re.compile(r"(" + NUMBER + r")\s+\"([^\"]*)\"")
+BA_PATTERN = re.compile(r"BA_\s+\"(\w+)\"\s*(?:(BO_)\s+(\d+)|(SG_)\s+(\d+)\s+(\w+)|(BU_|EV_)\s+\w+)?\s*(.*?)\s*;")
+BA_DEF_DEF_PATTERN = re.compile(r"BA_DEF_DEF_\s+\"(\w+)\"\s*(.*?)\s*;")
+SG_MUL_VAL_PATTERN = re.compile(r"SG_MUL_VAL_\s+(\d+)\s+(\w+)\s+(\w+)\s+(.*);")
+RANGE_PATTERN = re.compile(r"(\d+)\s*-\s*(\d+)")
+INTEGER_PATTERN = re.compile(r"[-+]?\d+")
+
+
+# Integers stay ints, as in the JSON configs
+def _number(text):
+    return int(text) if INTEGER_PATTERN.fullmatch(text) else float(text)
+
+
+def _attribute_value(text):
+    if text.startswith('"'):
+        return text.strip('"')
+    try:
+        return _number(text)
+    except ValueError:
+        return text
+
+
+def statements(lines):
+    """
+    Yield (line_number, statement) for the stripped, non-empty lines of a DBC,
+    joining a statement with the following lines while it has an unclosed
+    quoted string.
+    """
+    pending = None
+    pending_line = 0
+    for line_number, line in enumerate(lines, 1):
+        if pending is not None:
+            pending += "\n" + line.rstrip("\r\n")
+            if pending.count('"') % 2 == 0:
+                yield pending_line, pending
+                pending = None
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        if line.count('"') % 2:
+            pending = line
+            pending_line = line_number
+            continue
+        yield line_number, line
+    if pending is not None:
+        yield pending_line, pending
+
+
+def parse_dbc(lines):
+    """Parse DBC text given as an iterable of lines, see the module docstring."""
+    messages = {}
+    messages_by_id = {}
+    attributes = {}
+    attribute_defaults = {}
+    message = None
+
+    for line_number, statement in statements(lines):
+        keyword = statement.split(None, 1)[0]
+        if keyword == "SG_":
+            match = SG_PATTERN.match(statement)
+            if match is None or message is None:
+                raise ValueError(f"line {line_number}: malformed or orphan signal: {statement}")
+            name, mux, start_bit, length, order, sign, factor, offset, minimum, maximum, unit, receivers = match.groups()
+            message["signals"][name] = {
+                "start_bit": int(start_bit),
+                "length": int(length),
+                "byte_order": "Intel" if order == "1" else "Motorola",
+                "is_signed": sign == "-",
+                "factor": _number(factor),
+                "offset": _number(offset),
+                "min_value": _number(minimum),
+                "max_value": _number(maximum),
+                "unit": unit,
+                "receivers": [receiver for receiver in re.split(r"[\s,]+", receivers) if receiver],
+                "multiplexer": bool(mux) and mux.endswith("M"),
+                "multiplex_value": int(mux[1:].rstrip("M")) if mux and mux.startswith("m") else None,
+                "multiplex_ranges": {},
+                "values": {},
+                "attributes": {},
+            }
+        elif keyword == "BO_":
+            match = BO_PATTERN.match(statement)
+            if match is None:
+                raise ValueError(f"line {line_number}: malformed message: {statement}")
+            raw_id = int(match.group(1))
+            message = {
+                "id": raw_id & EXTENDED_ID_MASK if raw_id & EXTENDED_ID_FLAG else raw_id,
+                "extended": bool(raw_id & EXTENDED_ID_FLAG),
+                "length": int(match.group(3)),
+                "sender": match.group(4),
+                "signals": {},
+                "attributes": {},
+            }
+            messages[match.group(2)] = message
+            messages_by_id[raw_id] = message
+        elif keyword == "VAL_":
+            match = VAL_PATTERN.match(statement)
+            # VAL_ of environment variables has no message ID
+            if match is None:
+                continue
+            signal = messages_by_id.get(int(match.group(1)), {}).get("signals", {}).get(match.group(2))
+            if signal is not None:
+                signal["values"] = {_number(value): text for value, text in VALUE_PAIR_PATTERN.findall(match.group(3))}
+        elif keyword == "BA_":
+            match = BA_PATTERN.match(statement)
+            if match is None:
+                continue
+            name, message_keyword, message_id, signal_keyword, signal_message_id, signal_name, other_keyword, value = match.groups()
+            value = _attribute_value(value)
+            if message_keyword:
+                target = messages_by_id.get(int(message_id))
+            elif signal_keyword:
+                target = messages_by_id.get(int(signal_message_id), {}).get("signals", {}).get(signal_name)
+            elif other_keyword:
+                # Node and environment variable attributes are not used
+                continue
+            else:
+                target = {"attributes": attributes}
+            if target is not None:
+                target["attributes"][name] = value
+        elif keyword == "BA_DEF_DEF_":
+            match = BA_DEF_DEF_PATTERN.match(statement)
+            if match is not None:
+                attribute_defaults[match.group(1)] = _attribute_value(match.group(2))
+        elif keyword == "SG_MUL_VAL_":
+            match = SG_MUL_VAL_PATTERN.match(statement)
+            if match is None:
+                continue
+            signal = messages_by_id.get(int(match.group(1)), {}).get("signals", {}).get(match.group(2))
+            if signal is not None:
+                signal["multiplex_ranges"][match.group(3)] = [(int(low), int(high)) for low, high in RANGE_PATTERN.findall(match.group(4))]
+
+    return {"messages": messages, "attributes": attributes, "attribute_defaults": attribute_defaults}
+
+
+def read_dbc(path):
+    with open(path, encoding="latin-1") as file:
+        return parse_dbc(file)
+
+
+# Attribute of a message, falling back to the BA_DEF_DEF_ default
+def message_attribute(database, message, name, default=None):
+    return message["attributes"].get(name, database["attribute_defaults"].get(name, default))
+
+
+def dbc_to_config(database):
+    """
+    Convert a parsed DBC to the DBC JSON format of the board.
+
+    start_bit becomes the least significant bit for both byte orders, an
+    empty unit becomes null, and the DLC is kept as the message length.
+    Extended messages are marked "extended"; cycle times, minimum intervals
+    (GenMsgDelayTime), multiplexing and value tables are kept when the DBC
+    has them.
+    """
+    config = {}
+    for message_name, message in database["messages"].items():
+        signals = {}
+        for signal_name, signal in message["signals"].items():
+            start_bit = signal["start_bit"]
+            if signal["byte_order"] == "Motorola":
+                start_bit = motorola_lsb_start_bit(start_bit, signal["length"])
+            signal_config = {
+                "start_bit": start_bit,
+                "length": signal["length"],
+                "is_signed": signal["is_signed"],
+                "byte_order": signal["byte_order"],
+                "factor": signal["factor"],
+                "offset": signal["offset"],
+                "min_value": signal["min_value"],
+                "max_value": signal["max_value"],
+                "unit": signal["unit"] or None,
+            }
+            if signal["multiplexer"]:
+                signal_config["multiplexer"] = True
+            if signal["multiplex_value"] is not None:
+                signal_config["multiplex_value"] = signal["multiplex_value"]
+            if signal["multiplex_ranges"]:
+                signal_config["multiplex_ranges"] = {name: [list(pair) for pair in ranges]
+                                                     for name, ranges in signal["multiplex_ranges"].items()}
+            if signal["values"]:
+                signal_config["values"] = {str(value): text for value, text in signal["values"].items()}
+            signals[signal_name] = signal_config
+
+        message_config = {"id": message["id"]}
+        if message["extended"]:
+            message_config["extended"] = True
+        message_config["length"] = message["length"]
+        cycle_time = message_attribute(database, message, "GenMsgCycleTime", 0)
+        if cycle_time:
+            message_config["cycle_time"] = cycle_time
+        # Minimum time between two frames of the message
+        delay_time = message_attribute(database, message, "GenMsgDelayTime", 0)
+        if delay_time:
+            message_config["min_interval"] = delay_time
+        message_config["signals"] = signals
+        config[message_name] = message_config
+    return config
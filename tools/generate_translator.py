@@ -0,0 +1,230 @@
+"""
+Generate a frozen translation plan: a Python module with one straight-line
+decoder per routed input ID and one encoder per destination, with the byte
+indexes, shifts, masks, sign bits and scale constants written out inline.
+
+The plan is first built on the host with translator.build_translation_plan,
+so routing, signal matching, warnings and payload layouts are exactly those
+of the interpreted plan; only the code that executes it changes. The module's
+build_translation_plan() returns a routing index of the same shape, so the
+Bridge runs it unchanged. Copy it to the board as frozen_plan.py, or compile
+it with mpy-cross to frozen_plan.mpy, and code.py prefers it over the binary
+and JSON configs.
+Run with: python tools/generate_translator.py input_dbc.dbc output_dbc.dbc frozen_plan.py
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from compile_config import load_config
+from translator import build_translation_plan, signal_pieces, EVERY_PAGE, MULTIPLEXOR, SMALL_INT_MAX
+
+
+# Function name suffix of a route or destination, kept apart for extended IDs
+def _id_suffix(message):
+    return f"x{message.id:x}" if message.extended else f"{message.id:x}"
+
+
+# Expression reading the bits of one piece from data, shifted into place in the signal
+def _read_piece(byte_index, bit, width_mask, signal_bit):
+    term = f"data[{byte_index}]"
+    if bit:
+        term = f"({term} >> {bit})"
+    if (width_mask << bit) != 0xFF:
+        term = f"({term} & 0x{width_mask:x})"
+    if signal_bit:
+        term = f"({term} << {signal_bit})"
+    return term
+
+
+# Expression for the bits of raw that one piece puts in its byte
+def _write_piece(raw, bit, width_mask, signal_bit):
+    term = f"({raw} >> {signal_bit})" if signal_bit else raw
+    term = f"({term} & 0x{width_mask:x})"
+    if bit:
+        term = f"({term} << {bit})"
+    return term
+
+
+def _scaled(raw, factor, offset):
+    if factor == 1 and offset == 0:
+        return raw
+    if " " in raw:
+        raw = f"({raw})"
+    return f"{raw} * {factor!r} + {offset!r}" if offset else f"{raw} * {factor!r}"
+
+
+# Body lines decoding signals from data into values, after padding data to min_length
+def _decoder_body(signal_layouts, min_length=0):
+    lines = []
+    signals = []
+    for signal_name, (start_bit, bit_length, is_signed, factor, offset, byte_order) in signal_layouts:
+        # Bits before the first byte read as zero, as in translator.compile_decoder
+        pieces = [piece for piece in signal_pieces(start_bit, bit_length, byte_order) if piece[0] >= 0]
+        min_length = max([min_length] + [piece[0] + 1 for piece in pieces])
+        signals.append((signal_name, pieces, is_signed, bit_length, factor, offset))
+    if min_length:
+        lines.append(f"    if len(data) < {min_length}:")
+        lines.append(f"        data = bytes(data) + bytes({min_length} - len(data))")
+    for signal_name, pieces, is_signed, bit_length, factor, offset in signals:
+        expression = " | ".join(_read_piece(*piece) for piece in pieces) or "0"
+        if is_signed:
+            lines.append(f"    raw = {expression}")
+            lines.append(f"    if raw & 0x{1 << (bit_length - 1):x}:")
+            lines.append(f"        raw -= 0x{1 << bit_length:x}")
+            expression = "raw"
+        lines.append(f"    values[{signal_name!r}] = {_scaled(expression, factor, offset)}")
+    return lines
+
+
+def generate_decoder(name, route):
+    lines = []
+    signals = route.signals
+    multiplexor = None
+    pages = {}
+    if route.multiplexed:
+        # One decoder per page, dispatched on the multiplexor as in
+        # translator.compile_multiplexed_decoder
+        common = []
+        for (signal_name, layout), page in zip(route.signals, route.signal_pages):
+            if page == MULTIPLEXOR:
+                start_bit, bit_length, _, _, _, byte_order = layout
+                multiplexor = (route.page_key, (start_bit, bit_length, False, 1, 0, byte_order))
+            elif page == EVERY_PAGE:
+                common.append((signal_name, layout))
+            else:
+                pages.setdefault(page, []).append((signal_name, layout))
+        signals = [multiplexor] + common
+        for page, layouts in sorted(pages.items()):
+            lines += [f"def {name}_page_{page}(data, values):"] + _decoder_body(layouts) + ["", ""]
+        page_entries = ", ".join(f"{page}: ({name}_page_{page}, {route.page_key + (page,)!r})" for page in sorted(pages))
+        lines += [f"{name}_pages = {{{page_entries}}}", ""]
+    lines += [f"# {route.name}", f"def {name}(data, values):"]
+    lines += _decoder_body(signals, route.frame_length)
+    if route.frame_length:
+        lines.append(f"    values[{route.frame_key!r}] = data")
+    if multiplexor is not None:
+        frames_key = route.page_key + ("frames",)
+        lines.append(f"    frame_count = (values[{frames_key!r}] + 1) & 0x{SMALL_INT_MAX:x}")
+        lines.append(f"    values[{frames_key!r}] = frame_count")
+        lines.append(f"    page = {name}_pages.get(values[{route.page_key!r}])")
+        lines.append("    if page is not None:")
+        lines.append("        page[0](data, values)")
+        lines.append("        values[page[1]] = frame_count")
+    lines.append("    return values")
+    return lines
+
+
+def generate_encoder(name, destination):
+    length = destination.length
+    lines = [f"# {destination.name}", f"def {name}(values, buffer):"]
+    copies = destination.copies
+    # A whole input frame sent under another ID, as in translator.compile_encoder
+    if (destination.policy is None and not destination.signals and len(copies) == 1
+            and copies[0][1] == tuple((i, i) for i in range(length))):
+        lines.append(f"    frame = values[{copies[0][0]!r}]")
+        lines.append(f"    if len(frame) == {length}:")
+        lines.append("        return frame")
+    byte_terms = [[] for _ in range(length)]
+    for index, (signal_name, (start_bit, bit_length, factor, offset, byte_order, divisor)) in enumerate(destination.signals):
+        pieces = signal_pieces(start_bit, bit_length, byte_order)
+        # Signals that do not fit were reported when the plan was built
+        if any(piece[0] < 0 or piece[0] >= length for piece in pieces):
+            continue
+        raw = f"raw{index}"
+        if divisor:
+            # Folded signal: an integer transform of the raw input value
+            lines.append(f"    {raw} = {_scaled(f'values[{signal_name!r}]', factor, offset)}")
+            if divisor > 1:
+                lines.append(f"    {raw} = {raw} // {divisor} if {raw} >= 0 else -(-{raw} // {divisor})")
+        elif factor == 1 and offset == 0:
+            lines.append(f"    {raw} = int(values[{signal_name!r}])")
+        elif offset == 0:
+            lines.append(f"    {raw} = int(values[{signal_name!r}] / {factor!r})")
+        else:
+            lines.append(f"    {raw} = int((values[{signal_name!r}] - {offset!r}) / {factor!r})")
+        for byte_index, bit, width_mask, signal_bit in pieces:
+            byte_terms[byte_index].append(_write_piece(raw, bit, width_mask, signal_bit))
+    copied = {}
+    for index, (frame_key, pairs) in enumerate(copies):
+        lines.append(f"    frame{index} = values[{frame_key!r}]")
+        for output_byte, frame_byte in pairs:
+            copied[output_byte] = f"frame{index}[{frame_byte}]"
+    for byte_index, terms in enumerate(byte_terms):
+        lines.append(f"    buffer[{byte_index}] = {copied.get(byte_index) or ' | '.join(terms) or '0'}")
+    lines.append("    return buffer")
+    return lines
+
+
+def _pages_source(route):
+    return f", {route.signal_pages!r}" if route.multiplexed else ""
+
+
+def _policy_source(destination):
+    policy = destination.policy
+    if policy is None:
+        return "None"
+    return (f"TransmitPolicy({destination.length}, {policy.on_change}, {policy.min_interval}, "
+            f"{policy.heartbeat}, {policy.deadbands!r})")
+
+
+def generate_module(plan, sources):
+    """Source of the frozen plan module for a routing index built on the host."""
+    lines = [
+        '"""',
+        f"Translation plan generated by tools/generate_translator.py from {' and '.join(sources)}.",
+        "Do not edit, regenerate it when the DBCs change.",
+        '"""',
+        "from translator import build_routing_index, SignalTable, Route, Destination, Forward, TransmitPolicy",
+        "",
+    ]
+    route_sources = []
+    for routes in plan:
+        for route in routes.values():
+            suffix = _id_suffix(route)
+            decoder = f"decode_{suffix}"
+            lines += generate_decoder(decoder, route) + [""]
+            destinations = []
+            for destination in route.destinations:
+                encoder = f"encode_{_id_suffix(destination)}"
+                lines += generate_encoder(encoder, destination) + [""]
+                destinations.append(
+                    f"Destination({destination.name!r}, {destination.id}, {destination.extended}, {destination.length}, outputs, "
+                    f"outputs.add_output_layouts({destination.signals!r}), {encoder}, {destination.cycle_time}, "
+                    f"{_policy_source(destination)}, {destination.copies!r})")
+            forwards = [f"Forward({forward.name!r}, {forward.id}, {forward.extended})" for forward in route.forwards]
+            route_sources.append(
+                f"        {route.name!r}: Route({route.name!r}, {route.id}, {route.extended}, inputs, "
+                f"inputs.add_input_layouts({route.signals!r}{_pages_source(route)}), [{', '.join(destinations)}], {decoder}, state, "
+                f"{route.frame_length}, [{', '.join(forwards)}]),")
+
+    lines.append("# Routing index of the routes above, the shape translator.build_translation_plan returns")
+    lines.append("def build_translation_plan():")
+    lines.append("    inputs = SignalTable()")
+    lines.append("    outputs = SignalTable()")
+    lines.append("    state = {}")
+    lines.append("    return build_routing_index({")
+    lines += route_sources
+    lines.append("    })")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="input DBC, .dbc or DBC JSON")
+    parser.add_argument("output", help="output DBC, .dbc or DBC JSON")
+    parser.add_argument("module", help="where to write the generated module, copied to the board as frozen_plan.py")
+    args = parser.parse_args()
+
+    plan = build_translation_plan(load_config(args.input), load_config(args.output))
+    source = generate_module(plan, [os.path.basename(args.input), os.path.basename(args.output)])
+    with open(args.module, "w") as file:
+        file.write(source)
+    print(f"Wrote {sum(len(routes) for routes in plan)} routes to {args.module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1025 @@
+import json
+from array import array
+import canlog
+from ticks import TICKS_MAX
+
+# Highest arbitration ID that fits in an 11-bit standard frame
+STANDARD_ID_MAX = 0x7FF
+
+# Load the DBC JSON files
+def load_dbc_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# A message is extended if the config says so, or if its ID cannot be standard
+def is_extended_config(message_config):
+    return message_config.get("extended", message_config["id"] > STANDARD_ID_MAX)
+
+# Build the routing index used to find the config of a received frame.
+# Standard and extended IDs are kept in separate tables so that a standard
+# 0x100 and an extended 0x00000100 never resolve to the same message.
+def build_routing_index(message_db):
+    standard = {}
+    extended = {}
+    for name, cfg in message_db.items():
+        if isinstance(cfg, Route):
+            can_id, is_extended = cfg.id, cfg.extended
+        else:
+            can_id, is_extended = cfg["id"], is_extended_config(cfg)
+        table = extended if is_extended else standard
+        if can_id in table:
+            canlog.warning(f"duplicate ID {can_id:x} for message {name}. Ignoring it.")
+            continue
+        table[can_id] = cfg
+    return standard, extended
+
+# Constant-time lookup of the indexed entry for a received frame
+def lookup_by_id(routing_index, message):
+    standard, extended = routing_index
+    if getattr(message, "extended", False):
+        return extended.get(message.id)
+    return standard.get(message.id)
+
+# DBC files give the start bit of a Motorola signal as the position of its
+# most significant bit. Walk down to the least significant bit, which is the
+# start_bit the JSON configs use for both byte orders.
+def motorola_lsb_start_bit(msb_start_bit, bit_length):
+    position = msb_start_bit
+    for _ in range(bit_length - 1):
+        position = position + 15 if position % 8 == 0 else position - 1
+    return position
+
+def signal_pieces(start_bit, bit_length, byte_order):
+    """
+    Split a signal into the byte-sized pieces it occupies in the payload.
+
+    start_bit is the position of the signal's least significant bit, numbered
+    byte * 8 + bit with bit 0 the least significant bit of the byte, for both
+    byte orders. Intel signals continue into the following bytes, Motorola
+    signals into the preceding ones. Each piece is (byte_index, bit_in_byte, width_mask,
+    signal_bit): width_mask bits at bit_in_byte of the byte hold the signal
+    bits from signal_bit up. Working byte by byte keeps every intermediate
+    value within the signal's own width, so signals of up to 30 bits never
+    leave CircuitPython's small-int range.
+    """
+    pieces = []
+    byte_index = start_bit // 8
+    bit = start_bit % 8
+    signal_bit = 0
+    step = -1 if byte_order == "Motorola" else 1
+    while signal_bit < bit_length:
+        width = min(8 - bit, bit_length - signal_bit)
+        pieces.append((byte_index, bit, (1 << width) - 1, signal_bit))
+        signal_bit += width
+        byte_index += step
+        bit = 0
+    return tuple(pieces)
+
+def compile_decoder(signal_layouts, frame_key=None, frame_length=0):
+    """
+    Compile input signal layouts into one decoder function for their message.
+
+    Byte pieces, sign bits and scaling are worked out here. The returned
+    decode(data, values) assembles each signal from the payload bytes it
+    covers and stores the scaled value in the values dict, which the caller
+    allocates once, so decoding a frame allocates nothing. With a frame_key,
+    the payload itself, padded to at least frame_length bytes, is stored in
+    values too, for the byte copies of encoders (see plan_byte_copies).
+    """
+    steps = []
+    min_length = 0
+    for signal_name, (start_bit, bit_length, is_signed, factor, offset, byte_order) in signal_layouts:
+        pieces = signal_pieces(start_bit, bit_length, byte_order)
+        if any(piece[0] < 0 for piece in pieces):
+            # Bits before the first byte read as zero
+            canlog.warning(f"Signal {signal_name} extends before the first byte of the message.")
+            pieces = tuple(piece for piece in pieces if piece[0] >= 0)
+        min_length = max([min_length] + [piece[0] + 1 for piece in pieces])
+        sign_bit = (1 << (bit_length - 1)) if is_signed else 0
+        steps.append((signal_name, pieces, sign_bit, factor, offset))
+    steps = tuple(steps)
+    min_length = max(min_length, frame_length)
+    padding = bytes(min_length)
+
+    def decode(data, values):
+        if len(data) < min_length:
+            # Missing trailing bytes read as zero
+            data = bytes(data) + padding[len(data):]
+        for signal_name, pieces, sign_bit, factor, offset in steps:
+            value = 0
+            for byte_index, bit, width_mask, signal_bit in pieces:
+                value |= ((data[byte_index] >> bit) & width_mask) << signal_bit
+            if value & sign_bit:
+                value -= sign_bit << 1
+            values[signal_name] = value * factor + offset
+        if frame_key is not None:
+            values[frame_key] = data
+        return values
+
+    return decode
+
+def compile_multiplexed_decoder(multiplexor, common_layouts, page_layouts, page_key, frame_key=None, frame_length=0):
+    """
+    Compile a multiplexed message into a decoder that dispatches on its
+    multiplexor.
+
+    multiplexor is the input layout of the multiplexor signal, common_layouts
+    the signals of every frame and page_layouts maps each multiplexor value
+    to the signals of its page. The returned decode(data, values) decodes
+    the common signals, stores the raw multiplexor value under page_key,
+    then looks up the decoder of that page in a dict, so a frame only
+    decodes the signals of its own page. For freshness, values also counts
+    the frames under page_key + ("frames",) and keeps, under page_key +
+    (page,), the count at the last frame of each page.
+    """
+    start_bit, bit_length, _, _, _, byte_order = multiplexor
+    decode_common = compile_decoder([(page_key, (start_bit, bit_length, False, 1, 0, byte_order))] + list(common_layouts),
+                                    frame_key, frame_length)
+    frames_key = page_key + ("frames",)
+    pages = {page: (compile_decoder(layouts), page_key + (page,)) for page, layouts in page_layouts.items()}
+
+    def decode(data, values):
+        decode_common(data, values)
+        frame_count = (values[frames_key] + 1) & SMALL_INT_MAX
+        values[frames_key] = frame_count
+        page = pages.get(values[page_key])
+        if page is not None:
+            decode_page, seen_key = page
+            decode_page(data, values)
+            values[seen_key] = frame_count
+        return values
+
+    return decode
+
+# Compile the decoder for a message straight from its DBC JSON config
+def compile_message_decoder(message_config):
+    return compile_decoder([(signal_name, input_signal_layout(signal))
+                            for signal_name, signal in message_config["signals"].items()])
+
+# Payload length of an output message, calculated from its signals if not specified
+def output_message_length(message_name, message_config):
+    if "length" in message_config:
+        return message_config["length"]
+    canlog.warning(f"'length' not specified for message {message_name}. Calculating from signals.")
+    return max(piece[0] + 1
+               for signal in message_config["signals"].values()
+               for piece in signal_pieces(signal["start_bit"], signal["length"], signal_byte_order(signal)))
+
+# Byte order of a signal config, "Intel" (little-endian) or "Motorola" (big-endian)
+def signal_byte_order(signal):
+    return "Motorola" if signal.get("byte_order") == "Motorola" else "Intel"
+
+# Bit layout and scaling of an input signal: (start_bit, length, is_signed, factor, offset, byte_order)
+def input_signal_layout(signal):
+    return (signal["start_bit"], signal["length"], signal.get("is_signed", False),
+            signal.get("factor", 1), signal.get("offset", 0), signal_byte_order(signal))
+
+# Bit layout and scaling of an output signal: (start_bit, length, factor, offset, byte_order, divisor).
+# A divisor of 0 means float scaling, see folded_scaling for the others.
+def output_signal_layout(signal):
+    return (signal["start_bit"], signal["length"], signal.get("factor", 1), signal.get("offset", 0),
+            signal_byte_order(signal), 0)
+
+# Largest magnitude of a small int on CircuitPython; larger ints live on the heap
+SMALL_INT_MAX = (1 << 30) - 1
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return abs(a)
+
+# Fractions are (numerator, denominator) pairs of ints, reduced with a
+# positive denominator; the fractions module is not available on the board
+def _fraction(numerator, denominator=1):
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    divisor = _gcd(numerator, denominator) or 1
+    return numerator // divisor, denominator // divisor
+
+def _add(x, y):
+    return _fraction(x[0] * y[1] + y[0] * x[1], x[1] * y[1])
+
+def _multiply(x, y):
+    return _fraction(x[0] * y[0], x[1] * y[1])
+
+def _divide(x, y):
+    return _fraction(x[0] * y[1], x[1] * y[0])
+
+# A scale constant as a fraction with a power of ten denominator, as written
+# in the DBC, or None. The tolerance absorbs the 30-bit floats of CircuitPython.
+def decimal_fraction(value):
+    denominator = 1
+    for _ in range(10):
+        scaled = value * denominator
+        numerator = round(scaled)
+        if abs(scaled - numerator) <= abs(scaled) * 1e-6:
+            return _fraction(numerator, denominator)
+        denominator *= 10
+    return None
+
+# Units by their lowercase spellings: (dimension, scale, offset), where
+# scale * value + offset is the value in the dimension's base unit
+UNITS = {}
+for _names, _unit in (
+        (("m/s", "mps"), ("speed", (1, 1), (0, 1))),
+        (("km/h", "kph", "kmh", "kmph"), ("speed", (5, 18), (0, 1))),
+        (("mph",), ("speed", (1397, 3125), (0, 1))),
+        (("kn", "kt", "knots"), ("speed", (463, 900), (0, 1))),
+        (("degc", "deg c", "°c", "c"), ("temperature", (1, 1), (0, 1))),
+        (("degf", "deg f", "°f", "f"), ("temperature", (5, 9), (-160, 9))),
+        (("k",), ("temperature", (1, 1), (-5463, 20))),
+        (("kpa",), ("pressure", (1, 1), (0, 1))),
+        (("pa",), ("pressure", (1, 1000), (0, 1))),
+        (("hpa", "mbar"), ("pressure", (1, 10), (0, 1))),
+        (("bar",), ("pressure", (100, 1), (0, 1))),
+        (("psi",), ("pressure", (6894757, 1000000), (0, 1))),
+        (("m",), ("distance", (1, 1), (0, 1))),
+        (("km",), ("distance", (1000, 1), (0, 1))),
+        (("mm",), ("distance", (1, 1000), (0, 1))),
+        (("mi", "mile", "miles"), ("distance", (201168, 125), (0, 1))),
+        (("l",), ("volume", (1, 1), (0, 1))),
+        (("ml",), ("volume", (1, 1000), (0, 1))),
+        (("gal",), ("volume", (473176473, 125000000), (0, 1))),
+        (("nm",), ("torque", (1, 1), (0, 1))),
+        (("lbft", "lb-ft", "ft-lb", "ftlb"), ("torque", (1355817948, 1000000000), (0, 1)))):
+    for _name in _names:
+        UNITS[_name] = _unit
+
+def unit_conversion(input_unit, output_unit):
+    """
+    Conversion between the units of an input and an output signal, as
+    fractions (scale, offset) with output = input * scale + offset. Returns
+    None when no conversion is needed: either unit missing, or the same unit.
+    Units the table does not know, or of different dimensions, are reported
+    and translated unconverted.
+    """
+    if not input_unit or not output_unit or input_unit.lower() == output_unit.lower():
+        return None
+    source = UNITS.get(input_unit.strip().lower())
+    target = UNITS.get(output_unit.strip().lower())
+    if source is None or target is None or source[0] != target[0]:
+        canlog.warning(f"no conversion from {input_unit} to {output_unit}. Values are translated unconverted.")
+        return None
+    if source == target:
+        return None
+    # value in the base unit, then out of it
+    scale = _divide(source[1], target[1])
+    offset = _divide(_add(source[2], (-target[2][0], target[2][1])), target[1])
+    return scale, offset
+
+def folded_scaling(input_layout, output_factor, output_offset, conversion=None):
+    """
+    Fold the scaling of an input signal, the unit conversion to the output
+    signal and the output scaling into one integer transform of raw values.
+
+    The physical input value raw * factor + offset, converted to the output
+    unit, gives the output raw value (value - offset_out) / factor_out,
+    truncated. With every constant as an exact fraction this is
+    (raw * multiplier + addend) / divisor, truncated toward zero like int().
+    Returns (multiplier, addend, divisor), or None when a scale constant is
+    not decimal or an intermediate value can exceed a small int over the
+    input's raw range.
+    """
+    _, length, is_signed, factor, offset, _ = input_layout
+    constants = [decimal_fraction(value) for value in (factor, offset, output_factor, output_offset)]
+    if None in constants or not constants[2][0]:
+        return None
+    factor, offset, output_factor, output_offset = constants
+    scale, shift = conversion or ((1, 1), (0, 1))
+    # raw_out = raw * slope + intercept
+    slope = _divide(_multiply(factor, scale), output_factor)
+    intercept = _divide(_add(_add(_multiply(offset, scale), shift), (-output_offset[0], output_offset[1])), output_factor)
+    divisor = slope[1] * intercept[1] // _gcd(slope[1], intercept[1])
+    multiplier = slope[0] * (divisor // slope[1])
+    addend = intercept[0] * (divisor // intercept[1])
+    low, high = (-(1 << (length - 1)), (1 << (length - 1)) - 1) if is_signed else (0, (1 << length) - 1)
+    if max(abs(low * multiplier + addend), abs(high * multiplier + addend), divisor) > SMALL_INT_MAX:
+        return None
+    return multiplier, addend, divisor
+
+SIGNAL_SIGNED = 0x01
+SIGNAL_MOTOROLA = 0x02
+
+# Page of a signal in a SignalTable: the multiplexor value of the frames that
+# carry it, or one of these. Larger multiplexor values are not supported.
+EVERY_PAGE = -1
+MULTIPLEXOR = -2
+MAX_PAGE = 0x7FFF
+
+# Integral scale constants are kept as ints, like the JSON configs have them,
+# so unscaled signals decode to ints
+def _scale_constant(value):
+    return int(value) if value == int(value) else value
+
+class SignalTable:
+    """
+    Signal descriptors stored column-wise in arrays, indexed by signal number.
+
+    A signal takes 34 bytes of array storage plus its key, instead of a JSON
+    dict with nine string keys. keys holds what each signal is called in the
+    values dicts, normally its name. Layout tuples for the compilers are only
+    built on demand. Output signals with a divisor are folded: their factor
+    and offset are the integer multiplier and addend of folded_scaling, kept
+    in the integer columns multipliers and addends, as CircuitPython floats
+    only hold integers up to about 2^22 exactly. pages holds the page of each
+    input signal of a multiplexed message, EVERY_PAGE otherwise; a signal on
+    several pages is added once per page.
+    """
+    __slots__ = ("keys", "start_bits", "lengths", "flags", "factors", "offsets", "multipliers", "addends", "divisors",
+                 "pages")
+
+    def __init__(self):
+        self.keys = []
+        self.start_bits = array("H")
+        self.lengths = array("B")
+        self.flags = array("B")
+        self.factors = array("d")
+        self.offsets = array("d")
+        self.multipliers = array("i")
+        self.addends = array("i")
+        self.divisors = array("I")
+        self.pages = array("h")
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Append a signal, returns its index
+    def add(self, key, start_bit, length, is_signed, factor, offset, byte_order, divisor=0, page=EVERY_PAGE):
+        self.keys.append(key)
+        self.start_bits.append(start_bit)
+        self.lengths.append(length)
+        self.flags.append((SIGNAL_SIGNED if is_signed else 0) | (SIGNAL_MOTOROLA if byte_order == "Motorola" else 0))
+        if divisor:
+            self.factors.append(0)
+            self.offsets.append(0)
+            self.multipliers.append(factor)
+            self.addends.append(offset)
+        else:
+            self.factors.append(factor)
+            self.offsets.append(offset)
+            self.multipliers.append(0)
+            self.addends.append(0)
+        self.divisors.append(divisor)
+        self.pages.append(page)
+        return len(self.keys) - 1
+
+    # Append a signal from its DBC JSON config, returns its index. scale
+    # replaces its scaling with (factor, offset, divisor).
+    def add_config(self, key, signal, scale=None, page=EVERY_PAGE):
+        factor, offset, divisor = scale or (signal.get("factor", 1), signal.get("offset", 0), 0)
+        return self.add(key, signal["start_bit"], signal["length"], signal.get("is_signed", False),
+                        factor, offset, signal_byte_order(signal), divisor, page)
+
+    # Append (key, input layout) pairs, with their pages if multiplexed,
+    # returns their indexes
+    def add_input_layouts(self, signal_layouts, pages=None):
+        pages = pages or [EVERY_PAGE] * len(signal_layouts)
+        return array("H", (self.add(key, *layout, page=page) for (key, layout), page in zip(signal_layouts, pages)))
+
+    # Append (key, output layout) pairs, returns their indexes
+    def add_output_layouts(self, signal_layouts):
+        return array("H", (self.add(key, start_bit, length, False, factor, offset, byte_order, divisor)
+                           for key, (start_bit, length, factor, offset, byte_order, divisor) in signal_layouts))
+
+    def byte_order(self, index):
+        return "Motorola" if self.flags[index] & SIGNAL_MOTOROLA else "Intel"
+
+    # Input layout of a signal: (start_bit, length, is_signed, factor, offset, byte_order)
+    def input_layout(self, index):
+        return (self.start_bits[index], self.lengths[index], bool(self.flags[index] & SIGNAL_SIGNED),
+                _scale_constant(self.factors[index]), _scale_constant(self.offsets[index]), self.byte_order(index))
+
+    # Output layout of a signal: (start_bit, length, factor, offset, byte_order, divisor)
+    def output_layout(self, index):
+        divisor = self.divisors[index]
+        if divisor:
+            factor, offset = self.multipliers[index], self.addends[index]
+        else:
+            factor, offset = _scale_constant(self.factors[index]), _scale_constant(self.offsets[index])
+        return self.start_bits[index], self.lengths[index], factor, offset, self.byte_order(index), divisor
+
+class TransmitPolicy:
+    """
+    When a planned output message is actually sent.
+
+    With on_change, a payload identical to the last one sent is dropped,
+    unless heartbeat milliseconds have passed since then. A payload is not
+    sent within min_interval milliseconds of the previous one; the change
+    stays pending and goes out with a later frame or cycle. deadbands lists
+    (key, deadband) for every signal of the message: a signal that moved less
+    than its deadband since it was last sent is encoded with the sent value.
+    The Bridge compares the encoded payload against the last sent bytes,
+    which the policy keeps by swapping buffers with the Destination.
+    """
+    __slots__ = ("on_change", "min_interval", "heartbeat", "deadbands", "pending", "sent_values",
+                 "last_sent", "last_send")
+
+    def __init__(self, length, on_change=False, min_interval=0, heartbeat=0, deadbands=None):
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.deadbands = deadbands
+        self.pending = {key: 0 for key, _ in deadbands or ()}
+        self.sent_values = dict(self.pending)
+        self.last_sent = bytearray(length)
+        self.last_send = None
+
+    # Values to encode: values itself, or the pending values with each
+    # deadband applied against the last sent value
+    def hold(self, values):
+        if self.deadbands is None:
+            return values
+        pending = self.pending
+        sent_values = self.sent_values
+        for key, deadband in self.deadbands:
+            value = values[key]
+            if deadband and abs(value - sent_values[key]) < deadband:
+                value = sent_values[key]
+            pending[key] = value
+        return pending
+
+    # Whether the encoded payload data should be sent at the tick now
+    def due(self, data, now):
+        if self.last_send is None:
+            return True
+        # The tick now never precedes the last send, so the masked difference
+        # holds up to TICKS_PERIOD ms (about six days) since then
+        elapsed = (now - self.last_send) & TICKS_MAX
+        if self.on_change and data == self.last_sent:
+            return bool(self.heartbeat) and elapsed >= self.heartbeat
+        return elapsed >= self.min_interval
+
+    # Record that destination's buffer was sent at the tick now, without copying
+    def sent(self, destination, now):
+        destination.buffer, self.last_sent = self.last_sent, destination.buffer
+        self.pending, self.sent_values = self.sent_values, self.pending
+        self.last_send = now
+
+# TransmitPolicy for these settings, None when every frame is sent. deadbands
+# lists (key, deadband) for every signal, 0 where there is none.
+def transmit_policy(length, on_change, min_interval, heartbeat, deadbands):
+    if not any(deadband for _, deadband in deadbands):
+        deadbands = None
+    if not (on_change or min_interval or heartbeat or deadbands):
+        return None
+    return TransmitPolicy(length, on_change, min_interval, heartbeat, deadbands)
+
+class Destination:
+    """
+    A planned output message with its compiled encoder and payload buffer,
+    sent as an extended frame if extended is set.
+
+    The signals are the indexes in table of the output signals, in the order
+    of the route that feeds it; the Bridge adds the preallocated message.
+    cycle_time is the transmit period in milliseconds, 0 to send the message
+    when its trigger frame arrives, and policy an optional TransmitPolicy.
+    copies are the byte copies of compile_encoder, set by plan_byte_copies.
+    """
+    __slots__ = ("name", "id", "extended", "length", "table", "indexes", "buffer", "encode", "message", "cycle_time",
+                 "policy", "copies")
+
+    def __init__(self, name, message_id, extended, length, table, indexes, encode=None, cycle_time=0, policy=None,
+                 copies=()):
+        self.name = name
+        self.id = message_id
+        self.extended = extended
+        self.length = length
+        self.table = table
+        self.indexes = indexes
+        self.buffer = bytearray(length)
+        self.message = None
+        self.cycle_time = cycle_time
+        self.policy = policy
+        self.copies = copies
+        self.encode = encode or self.compile_encoder()
+
+    # Encoder of the signals and copies. The policy compares and keeps the
+    # buffer, so only messages without one are remapped.
+    def compile_encoder(self):
+        return compile_encoder(self.name, self.length, self.signals, self.copies, self.policy is None)
+
+    # Output signal layouts as (key, layout) pairs
+    @property
+    def signals(self):
+        return [(self.table.keys[index], self.table.output_layout(index)) for index in self.indexes]
+
+class Route:
+    """
+    A planned input message with its compiled decoder and the destination
+    messages its frames trigger. The signals are indexes in table.
+
+    values is the signal state store the decoder writes into, normally
+    shared by every route of a plan so that encoders see the latest value
+    of each signal whichever frame brought it. Its keys are preallocated
+    here. scheduled holds the periodic destinations the Bridge starts sending
+    on the first frame. With a frame_length, the decoder also keeps the
+    latest frame in values under frame_key, for the byte copies of encoders.
+    forwards are the Forwards that pass its frames through unchanged.
+
+    A multiplexed message has a MULTIPLEXOR signal and signals on pages in
+    table. Its decoder dispatches on the multiplexor (see
+    compile_multiplexed_decoder), keeping the active page under page_key, and
+    page_destinations, set by the Bridge, holds the destinations each page
+    sends.
+    """
+    __slots__ = ("name", "id", "extended", "table", "indexes", "decode", "values", "destinations", "scheduled",
+                 "frame_key", "frame_length", "forwards", "page_key", "page_destinations")
+
+    def __init__(self, name, message_id, extended, table, indexes, destinations, decode=None, values=None,
+                 frame_length=0, forwards=None):
+        self.name = name
+        self.id = message_id
+        self.extended = extended
+        self.table = table
+        self.indexes = indexes
+        self.values = {} if values is None else values
+        for index in indexes:
+            self.values[table.keys[index]] = 0
+        self.frame_key = ("frame", name)
+        self.page_key = ("page", name)
+        if self.multiplexed:
+            self.values[self.page_key] = -1
+            self.values[self.page_key + ("frames",)] = 0
+            for page in self.pages():
+                self.values[self.page_key + (page,)] = -1
+        self.page_destinations = None
+        self.keep_frame(frame_length)
+        self.decode = decode or self.compile_decoder()
+        self.destinations = destinations
+        self.scheduled = []
+        self.forwards = [] if forwards is None else forwards
+
+    # Whether frames have signals to decode, for a destination or a byte copy
+    @property
+    def translates(self):
+        return bool(self.indexes) or bool(self.frame_length)
+
+    @property
+    def multiplexed(self):
+        return any(self.table.pages[index] == MULTIPLEXOR for index in self.indexes)
+
+    # Multiplexor values of the pages with signals
+    def pages(self):
+        return sorted({self.table.pages[index] for index in self.indexes if self.table.pages[index] >= 0})
+
+    # Frames of the message since the last one of page, None if none came yet
+    def page_age(self, page):
+        seen = self.values.get(self.page_key + (page,), -1)
+        if seen < 0:
+            return None
+        return (self.values[self.page_key + ("frames",)] - seen) & SMALL_INT_MAX
+
+    # Keep the latest frame, padded to length bytes, from now on; 0 to stop
+    def keep_frame(self, length):
+        self.frame_length = length
+        if length:
+            self.values[self.frame_key] = bytes(length)
+
+    def compile_decoder(self):
+        frame_key = self.frame_key if self.frame_length else None
+        if not self.multiplexed:
+            return compile_decoder(self.signals, frame_key, self.frame_length)
+        multiplexor = None
+        common = []
+        pages = {}
+        for (key, layout), page in zip(self.signals, self.signal_pages):
+            if page == MULTIPLEXOR:
+                multiplexor = layout
+            elif page == EVERY_PAGE:
+                common.append((key, layout))
+            else:
+                pages.setdefault(page, []).append((key, layout))
+        return compile_multiplexed_decoder(multiplexor, common, pages, self.page_key, frame_key, self.frame_length)
+
+    def destinations_by_page(self, destinations):
+        """
+        The destinations that each page of a multiplexed message sends: those
+        with a signal decoded from that page, from every frame, or copied from
+        the frame. Pages without signals, and unknown multiplexor values, send
+        the destinations under None.
+        """
+        table = self.table
+        page_keys = {}
+        for index in self.indexes:
+            page_keys.setdefault(table.pages[index], set()).add(table.keys[index])
+        common = page_keys.get(EVERY_PAGE, set())
+        by_page = {}
+        for page in [None] + self.pages():
+            keys = common | page_keys.get(page, set())
+            by_page[page] = [destination for destination in destinations
+                             if any(destination.table.keys[index] in keys for index in destination.indexes)
+                             or any(frame_key == self.frame_key for frame_key, _ in destination.copies)]
+        return by_page
+
+    # Input signal layouts as (key, layout) pairs
+    @property
+    def signals(self):
+        return [(self.table.keys[index], self.table.input_layout(index)) for index in self.indexes]
+
+    # Page of each signal, EVERY_PAGE unless the message is multiplexed
+    @property
+    def signal_pages(self):
+        return [self.table.pages[index] for index in self.indexes]
+
+class Forward:
+    """
+    A pass-through output message: frames of its input message are sent
+    unchanged, data and length, under its own ID. The Bridge adds the
+    preallocated message.
+    """
+    __slots__ = ("name", "id", "extended", "message")
+
+    def __init__(self, name, message_id, extended):
+        self.name = name
+        self.id = message_id
+        self.extended = extended
+        self.message = None
+
+# (output byte, input byte) pairs that copy an output signal from the input
+# signal's frame unchanged, or None. Both must be whole bytes at the same byte
+# order, and the output must store the raw input value: a folded 1/1 transform,
+# or no scaling on either side.
+def byte_copy_pairs(input_layout, output_layout):
+    input_start, input_length, _, input_factor, input_offset, input_order = input_layout
+    start_bit, bit_length, factor, offset, byte_order, divisor = output_layout
+    if input_start % 8 or start_bit % 8 or bit_length % 8 or bit_length != input_length or byte_order != input_order:
+        return None
+    if factor != 1 or offset != 0 or divisor > 1 or (not divisor and (input_factor != 1 or input_offset != 0)):
+        return None
+    pairs = tuple(sorted((output_piece[0], input_piece[0]) for output_piece, input_piece
+                         in zip(signal_pieces(start_bit, bit_length, byte_order),
+                                signal_pieces(input_start, input_length, input_order))))
+    if any(byte_index < 0 for pair in pairs for byte_index in pair):
+        return None
+    return pairs
+
+def plan_byte_copies(routes):
+    """
+    Turn the output signals that are input signals moved unchanged into byte
+    copies from the input frame.
+
+    A signal is copied when byte_copy_pairs matches it with its only source
+    signal, it shares no byte with another signal of its message, and the
+    message has no deadbands, which encode held values. The source route then
+    keeps its latest frame in the state, so periodic messages copy from it
+    too, and a signal every output copies is no longer decoded. A message
+    that is a whole input frame unchanged is sent as that frame (see
+    compile_encoder). Decoders and encoders are recompiled; returns the
+    number of copied output signals.
+    """
+    sources = {}
+    for route in routes:
+        for (key, layout), page in zip(route.signals, route.signal_pages):
+            # The kept frame may be of any page of a multiplexed message
+            if page == EVERY_PAGE:
+                sources.setdefault(key, []).append((route, layout))
+            elif page >= 0:
+                sources.setdefault(key, []).append((None, layout))
+    encoded = set()
+    frame_lengths = {}
+    copied = 0
+    for route in routes:
+        for destination in route.destinations:
+            policy = destination.policy
+            signals = destination.signals
+            byte_uses = {}
+            for _, (start_bit, bit_length, _, _, byte_order, _) in signals:
+                for piece in signal_pieces(start_bit, bit_length, byte_order):
+                    byte_uses[piece[0]] = byte_uses.get(piece[0], 0) + 1
+            indexes = array("H")
+            copies = {}
+            for index, (key, layout) in zip(destination.indexes, signals):
+                found = sources.get(key, ())
+                pairs = None
+                if len(found) == 1 and found[0][0] is not None and (policy is None or policy.deadbands is None):
+                    pairs = byte_copy_pairs(found[0][1], layout)
+                if pairs is None or any(byte_uses[output_byte] > 1 or output_byte >= destination.length
+                                        for output_byte, _ in pairs):
+                    indexes.append(index)
+                    encoded.add(key)
+                    continue
+                source = found[0][0]
+                copies.setdefault(source, []).extend(pairs)
+                frame_lengths[source] = max([frame_lengths.get(source, 0)] + [frame_byte + 1 for _, frame_byte in pairs])
+                copied += 1
+            if copies:
+                destination.indexes = indexes
+                destination.copies = tuple((source.frame_key, tuple(sorted(pairs))) for source, pairs in copies.items())
+                destination.encode = destination.compile_encoder()
+    for route, frame_length in frame_lengths.items():
+        route.indexes = array("H", (index for index in route.indexes
+                                    if route.table.keys[index] in encoded or route.table.pages[index] == MULTIPLEXOR))
+        route.keep_frame(frame_length)
+        route.decode = route.compile_decoder()
+    return copied
+
+def match_signals(input_db, output_db):
+    """
+    Match output signals to input signals by name.
+
+    Returns (outputs, used): outputs is a list of (output_name, trigger,
+    signal_names) for every output message with at least one signal found
+    in the inputs, where trigger is the input message that feeds it the most
+    signals and whose frames send it. used maps each input message to its
+    signals that some output carries. Signals and input messages that cannot
+    be translated are reported. Pass-through outputs, with a "forward" key,
+    are left to match_forwards.
+    """
+    sources = {}
+    for input_name, input_cfg in input_db.items():
+        for signal_name in input_cfg["signals"]:
+            sources.setdefault(signal_name, []).append(input_name)
+
+    outputs = []
+    used = {}
+    forwarded = set()
+    for output_name, output_cfg in output_db.items():
+        if "forward" in output_cfg:
+            forwarded.add(output_cfg["forward"])
+            continue
+        if any(signal.get("multiplexer") or signal.get("multiplex_value") is not None
+               for signal in output_cfg["signals"].values()):
+            canlog.warning(f"multiplexed output message {output_name} is not supported. The signals of all its pages are encoded into every frame.")
+        signal_names = []
+        contributions = {}
+        for signal_name in output_cfg["signals"]:
+            if signal_name not in sources:
+                canlog.warning(f"no input message carries signal {signal_name} of {output_name}. It will be sent as zero.")
+                continue
+            signal_names.append(signal_name)
+            for input_name in sources[signal_name]:
+                contributions[input_name] = contributions.get(input_name, 0) + 1
+                used.setdefault(input_name, set()).add(signal_name)
+        if signal_names:
+            trigger = max(contributions, key=contributions.get)
+            outputs.append((output_name, trigger, signal_names))
+
+    for input_name, input_cfg in input_db.items():
+        if input_name not in used:
+            if input_name in forwarded:
+                continue
+            canlog.warning(f"no output message carries the signals of {input_name} (ID {input_cfg['id']:x}). It will not be translated.")
+            continue
+        for signal_name in input_cfg["signals"]:
+            if signal_name not in used[input_name]:
+                canlog.warning(f"no output message carries signal {signal_name} of {input_name}. It will not be translated.")
+        used[input_name] = [signal_name for signal_name in input_cfg["signals"] if signal_name in used[input_name]]
+    return outputs, used
+
+# Multiplexor values of a multiplexed signal's pages, EVERY_PAGE-only for
+# signals on every page. Ranges for a nested multiplexor fall back to the
+# pages of that multiplexor.
+def _signal_pages(message_name, signals, signal_name, multiplexor):
+    signal = signals[signal_name]
+    ranges = signal.get("multiplex_ranges") or {}
+    if signal_name == multiplexor:
+        return [EVERY_PAGE]
+    if multiplexor in ranges:
+        pages = []
+        for low, high in ranges[multiplexor]:
+            pages.extend(range(low, high + 1))
+    elif ranges:
+        parent = next(iter(ranges))
+        if parent not in signals:
+            canlog.warning(f"signal {signal_name} of {message_name} is multiplexed by unknown signal {parent}. Decoding it on every page.")
+            return [EVERY_PAGE]
+        canlog.warning(f"signal {signal_name} of {message_name} is multiplexed by nested multiplexor {parent}. Decoding it on every page of {parent}.")
+        return _signal_pages(message_name, signals, parent, multiplexor)
+    elif signal.get("multiplex_value") is not None:
+        pages = [signal["multiplex_value"]]
+    else:
+        return [EVERY_PAGE]
+    if any(page > MAX_PAGE for page in pages):
+        canlog.warning(f"signal {signal_name} of {message_name} has multiplexor values over {MAX_PAGE}. Ignoring those.")
+        pages = [page for page in pages if page <= MAX_PAGE]
+    return sorted(set(pages))
+
+def input_signal_pages(message_name, message_config, signal_names):
+    """
+    (signal_name, page) pairs of the signals of an input message to decode.
+
+    Signals are on EVERY_PAGE, unless the message has a multiplexor signal
+    ("multiplexer" without a "multiplex_value"). That one comes first, as
+    MULTIPLEXOR, and every multiplexed signal is listed once per page it is
+    on: its "multiplex_value", or the "multiplex_ranges" of SG_MUL_VAL_.
+    """
+    signals = message_config["signals"]
+    multiplexors = [signal_name for signal_name, signal in signals.items()
+                    if signal.get("multiplexer") and signal.get("multiplex_value") is None
+                    and not signal.get("multiplex_ranges")]
+    if not multiplexors:
+        return [(signal_name, EVERY_PAGE) for signal_name in signal_names]
+    if len(multiplexors) > 1:
+        canlog.warning(f"message {message_name} has multiplexors {', '.join(multiplexors)}. Using {multiplexors[0]}.")
+    pairs = [(multiplexors[0], MULTIPLEXOR)]
+    for signal_name in signal_names:
+        pairs.extend((signal_name, page) for page in _signal_pages(message_name, signals, signal_name, multiplexors[0]))
+    return pairs
+
+# (output_name, input_name) of the pass-through outputs, whose "forward" key
+# names the input message they send unchanged under their own ID
+def match_forwards(input_db, output_db):
+    forwards = []
+    for output_name, output_cfg in output_db.items():
+        input_name = output_cfg.get("forward")
+        if input_name is None:
+            continue
+        if input_name not in input_db:
+            canlog.warning(f"no input message {input_name} to forward as {output_name}. Ignoring it.")
+            continue
+        forwards.append((output_name, input_name))
+    return forwards
+
+def fold_signals(input_db, output_db, outputs, used):
+    """
+    Work out the output scaling of every matched output signal.
+
+    Units are converted from the input signal's to the output signal's (see
+    unit_conversion). A signal is folded when every input message carrying
+    it scales it the same way, in the same unit, and folded_scaling finds an
+    integer transform to every output signal of that name: the state then
+    holds its raw input value, and its frames are translated without float
+    math. Returns (scales, input_factors, deadband_factors): scales maps
+    (output_name, signal_name) to the (factor, offset, divisor) of the output
+    layout, for folded signals and converted ones; input_factors maps each
+    folded signal to its input factor; deadband_factors maps (output_name,
+    signal_name) to what turns an output deadband into state units.
+    """
+    layouts = {}
+    units = {}
+    for input_name, signal_names in used.items():
+        for signal_name in signal_names:
+            signal = input_db[input_name]["signals"][signal_name]
+            layouts.setdefault(signal_name, []).append(input_signal_layout(signal))
+            units.setdefault(signal_name, []).append(signal.get("unit"))
+
+    scales = {}
+    input_factors = {}
+    deadband_factors = {}
+    for signal_name, signal_layouts in layouts.items():
+        signal_units = units[signal_name]
+        same_unit = all((unit or "").lower() == (signal_units[0] or "").lower() for unit in signal_units)
+        if not same_unit:
+            canlog.warning(f"input messages give signal {signal_name} in different units. It is translated unconverted.")
+        fold = same_unit and all(layout[3:5] == signal_layouts[0][3:5] for layout in signal_layouts)
+        converted = {}
+        folded = {}
+        for output_name, _, signal_names in outputs:
+            if signal_name not in signal_names:
+                continue
+            output_signal = output_db[output_name]["signals"][signal_name]
+            output_factor = output_signal.get("factor", 1)
+            output_offset = output_signal.get("offset", 0)
+            conversion = unit_conversion(signal_units[0], output_signal.get("unit")) if same_unit else None
+            if conversion is not None:
+                # Float scaling of the converted value: the output factor and
+                # offset expressed in the input unit
+                (scale_numerator, scale_denominator), (offset_numerator, offset_denominator) = conversion
+                scale = scale_numerator / scale_denominator
+                converted[output_name] = (output_factor / scale,
+                                          (output_offset - offset_numerator / offset_denominator) / scale, 0)
+            else:
+                scale = 1
+            deadband_factors[(output_name, signal_name)] = 1 / scale
+            if fold:
+                output_scales = [folded_scaling(layout, output_factor, output_offset, conversion)
+                                 for layout in signal_layouts]
+                if None in output_scales:
+                    fold = False
+                else:
+                    folded[output_name] = output_scales[0]
+
+        if fold:
+            scales.update(((output_name, signal_name), scale) for output_name, scale in folded.items())
+            input_factors[signal_name] = signal_layouts[0][3]
+            for output_name in folded:
+                deadband_factors[(output_name, signal_name)] /= signal_layouts[0][3]
+        else:
+            scales.update(((output_name, signal_name), scale) for output_name, scale in converted.items())
+    return scales, input_factors, deadband_factors
+
+def build_translation_plan(input_db, output_db, byte_copies=True):
+    """
+    Precompute how frames of every input message are translated.
+
+    Output signals are fed by the input signals of the same name, from any
+    input message. Every route decodes its frames into one shared,
+    preallocated values dict that holds the latest value of each signal; a
+    multiplexed input message decodes only the page of each frame (see
+    input_signal_pages). Each output message is encoded from that state and
+    sent when a frame of its trigger input message arrives (see
+    match_signals), so an output combining several inputs goes out once,
+    complete. Output messages with a "cycle_time" (in milliseconds) are sent
+    periodically instead, and "on_change", "min_interval", "heartbeat" and
+    signal "deadband" keys give an output a TransmitPolicy. Output messages
+    with a "forward" key pass the frames of that input message through
+    unchanged, as Forwards of its route.
+
+    The signals of both DBCs are copied into a SignalTable each, and
+    decoders and encoders are compiled here, so the frame path only executes
+    the plan. Units are converted where input and output signals differ, and
+    where fold_signals can, a signal goes through the state as its raw input
+    value and the encoder applies one integer transform that includes the
+    conversion. Signals moved unchanged become byte copies (see
+    plan_byte_copies) unless byte_copies is False.
+
+    Returns the routing index of the routes, keyed by input message ID (see
+    build_routing_index).
+    """
+    input_table = SignalTable()
+    output_table = SignalTable()
+    outputs, used = match_signals(input_db, output_db)
+    scales, input_factors, deadband_factors = fold_signals(input_db, output_db, outputs, used)
+
+    triggered = {}
+    for output_name, trigger, signal_names in outputs:
+        output_cfg = output_db[output_name]
+        indexes = array("H", (output_table.add_config(signal_name, output_cfg["signals"][signal_name],
+                                                      scales.get((output_name, signal_name)))
+                              for signal_name in signal_names))
+        length = output_message_length(output_name, output_cfg)
+        destination = Destination(output_name, output_cfg["id"], is_extended_config(output_cfg), length, output_table,
+                                  indexes, cycle_time=output_cfg.get("cycle_time", 0),
+                                  policy=transmit_policy(length, output_cfg.get("on_change", False),
+                                                         output_cfg.get("min_interval", 0), output_cfg.get("heartbeat", 0),
+                                                         [(signal_name, output_cfg["signals"][signal_name].get("deadband", 0)
+                                                           * deadband_factors[(output_name, signal_name)])
+                                                          for signal_name in signal_names]))
+        triggered.setdefault(trigger, []).append(destination)
+
+    state = {}
+    routes = {}
+    for input_name, signal_names in used.items():
+        input_cfg = input_db[input_name]
+        indexes = array("H", (input_table.add_config(signal_name, input_cfg["signals"][signal_name],
+                                                     (1, 0, 0) if signal_name in input_factors else None, page)
+                              for signal_name, page in input_signal_pages(input_name, input_cfg, signal_names)))
+        routes[input_name] = Route(input_name, input_cfg["id"], is_extended_config(input_cfg), input_table,
+                                   indexes, triggered.get(input_name, []), values=state)
+    for output_name, input_name in match_forwards(input_db, output_db):
+        input_cfg = input_db[input_name]
+        if input_name not in routes:
+            routes[input_name] = Route(input_name, input_cfg["id"], is_extended_config(input_cfg), input_table,
+                                       array("H"), [], values=state)
+        output_cfg = output_db[output_name]
+        routes[input_name].forwards.append(Forward(output_name, output_cfg["id"], is_extended_config(output_cfg)))
+    if byte_copies:
+        plan_byte_copies(list(routes.values()))
+    return build_routing_index(routes)
+
+def compile_encoder(message_name, message_length, signal_layouts, copies=(), remap=False):
+    """
+    Compile output signal layouts into one encoder function for a message.
+
+    The returned encode(values, buffer) reverses the scaling of each signal,
+    or applies the integer transform of a folded signal to its raw input
+    value, and ORs the raw value into the payload buffer, one masked shift
+    per byte the signal covers, then returns the buffer. The caller
+    allocates the bytearray of message_length bytes once. Signals that do
+    not fit in the message are reported and left out.
+
+    copies lists (frame_key, ((output byte, frame byte), ...)) for the bytes
+    copied as they are from the input frames kept in values. With remap, a
+    message that is nothing but a whole frame of message_length bytes is
+    returned as that frame, without touching the buffer.
+    """
+    steps = []
+    for signal_name, (start_bit, bit_length, factor, offset, byte_order, divisor) in signal_layouts:
+        pieces = signal_pieces(start_bit, bit_length, byte_order)
+        if any(piece[0] < 0 or piece[0] >= message_length for piece in pieces):
+            canlog.warning(f"Signal {signal_name} does not fit in {message_length} bytes of message {message_name}. Skipping.")
+            continue
+        # Unscaled signals skip the float division, which is inexact above 53 bits
+        if factor == 1 and offset == 0 and divisor <= 1:
+            factor = None
+        steps.append((signal_name, pieces, factor, offset, divisor))
+    steps = tuple(steps)
+    copies = tuple(copies)
+    if not (remap and not steps and len(copies) == 1 and copies[0][1] == tuple((i, i) for i in range(message_length))):
+        remap = False
+
+    def encode(values, buffer):
+        if remap:
+            frame = values[copies[0][0]]
+            if len(frame) == message_length:
+                return frame
+        for i in range(message_length):
+            buffer[i] = 0
+        for signal_name, pieces, factor, offset, divisor in steps:
+            if factor is None:
+                raw_value = int(values[signal_name])
+            elif divisor:
+                raw_value = values[signal_name] * factor + offset
+                # Truncate toward zero, like int()
+                raw_value = raw_value // divisor if raw_value >= 0 else -(-raw_value // divisor)
+            else:
+                raw_value = int((values[signal_name] - offset) / factor)
+            for byte_index, bit, width_mask, signal_bit in pieces:
+                buffer[byte_index] |= ((raw_value >> signal_bit) & width_mask) << bit
+        for frame_key, pairs in copies:
+            frame = values[frame_key]
+            for output_byte, frame_byte in pairs:
+                buffer[output_byte] = frame[frame_byte]
+        return buffer
+
+    return encode
@@ -0,0 +1,309 @@
+"""
+In-process virtual CAN bus for running the bridge on a workstation.
+
+VirtualBus models the wire: frames take their bit time at the configured
+baudrate, one at a time, plus a fixed delivery latency, and can be corrupted
+at a configurable rate, in which case an error frame and a retransmission
+occupy the wire. Nodes attached to it stand in for canio.CAN and
+adafruit_mcp2515.MCP2515 with the surface the bridge uses: listen() with
+Match filters, Message and RemoteTransmissionRequest frames, Listener.receive()/in_waiting(), send(), read_message(),
+unread_message_count, state, restart() and the diagnostics properties.
+
+    wire = VirtualBus(baudrate=500_000)
+    can1 = wire.attach("CAN1")
+    ecu = wire.attach("ECU")
+    ecu.send(Message(id=0x640, data=b"\x01\x02"))
+    can1.listen(timeout=0).receive()
+
+Time comes from the clock passed to VirtualBus, time.monotonic by default.
+"""
+import heapq
+import random
+from collections import deque
+from time import monotonic, perf_counter, sleep
+
+
+class BusState:
+    ERROR_ACTIVE = "ERROR_ACTIVE"
+    ERROR_WARNING = "ERROR_WARNING"
+    ERROR_PASSIVE = "ERROR_PASSIVE"
+    BUS_OFF = "BUS_OFF"
+
+
+class Message:
+    """canio.Message stand-in. Like canio, assigning data copies it."""
+
+    def __init__(self, id, data=b"", *, extended=False):
+        self.id = id
+        self.data = data
+        self.extended = extended
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = bytes(data)
+
+
+class RemoteTransmissionRequest:
+    """canio.RemoteTransmissionRequest stand-in: asks for length bytes and carries no data."""
+
+    def __init__(self, id, length, *, extended=False):
+        self.id = id
+        self.length = length
+        self.extended = extended
+
+
+class Match:
+    """canio.Match stand-in: mask bits set to 1 must equal the same bits of id."""
+
+    def __init__(self, id, *, mask=None, extended=False):
+        self.id = id
+        self.mask = mask
+        self.extended = extended
+
+    def matches(self, message):
+        if message.extended != self.extended:
+            return False
+        if self.mask is None:
+            return message.id == self.id
+        return (message.id & self.mask) == (self.id & self.mask)
+
+
+# Bits a data frame occupies on the wire, including the interframe space and
+# worst-case bit stuffing
+def frame_bits(length, extended=False):
+    bits = (67 if extended else 47) + 8 * length
+    stuffable = (54 if extended else 34) + 8 * length
+    return bits + (stuffable - 1) // 4
+
+# Error flag, delimiter and interframe space after a corrupted frame
+ERROR_FRAME_BITS = 20
+
+# Filters behind each mask register, as adafruit_mcp2515 assigns them: every
+# distinct mask among the matches takes the next register, the first one
+# with 2 filters, and each match takes a filter of its mask's register
+MASK_FILTERS = (2, 4)
+
+
+class VirtualBus:
+    """
+    One simulated CAN wire shared by the attached nodes.
+
+    baudrate sets how long each frame occupies the wire, latency adds a fixed
+    delay before delivery, and error_rate is the probability that a
+    transmission is corrupted and retransmitted. Statistics are kept in
+    frames, error_frames and busy_time.
+    """
+
+    def __init__(self, baudrate=500_000, latency=0.0, error_rate=0.0, clock=monotonic, seed=0):
+        self.baudrate = baudrate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.nodes = []
+        self.busy_until = 0.0
+        self.busy_time = 0.0
+        self.frames = 0
+        self.error_frames = 0
+        self._pending = []
+        self._sequence = 0
+
+    def attach(self, name="node", rx_capacity=64, tx_capacity=16, send_error_rate=0.0, register_read_time=0.0):
+        node = VirtualCAN(self, name, rx_capacity, tx_capacity, send_error_rate, register_read_time)
+        self.nodes.append(node)
+        return node
+
+    # Seconds until the wire is free, 0 if it is idle now
+    def backlog(self):
+        return max(0.0, self.busy_until - self.clock())
+
+    def transmit(self, sender, message):
+        now = self.clock()
+        start = max(now, self.busy_until)
+        wire_start = start
+        remote = isinstance(message, RemoteTransmissionRequest)
+        duration = frame_bits(0 if remote else len(message.data), message.extended) / self.baudrate
+        while self.error_rate and self.random.random() < self.error_rate:
+            # The frame is destroyed by an error frame and sent again
+            self.error_frames += 1
+            sender.transmit_error_count += 8
+            start += duration + ERROR_FRAME_BITS / self.baudrate
+        self.busy_until = start + duration
+        self.busy_time += self.busy_until - wire_start
+        self.frames += 1
+        if remote:
+            frame = RemoteTransmissionRequest(message.id, message.length, extended=message.extended)
+        else:
+            frame = Message(message.id, message.data, extended=message.extended)
+        self._sequence += 1
+        heapq.heappush(self._pending, (self.busy_until + self.latency, self._sequence, sender, frame))
+        sender.tx_pending += 1
+
+    # Hand every frame whose delivery time has passed to the other nodes
+    def deliver(self):
+        now = self.clock()
+        pending = self._pending
+        while pending and pending[0][0] <= now:
+            _, _, sender, frame = heapq.heappop(pending)
+            sender.tx_pending -= 1
+            sender.frames_sent += 1
+            if sender.transmit_error_count:
+                sender.transmit_error_count -= 1
+            for node in self.nodes:
+                if node is not sender or node.loopback:
+                    node.accept(frame)
+
+
+class VirtualCAN:
+    """
+    A node on a VirtualBus with the canio.CAN and MCP2515 surface.
+
+    register_read_time is spent busy-waiting whenever a status register or
+    receive buffer is read (state, unread_message_count, read_message), to
+    model the SPI transactions of an MCP2515.
+    """
+
+    def __init__(self, bus, name, rx_capacity, tx_capacity, send_error_rate, register_read_time):
+        self.bus = bus
+        self.name = name
+        self.rx_capacity = rx_capacity
+        self.tx_capacity = tx_capacity
+        self.send_error_rate = send_error_rate
+        self.register_read_time = register_read_time
+        self.baudrate = bus.baudrate
+        self.loopback = False
+        self.silent = False
+        self.auto_restart = True
+        self.transmit_error_count = 0
+        self.receive_error_count = 0
+        self.tx_pending = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.rx_overflows = 0
+        self.tx_full = 0
+        self._matches = None
+        self._rx = deque()
+
+    def _read_register(self):
+        if self.register_read_time:
+            end = perf_counter() + self.register_read_time
+            while perf_counter() < end:
+                pass
+
+    @property
+    def state(self):
+        self._read_register()
+        if self.transmit_error_count >= 256:
+            return BusState.BUS_OFF
+        if self.transmit_error_count >= 128 or self.receive_error_count >= 128:
+            return BusState.ERROR_PASSIVE
+        if self.transmit_error_count >= 96 or self.receive_error_count >= 96:
+            return BusState.ERROR_WARNING
+        return BusState.ERROR_ACTIVE
+
+    def restart(self):
+        self.transmit_error_count = 0
+        self.receive_error_count = 0
+
+    def deinit(self):
+        pass
+
+    # Acceptance filtering and the receive queue, as the controller does it
+    def accept(self, frame):
+        if self._matches and not any(match.matches(frame) for match in self._matches):
+            return
+        if len(self._rx) >= self.rx_capacity:
+            self.rx_overflows += 1
+            return
+        self._rx.append(frame)
+        self.frames_received += 1
+
+    def send(self, message):
+        if self.state == BusState.BUS_OFF:
+            raise RuntimeError("Bus off")
+        if self.send_error_rate and self.bus.random.random() < self.send_error_rate:
+            raise RuntimeError("Injected send error")
+        self.bus.deliver()
+        if self.tx_pending >= self.tx_capacity:
+            # Like canio and adafruit_mcp2515, which never return False
+            self.tx_full += 1
+            raise RuntimeError("No transmit buffer available to send")
+        self.bus.transmit(self, message)
+
+    # MCP2515 style receive API
+    @property
+    def unread_message_count(self):
+        self._read_register()
+        self.bus.deliver()
+        return len(self._rx)
+
+    def read_message(self):
+        self._read_register()
+        self.bus.deliver()
+        if not self._rx:
+            return None
+        return self._rx.popleft()
+
+    # The acceptance filters in place, None when every frame is accepted
+    @property
+    def matches(self):
+        return self._matches
+
+    # canio style receive API. Matches that do not fit MASK_FILTERS raise
+    # RuntimeError like adafruit_mcp2515, which also reads mask 0 as a full mask.
+    def listen(self, matches=None, *, timeout=10):
+        if matches:
+            masks = []
+            filter_counts = [0] * len(MASK_FILTERS)
+            for match in matches:
+                mask = match.mask or ((1 << (29 if match.extended else 11)) - 1)
+                if mask not in masks:
+                    if len(masks) == len(MASK_FILTERS):
+                        raise RuntimeError("No Masks Available")
+                    masks.append(mask)
+                register = masks.index(mask)
+                if filter_counts[register] == MASK_FILTERS[register]:
+                    raise RuntimeError("No Filters Available")
+                filter_counts[register] += 1
+        self._matches = list(matches) if matches else None
+        return Listener(self, timeout)
+
+
+class Listener:
+    def __init__(self, can, timeout):
+        self.can = can
+        self.timeout = timeout
+
+    def in_waiting(self):
+        return self.can.unread_message_count
+
+    def receive(self):
+        message = self.can.read_message()
+        if message is None and self.timeout:
+            deadline = self.can.bus.clock() + self.timeout
+            while message is None and self.can.bus.clock() < deadline:
+                sleep(0.0001)
+                message = self.can.read_message()
+        return message
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        message = self.receive()
+        if message is None:
+            raise StopIteration
+        return message
+
+    def deinit(self):
+        self.can._matches = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()